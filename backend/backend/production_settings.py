@@ -37,9 +37,33 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': SQLITE_OPTIONS,
         }
     }
 
+# Query counting is debug-only; settings.py derived it from its own DEBUG
+QUERY_COUNTING = False
+
+# /metrics is only served by default once scrapes must authenticate;
+# METRICS_ENABLED=1 without a token exposes it to anyone who can reach the app
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1' if METRICS_TOKEN else '0') == '1'
+
+# Gunicorn workers share a file cache unless a cache server is configured
+if not os.environ.get('CACHE_BACKEND'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', '/tmp/equipment-cache'),
+        }
+    }
+
+# Upload limits
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', UPLOAD_MAX_BYTES))
+UPLOAD_MAX_ROWS = int(os.environ.get('UPLOAD_MAX_ROWS', UPLOAD_MAX_ROWS))
+UPLOAD_BATCH_WORKERS = int(os.environ.get('UPLOAD_BATCH_WORKERS', UPLOAD_BATCH_WORKERS))
+CHUNKED_UPLOAD_DIR = os.environ.get('CHUNKED_UPLOAD_DIR', CHUNKED_UPLOAD_DIR)
+REQUEST_PROFILE_DIR = os.environ.get('REQUEST_PROFILE_DIR', REQUEST_PROFILE_DIR)
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:5173').split(',')
 CORS_ALLOW_CREDENTIALS = True
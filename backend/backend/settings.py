@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'equipment.profiling.ProfilingMiddleware',
+    'equipment.timing.ServerTimingMiddleware',
+    'equipment.metrics.MetricsMiddleware',
+    'equipment.memory.MemoryAccountingMiddleware',
+    'equipment.querycount.QueryCountMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,10 +83,31 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Run on every new SQLite connection. WAL lets readers carry on while an upload
+# writes its dataset, and NORMAL sync is still crash safe in WAL mode.
+# busy_timeout makes a writer wait up to 20s for the lock instead of failing
+# with "database is locked"; mmap_size is 256 MiB, cache_size -65536 is 64 MiB.
+SQLITE_INIT_COMMAND = ';'.join([
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=20000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-65536',
+])
+
+SQLITE_OPTIONS = {
+    'init_command': SQLITE_INIT_COMMAND,
+    # Take the write lock when a transaction begins. A deferred transaction that
+    # reads and then writes can fail with SQLITE_BUSY without waiting at all.
+    'transaction_mode': 'IMMEDIATE',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLITE_PATH lets tools such as benchmarks/loadtest.py use a throwaway database
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': SQLITE_OPTIONS,
     }
 }
 
@@ -124,9 +151,97 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are always spooled to a temporary file, never held in memory
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# CSV upload limits, checked while the upload streams in and during parsing
+UPLOAD_MAX_BYTES = 512 * 1024 * 1024
+UPLOAD_MAX_ROWS = 5_000_000
+
+# Batch uploads: files per request and the size of the analysis process pool
+# (0 analyzes the files one after another in the request's own process)
+UPLOAD_BATCH_MAX_FILES = 100
+UPLOAD_BATCH_WORKERS = min(4, os.cpu_count() or 1)
+
+# Route the history, dataset and PDF endpoints to their async variants
+# (equipment/views_async.py). backend/asgi.py turns this on; under WSGI each
+# async view would just run in its own event loop.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS') == '1'
+# Processes drawing PDF reports for the async PDF view (0 draws them on a thread)
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', min(2, os.cpu_count() or 1)))
+
+# Per-stage timing of upload, dataset and report requests, sent as a
+# Server-Timing header and logged to "equipment.timing" (see equipment/timing.py)
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING') == '1'
+
+# Staff-only sampling profiles of single requests, switched on per request with
+# an X-Profile header or ?profile= (see equipment/profiling.py)
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING') == '1'
+REQUEST_PROFILE_DIR = MEDIA_ROOT / 'profiles'
+REQUEST_PROFILE_INTERVAL = 0.001
+# Only the newest profiles are kept
+REQUEST_PROFILE_KEEP = 100
+
+# Peak traced allocation and RSS change of upload and PDF requests and their
+# stages, logged to "equipment.memory" and exported as metrics (see equipment/memory.py)
+MEMORY_ACCOUNTING = os.environ.get('MEMORY_ACCOUNTING') == '1'
+
+# SQL query count and bytes fetched per request in X-Query-Count/X-Query-Bytes
+# headers, with repeated statements logged (see equipment/querycount.py).
+# Debug only; QUERY_COUNTING=0 turns it off there too.
+QUERY_COUNTING = DEBUG and os.environ.get('QUERY_COUNTING', '1') == '1'
+
+# Prometheus metrics at /metrics (see equipment/metrics.py). Under gunicorn the
+# workers share PROMETHEUS_MULTIPROC_DIR so the scrape covers all of them
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+# When set, scrapes must send "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Timing and memory lines are INFO, so they only reach the console when one of
+# those is switched on; repeated-query warnings always do
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'equipment': {
+            'handlers': ['console'],
+            'level': 'INFO' if REQUEST_TIMING or MEMORY_ACCOUNTING else 'WARNING',
+        },
+    },
+}
+
+# Histogram/series results and the per-user history and dataset responses
+# (see equipment/caching.py). Local memory unless CACHE_BACKEND is set; with
+# several worker processes or replicas point it at a cache they all share,
+# e.g. django.core.cache.backends.redis.RedisCache with CACHE_LOCATION=redis://...
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+# Longest a history or dataset response is served from a cache that missed an invalidation
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+
+# How long an authenticated user is served from the cache (see equipment/authentication.py)
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 60))
+
+# Resumable chunked uploads: chunks are kept here until the upload is committed
+CHUNKED_UPLOAD_DIR = MEDIA_ROOT / 'chunked_uploads'
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Uncommitted upload sessions older than this are discarded
+CHUNKED_UPLOAD_EXPIRY = 24 * 60 * 60
+# A commit still unfinished after this long (its worker died) can be retried
+CHUNKED_UPLOAD_COMMIT_TIMEOUT = 10 * 60
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'equipment.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -142,6 +257,8 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': False,
     'UPDATE_LAST_LOGIN': True,
+    # Login returns the user's profile too when asked with include_user
+    'TOKEN_OBTAIN_SERIALIZER': 'equipment.serializers_auth.UserTokenObtainPairSerializer',
 }
 
 # CORS settings
@@ -169,4 +286,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-chunk-sha256',
+    'x-profile',
+    'x-request-id',
 ]
\ No newline at end of file
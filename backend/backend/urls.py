@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from equipment.views_auth import RegisterView, UserProfileView
+from equipment.metrics import metrics_view
 
 urlpatterns = [
     path('api/', include('equipment.urls')),
@@ -8,4 +9,5 @@ urlpatterns = [
     path('api/auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/auth/user/', UserProfileView.as_view(), name='user_profile'),
+    path('metrics', metrics_view, name='metrics'),
 ]
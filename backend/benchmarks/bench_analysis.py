@@ -0,0 +1,110 @@
+"""
+Benchmark analyze_csv end to end on synthetic CSVs.
+
+Every case runs in a fresh interpreter so its peak RSS is its own. Results
+(wall time, peak RSS and per-stage timings) are written as JSON; pass an
+earlier results file with --compare to see what changed between commits.
+
+Usage (from the backend directory):
+    python benchmarks/bench_analysis.py
+    python benchmarks/bench_analysis.py --sizes 1k,100k --profiles skewed
+    python benchmarks/bench_analysis.py --output new.json --compare old.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import parse_size, peak_rss_mb, run_worker, save_results, compare
+from synthetic import PROFILES, write_csv
+
+DEFAULT_SIZES = '1k,100k,1M,10M'
+
+# Cases above this many rows run once; smaller ones are repeated
+REPEAT_LIMIT = 1_000_000
+
+
+def worker(path):
+    """Runs in the child: analyze one file and print the measurements as JSON"""
+    from equipment.utils import analyze_csv
+
+    baseline = peak_rss_mb()
+    timings = {}
+    start = time.perf_counter()
+    summary = analyze_csv(path, timings=timings)
+    wall = time.perf_counter() - start
+
+    print(json.dumps({
+        "wall_s": wall,
+        "stages_s": timings,
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline,
+        "rows": summary["total_equipment"],
+    }))
+
+
+def data_file(data_dir, rows, profile, seed):
+    path = os.path.join(data_dir, f"equipment-{profile}-{rows}-{seed}.csv")
+    if not os.path.exists(path):
+        print(f"  generating {os.path.basename(path)}", flush=True)
+        write_csv(path + '.tmp', rows, seed=seed, profile=profile)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="comma separated row counts, e.g. 1k,100k,1M")
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help=f"runs per case up to {REPEAT_LIMIT:,} rows")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'equipment-bench'))
+    parser.add_argument('--output', default='analysis-results.json')
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return worker(args.worker)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    profiles = args.profiles.split(',')
+
+    results = []
+    for rows in sizes:
+        for profile in profiles:
+            path = data_file(args.data_dir, rows, profile, args.seed)
+            runs = [run_worker(__file__, path) for _ in range(args.repeat if rows <= REPEAT_LIMIT else 1)]
+            # Report the median run, with every run's wall time alongside
+            run = sorted(runs, key=lambda r: r["wall_s"])[len(runs) // 2]
+            result = {
+                "rows": rows,
+                "profile": profile,
+                "seed": args.seed,
+                "file_bytes": os.path.getsize(path),
+                "wall_s": run["wall_s"],
+                "wall_runs_s": [r["wall_s"] for r in runs],
+                "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+                "baseline_rss_mb": run["baseline_rss_mb"],
+                "stages_s": run["stages_s"],
+            }
+            results.append(result)
+
+            stages = '  '.join(f"{name} {secs:.3f}" for name, secs in run["stages_s"].items())
+            spread = f" (stdev {statistics.stdev(result['wall_runs_s']):.3f})" if len(runs) > 1 else ''
+            print(f"{rows:>11,} {profile:<9} {result['wall_s']:8.3f} s{spread}  "
+                  f"peak {result['peak_rss_mb']:8.1f} MB  | {stages}", flush=True)
+
+    save_results(args.output, results)
+    if args.compare:
+        compare(results, args.compare, ("rows", "profile"), [("wall", "wall_s"), ("peak RSS", "peak_rss_mb")])
+
+
+if __name__ == '__main__':
+    main()
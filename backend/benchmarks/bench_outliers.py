@@ -0,0 +1,32 @@
+"""
+Benchmark the outlier detectors in equipment.utils on synthetic readings.
+
+Usage (from the backend directory):
+    python benchmarks/bench_outliers.py [rows]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from equipment.utils import OUTLIER_THRESHOLDS, detect_outliers
+from synthetic import make_frame
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = make_frame(rows)
+
+    print(f"{rows:,} rows")
+    for method in OUTLIER_THRESHOLDS:
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            detect_outliers(df, method)
+            timings.append(time.perf_counter() - start)
+        print(f"  {method:<16} best {min(timings) * 1000:8.1f} ms   median {sorted(timings)[2] * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
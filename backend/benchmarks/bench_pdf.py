@@ -0,0 +1,116 @@
+"""
+Benchmark generate_pdf_report for reports of increasing size.
+
+Report data is made the way GeneratePDFView receives it: readings resampled
+(with a little jitter) from desktop-app/sample_data.csv, run through
+analyze_csv and round-tripped through JSON. Each case runs in a fresh
+interpreter; total time, the per-section breakdown, peak RSS, output size
+and page count are written as JSON.
+
+Usage (from the backend directory):
+    python benchmarks/bench_pdf.py
+    python benchmarks/bench_pdf.py --sizes 15,100 --output new.json --compare old.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import BACKEND_DIR, parse_size, peak_rss_mb, run_worker, save_results, compare
+
+DEFAULT_SIZES = '15,100,1k,10k,50k'
+SAMPLE_CSV = os.path.join(os.path.dirname(BACKEND_DIR), 'desktop-app', 'sample_data.csv')
+
+PAGE_PATTERN = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+
+def report_data(equipment, seed=0):
+    """Analysis result for a deterministic report of the given size"""
+    import numpy as np
+    import pandas as pd
+    from equipment.utils import analyze_csv
+
+    rng = np.random.default_rng(seed)
+    sample = pd.read_csv(SAMPLE_CSV)
+    df = sample.iloc[rng.integers(len(sample), size=equipment)].reset_index(drop=True)
+    df['Equipment Name'] = [f"{t}-{i:05d}" for i, t in enumerate(df['Type'])]
+    for col in ('Flowrate', 'Pressure', 'Temperature'):
+        df[col] = (df[col] * rng.normal(1, 0.05, size=equipment)).round(1)
+
+    buffer = StringIO()
+    df.to_csv(buffer, index=False)
+    buffer.seek(0)
+    summary = analyze_csv(buffer)
+    summary.pop("stats")
+    summary.pop("distributions")
+    return json.loads(json.dumps(summary))
+
+
+def section_breakdown(timings):
+    """{section: {build_s, layout_s}} from the flat generate_pdf_report timings"""
+    sections = {}
+    for key, secs in timings.items():
+        if ':' in key:
+            phase, name = key.split(':', 1)
+            sections.setdefault(name, {"build_s": 0.0, "layout_s": 0.0})[f"{phase}_s"] = secs
+    return sections
+
+
+def worker(equipment, seed):
+    """Runs in the child: build one report and print the measurements as JSON"""
+    from equipment.pdf_generator import generate_pdf_report
+
+    data = report_data(int(equipment), int(seed))
+    baseline = peak_rss_mb()
+    timings = {}
+    start = time.perf_counter()
+    pdf = generate_pdf_report(data, timings=timings).getvalue()
+    wall = time.perf_counter() - start
+
+    print(json.dumps({
+        "wall_s": wall,
+        "sections": section_breakdown(timings),
+        "write_s": timings.get("write", 0.0),
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline,
+        "output_bytes": len(pdf),
+        "pages": len(PAGE_PATTERN.findall(pdf)),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="comma separated equipment counts, e.g. 15,1k")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='pdf-results.json')
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--worker', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return worker(*args.worker)
+
+    results = []
+    for equipment in (parse_size(s) for s in args.sizes.split(',')):
+        run = run_worker(__file__, equipment, args.seed)
+        results.append({"equipment": equipment, "seed": args.seed, **run})
+
+        print(f"{equipment:>7,} equipment  {run['wall_s']:8.2f} s  peak {run['peak_rss_mb']:7.1f} MB  "
+              f"{run['output_bytes'] / 1024:9.0f} KB  {run['pages']:5} pages", flush=True)
+        for name, phases in sorted(run["sections"].items(), key=lambda item: -sum(item[1].values())):
+            print(f"      {name:<14} build {phases['build_s']:7.3f} s   layout {phases['layout_s']:7.3f} s")
+        print(f"      {'write':<14} {run['write_s']:13.3f} s")
+
+    save_results(args.output, results)
+    if args.compare:
+        compare(results, args.compare, ("equipment",),
+                [("wall", "wall_s"), ("peak RSS", "peak_rss_mb"), ("size", "output_bytes")])
+
+
+if __name__ == '__main__':
+    main()
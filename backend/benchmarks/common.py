@@ -0,0 +1,80 @@
+"""Helpers shared by the benchmark scripts"""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+
+def parse_size(text):
+    """'1k' -> 1000, '10M' -> 10000000"""
+    text = text.strip().lower()
+    if text[-1] in SUFFIXES:
+        return int(float(text[:-1]) * SUFFIXES[text[-1]])
+    return int(text)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_worker(script, *args):
+    """Run script --worker in a fresh interpreter and return the JSON it prints last"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(script), '--worker', *map(str, args)],
+        cwd=BACKEND_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def environment(**extra):
+    import numpy
+    import pandas
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        **extra,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_results(path, results, **extra):
+    with open(path, 'w') as f:
+        json.dump({"environment": environment(**extra), "results": results}, f, indent=2)
+    print(f"\nSaved {path}")
+
+
+def compare(results, baseline_path, key_fields, metrics):
+    """Print the percentage change of each metric against an earlier results file"""
+    with open(baseline_path) as f:
+        baseline = {tuple(r[k] for k in key_fields): r for r in json.load(f)["results"]}
+
+    print(f"\nChange against {baseline_path}")
+    for result in results:
+        before = baseline.get(tuple(result[k] for k in key_fields))
+        if not before:
+            continue
+        label = ' '.join(f"{result[k]:>11,}" if isinstance(result[k], int) else f"{result[k]:<9}"
+                         for k in key_fields)
+        changes = '   '.join(
+            f"{name} {(result[field] / before[field] - 1) * 100:+6.1f}%"
+            for name, field in metrics if before.get(field)
+        )
+        print(f"  {label} {changes}")
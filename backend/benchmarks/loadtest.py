@@ -0,0 +1,284 @@
+"""
+Load-test the REST API on this machine.
+
+By default a throwaway SQLite database is migrated and a local server
+(runserver, or gunicorn with --server gunicorn) is started on it. Users,
+JWT access tokens and one dataset per user are seeded straight through the
+ORM. Virtual users then send a weighted mix of requests for --duration
+seconds. Latency percentiles, throughput and error rate are reported per
+endpoint.
+
+With --url the harness targets a server that is already running instead;
+it must use the same database as this process (SQLITE_PATH / settings) so
+the seeded users exist there.
+
+Usage (from the backend directory):
+    python benchmarks/loadtest.py --profile mixed --concurrency 8 --duration 30
+    python benchmarks/loadtest.py --mix history=3,upload=1 --server gunicorn --workers 4
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import BACKEND_DIR, save_results
+from synthetic import make_frame
+
+ENDPOINTS = {
+    'upload': 'POST /api/upload/',
+    'history': 'GET /api/history/',
+    'dataset': 'GET /api/dataset/<id>/',
+    'pdf': 'POST /api/generate-pdf/',
+}
+
+# Relative request weights per workload profile
+PROFILES = {
+    'browse': {'history': 50, 'dataset': 45, 'upload': 5},
+    'mixed': {'history': 35, 'dataset': 30, 'upload': 25, 'pdf': 10},
+    'upload': {'upload': 80, 'history': 10, 'dataset': 10},
+    'report': {'pdf': 70, 'dataset': 30},
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def csv_text(rows, seed):
+    buffer = StringIO()
+    make_frame(rows, seed).to_csv(buffer, index=False, float_format='%.2f')
+    return buffer.getvalue()
+
+
+def seed_users(count, upload_rows, pdf_rows, seed):
+    """Create load-test users with a token and a dataset each; returns the request fixtures"""
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from equipment.utils import analyze_csv
+    from equipment.views import save_dataset
+
+    upload_csv = csv_text(upload_rows, seed)
+    summary = analyze_csv(StringIO(upload_csv))
+
+    users = []
+    for i in range(count):
+        user, created = User.objects.get_or_create(username=f'loadtest-{i}')
+        if created:
+            user.set_unusable_password()
+            user.save()
+        dataset = save_dataset(user, 'loadtest.csv', copy.deepcopy(summary))
+        users.append({"token": str(RefreshToken.for_user(user).access_token), "dataset_id": dataset.id})
+
+    report = analyze_csv(StringIO(csv_text(pdf_rows, seed + 1)))
+    report.pop("stats")
+    report.pop("distributions")
+    return users, upload_csv.encode(), json.dumps(report).encode()
+
+
+def multipart(field, filename, content):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: text/csv\r\n\r\n'
+    ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def send(method, url, token, body=None, content_type=None):
+    """Returns (status, body); status 0 means the connection itself failed"""
+    request = urllib.request.Request(url, data=body, method=method)
+    request.add_header('Authorization', f'Bearer {token}')
+    if content_type:
+        request.add_header('Content-Type', content_type)
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except (urllib.error.URLError, OSError):
+        return 0, b''
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, index, base_url, user, mix, fixtures, deadline, seed):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.token = user["token"]
+        self.dataset_id = user["dataset_id"]
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.upload_body, self.pdf_body = fixtures
+        self.deadline = deadline
+        self.rng = random.Random(seed * 1000 + index)
+        self.records = []
+
+    def request(self, name):
+        if name == 'upload':
+            body, content_type = multipart('file', 'loadtest.csv', self.upload_body)
+            return send('POST', f'{self.base_url}/api/upload/', self.token, body, content_type)
+        if name == 'history':
+            return send('GET', f'{self.base_url}/api/history/', self.token)
+        if name == 'dataset':
+            return send('GET', f'{self.base_url}/api/dataset/{self.dataset_id}/', self.token)
+        return send('POST', f'{self.base_url}/api/generate-pdf/', self.token, self.pdf_body, 'application/json')
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            name = self.rng.choices(self.names, self.weights)[0]
+            start = time.monotonic()
+            status, body = self.request(name)
+            self.records.append((name, start, time.monotonic() - start, status))
+            # Retention keeps the last five uploads, so follow the newest dataset
+            if name == 'upload' and status == 201:
+                self.dataset_id = json.loads(body)["id"]
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(records, window):
+    by_endpoint = {}
+    for name, _, latency, status in records:
+        by_endpoint.setdefault(name, []).append((latency, status))
+
+    results = []
+    for name, samples in sorted(by_endpoint.items()) + [('total', [s for v in by_endpoint.values() for s in v])]:
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, status in samples if not 200 <= status < 300)
+        results.append({
+            "endpoint": ENDPOINTS.get(name, name),
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "throughput_rps": len(samples) / window,
+            "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else None,
+            **{f"p{p}_ms": percentile(latencies, p) * 1000 if latencies else None for p in PERCENTILES},
+            "max_ms": latencies[-1] * 1000 if latencies else None,
+        })
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, port, workers, env, log):
+    if kind == 'gunicorn':
+        command = ['gunicorn', 'backend.wsgi:application', '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(workers), '--timeout', '300']
+    else:
+        command = [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(300):
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited with code {server.returncode}; see {log.name}")
+        if send('GET', f'{url}/api/history/', 'none')[0]:
+            return server, url
+        time.sleep(0.1)
+    server.terminate()
+    raise SystemExit("Server did not start within 30 seconds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--profile', choices=PROFILES, default='mixed')
+    parser.add_argument('--mix', help="custom weights instead of a profile, e.g. history=3,upload=1")
+    parser.add_argument('--concurrency', type=int, default=4, help="virtual users, each with its own account")
+    parser.add_argument('--duration', type=float, default=30, help="seconds of measured load")
+    parser.add_argument('--warmup', type=float, default=3, help="seconds of load before measuring")
+    parser.add_argument('--upload-rows', type=int, default=1000)
+    parser.add_argument('--pdf-rows', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', help="use an already running server instead of starting one")
+    parser.add_argument('--server', choices=('runserver', 'gunicorn'), default='runserver')
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument('--output', help="also save the results as JSON")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix) if args.mix else PROFILES[args.profile]
+
+    server = None
+    workdir = tempfile.mkdtemp(prefix='equipment-loadtest-')
+    if not args.url:
+        os.environ['SQLITE_PATH'] = os.path.join(workdir, 'db.sqlite3')
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=BACKEND_DIR, check=True)
+
+    print(f"Seeding {args.concurrency} users", flush=True)
+    users, upload_body, pdf_body = seed_users(args.concurrency, args.upload_rows, args.pdf_rows, args.seed)
+
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    try:
+        if args.url:
+            url = args.url.rstrip('/')
+        else:
+            server, url = start_server(args.server, free_port(), args.workers, dict(os.environ), log)
+            print(f"Started {args.server} at {url} (database and log in {workdir})", flush=True)
+
+        print(f"Running {json.dumps(mix)} with {args.concurrency} users for "
+              f"{args.warmup:g}+{args.duration:g} s", flush=True)
+        start = time.monotonic()
+        measure_from = start + args.warmup
+        vus = [VirtualUser(i, url, users[i], mix, (upload_body, pdf_body), measure_from + args.duration, args.seed)
+               for i in range(args.concurrency)]
+        for vu in vus:
+            vu.start()
+        for vu in vus:
+            vu.join()
+        # Requests still in flight at the deadline finish late and stretch the window
+        window = max(time.monotonic(), measure_from + args.duration) - measure_from
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        log.close()
+
+    records = [r for vu in vus for r in vu.records if r[1] >= measure_from]
+    results = summarize(records, window)
+
+    print(f"\n{'endpoint':<26}{'reqs':>7}{'err %':>7}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for r in results:
+        p = [f"{r[f'p{q}_ms']:9.1f}" if r[f'p{q}_ms'] is not None else f"{'-':>9}" for q in PERCENTILES]
+        print(f"{r['endpoint']:<26}{r['requests']:7}{r['error_rate'] * 100:7.1f}{r['throughput_rps']:8.1f}{''.join(p)}")
+
+    if args.output:
+        save_results(args.output, results, profile=args.mix or args.profile, concurrency=args.concurrency,
+                     duration_s=args.duration, server=args.url or args.server)
+
+
+if __name__ == '__main__':
+    main()
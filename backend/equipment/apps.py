@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class EquipmentConfig(AppConfig):
     name = 'equipment'
+
+    def ready(self):
+        # Registers the receivers that drop cached users when they change
+        from . import authentication  # noqa: F401
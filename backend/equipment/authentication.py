@@ -0,0 +1,48 @@
+"""
+JWT authentication that resolves request.user from the cache.
+
+simplejwt's JWTAuthentication loads the user row on every request. This
+subclass keeps the loaded user in Django's cache for AUTH_USER_CACHE_TTL
+seconds, so most authenticated requests run no user query at all. Saving
+or deleting a user drops its entry (see the receivers below), which makes
+deactivation and password changes take effect on the next request. Bulk
+QuerySet.update() calls send no signals; the TTL bounds those.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = cache.get(user_cache_key(user_id)) if user_id is not None else None
+        if user is None:
+            # Missing, inactive and revoked users raise here and are never cached
+            user = super().get_user(validated_token)
+            cache.set(user_cache_key(user_id), user, settings.AUTH_USER_CACHE_TTL)
+            return user
+
+        # A cached user is current, but this token may predate its password change
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def forget_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(getattr(instance, api_settings.USER_ID_FIELD)))
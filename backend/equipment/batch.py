@@ -0,0 +1,140 @@
+"""
+Batch uploads: many files (or zips of them) analyzed in parallel on a
+bounded process pool that is shared by all requests in this process.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .utils import analyze_csv, detect_format
+
+# Zip members analyzed; anything else in an archive is ignored
+ARCHIVE_EXTENSIONS = ('.csv', '.parquet', '.xlsx')
+
+WORKER_DIED_ERROR = "The analysis worker stopped unexpectedly (the file may be too large to analyze)"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    The analysis pool, started on first use.
+
+    Workers are spawned rather than forked so they never inherit the server's
+    threads or database connections; they only import the analysis code.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.UPLOAD_BATCH_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def analyze_file(path, options, max_rows):
+    """Worker entry point; errors come back as values so one bad file can't fail the batch"""
+    try:
+        return analyze_csv(path, max_rows=max_rows, **options), None
+    except Exception as e:
+        return None, str(e)
+
+
+def extract_zip(file, directory):
+    """
+    Extract the CSV, Parquet and Excel members of an uploaded zip into directory.
+
+    Returns (name, path) pairs. Members are streamed out one by one and the
+    total uncompressed size is capped at UPLOAD_MAX_BYTES.
+    """
+    extracted = []
+    total = 0
+    with zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(ARCHIVE_EXTENSIONS):
+                continue
+            name = os.path.basename(info.filename)
+            if name.startswith('.'):
+                continue
+            if len(extracted) >= settings.UPLOAD_BATCH_MAX_FILES:
+                raise ValueError(f"Batch exceeds the {settings.UPLOAD_BATCH_MAX_FILES} file limit")
+
+            path = os.path.join(directory, f"{len(extracted)}{os.path.splitext(name)[1]}")
+            with archive.open(info) as member, open(path, 'wb') as out:
+                for block in iter(lambda: member.read(1024 * 1024), b''):
+                    total += len(block)
+                    if total > settings.UPLOAD_MAX_BYTES:
+                        raise ValueError(f"Zip contents exceed the {settings.UPLOAD_MAX_BYTES} byte upload limit")
+                    out.write(block)
+            extracted.append((name, path))
+    return extracted
+
+
+def collect_files(files, directory):
+    """
+    Flatten uploaded files into (name, path) pairs, expanding zips (but not
+    Excel workbooks, which are zips too).
+
+    Plain uploads are read from where the upload handler spooled them.
+    """
+    collected = []
+    for file in files:
+        if detect_format(file) == 'zip':
+            collected.extend(extract_zip(file, tempfile.mkdtemp(dir=directory)))
+        elif hasattr(file, 'temporary_file_path'):
+            collected.append((file.name, file.temporary_file_path()))
+        else:
+            path = os.path.join(directory, f"upload-{len(collected)}")
+            with open(path, 'wb') as out:
+                shutil.copyfileobj(file, out)
+            collected.append((file.name, path))
+
+    if len(collected) > settings.UPLOAD_BATCH_MAX_FILES:
+        raise ValueError(f"Batch exceeds the {settings.UPLOAD_BATCH_MAX_FILES} file limit")
+    return collected
+
+
+def analyze_batch(paths, options, max_rows):
+    """
+    Analyze files in parallel, returning (summary, error) pairs in input order.
+
+    When a worker dies (e.g. killed for memory) the files the pool had not
+    finished are reported as failed, and a fresh pool is started next time.
+    With UPLOAD_BATCH_WORKERS = 0 the files are analyzed in this process.
+    """
+    if not settings.UPLOAD_BATCH_WORKERS:
+        return [analyze_file(path, options, max_rows) for path in paths]
+
+    try:
+        futures = [get_pool().submit(analyze_file, path, options, max_rows) for path in paths]
+    except BrokenProcessPool:
+        # Broken by an earlier batch since it was last used
+        reset_pool()
+        futures = [get_pool().submit(analyze_file, path, options, max_rows) for path in paths]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except BrokenProcessPool:
+            results.append((None, WORKER_DIED_ERROR))
+    if any(error == WORKER_DIED_ERROR for _, error in results):
+        reset_pool()
+    return results
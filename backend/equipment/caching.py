@@ -0,0 +1,58 @@
+"""
+Per-user cache of the history and dataset detail responses.
+
+Entries are keyed by user, and by dataset for details, and are deleted
+whenever the user's datasets change: when a dataset is created (single,
+batch and chunked uploads), appended to, or removed by retention. The
+deletes run right away and again once the surrounding transaction commits,
+so a read that races a batch upload cannot put the old list back.
+
+Invalidation only reaches processes that share the cache. With the default
+local-memory backend each worker process has its own, so RESPONSE_CACHE_TTL
+bounds how long another worker can serve an old entry. Configure a shared
+backend (file, Redis, Memcached) when running several workers or replicas.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .metrics import record_cache
+
+
+def history_key(user_id):
+    return f"response:history:{user_id}"
+
+
+def dataset_key(user_id, dataset_id, rows=True):
+    key = f"response:dataset:{user_id}:{dataset_id}"
+    return key if rows else f"{key}:summary"
+
+
+def cached_response(key, name, compute):
+    """Cached data for key, computed and stored on a miss unless compute returns None"""
+    data = cache.get(key)
+    record_cache(name, data is not None)
+    if data is None:
+        data = compute()
+        if data is not None:
+            cache.set(key, data, settings.RESPONSE_CACHE_TTL)
+    return data
+
+
+async def acached_response(key, name, compute):
+    """cached_response() for async views; compute is a coroutine function"""
+    data = await cache.aget(key)
+    record_cache(name, data is not None)
+    if data is None:
+        data = await compute()
+        if data is not None:
+            await cache.aset(key, data, settings.RESPONSE_CACHE_TTL)
+    return data
+
+
+def invalidate(user_id, dataset_ids=()):
+    """Drop the user's history and the given datasets' details, with and without rows"""
+    keys = [history_key(user_id)] + [dataset_key(user_id, dataset_id, rows)
+                                      for dataset_id in dataset_ids for rows in (True, False)]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,71 @@
+"""
+Executors for the CPU-heavy work of the async views (views_async.py), so the
+event loop keeps serving other requests meanwhile.
+
+Encoding responses runs on a worker thread. PDF reports are drawn on a
+bounded pool of spawned processes shared by all requests in this process,
+like batch uploads (batch.py): drawing holds the GIL for most of its time,
+and matplotlib's pyplot state is global, so threads would serialize anyway.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+_report_pool = None
+_report_pool_lock = threading.Lock()
+
+
+def get_report_pool():
+    """The report pool, started on first use"""
+    global _report_pool
+    with _report_pool_lock:
+        if _report_pool is None:
+            _report_pool = ProcessPoolExecutor(
+                max_workers=settings.REPORT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _report_pool
+
+
+def reset_report_pool():
+    global _report_pool
+    with _report_pool_lock:
+        if _report_pool is not None:
+            _report_pool.shutdown(wait=False, cancel_futures=True)
+        _report_pool = None
+
+
+async def run_cpu(func, *args):
+    """func(*args) on a worker thread, off the event loop"""
+    return await sync_to_async(func, thread_sensitive=False)(*args)
+
+
+def render_report(data):
+    """Report pool entry point: the PDF's bytes and the timings of its stages"""
+    from .pdf_generator import generate_pdf_report
+
+    timings = {}
+    pdf = generate_pdf_report(data, timings=timings)
+    return pdf.getvalue(), timings
+
+
+async def run_report(data):
+    """
+    render_report(data) on the report pool.
+
+    With REPORT_WORKERS = 0 the report is drawn on a thread of this process.
+    """
+    if not settings.REPORT_WORKERS:
+        return await run_cpu(render_report, data)
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_report_pool(), render_report, data)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        reset_report_pool()
+        raise
@@ -0,0 +1,23 @@
+"""
+The columns an upload must have and the signatures of the binary formats.
+
+Kept apart from utils so the upload preflight (uploads.py) can check a
+file's header before pandas is loaded.
+"""
+REQUIRED_COLUMNS = [
+    'Equipment Name',
+    'Type',
+    'Flowrate',
+    'Pressure',
+    'Temperature'
+]
+
+PARQUET_MAGIC = b'PAR1'
+ZIP_MAGIC = b'PK\x03\x04'
+OLE_MAGIC = b'\xd0\xcf\x11\xe0'
+
+
+def validate_columns(columns):
+    missing = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing:
+        raise ValueError(f"Invalid CSV format: missing {', '.join(missing)}")
@@ -0,0 +1,189 @@
+"""
+Opt-in memory accounting for the upload and report endpoints.
+
+With the MEMORY_ACCOUNTING setting on, requests to views that set
+track_memory = True (UploadCSVView and GeneratePDFView) run under
+tracemalloc. For the whole request and for every stage() inside it the
+peak traced allocation above the level at its start and the change in
+resident set size are recorded. Stages of interest include parse (the
+DataFrame), records (the records list), render (JSON encoding),
+build:<name>_chart (matplotlib figures), and build:<section> and write
+(reportlab flowables and their layout). Each request is logged as one JSON
+line to "equipment.memory" and observed in the Prometheus histograms.
+
+tracemalloc slows allocation-heavy code down and traces the whole process,
+so in a threaded server the numbers of concurrent requests overlap.
+Gunicorn's sync workers handle one request at a time; under ASGI the
+requests one process serves concurrently overlap the same way.
+"""
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import record_memory, view_label
+from .timing import memory_tracker
+
+logger = logging.getLogger('equipment.memory')
+
+_lock = threading.Lock()
+_tracing_requests = 0
+_owns_tracing = False
+
+
+def current_rss():
+    """Resident set size in bytes, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    """Highest resident set size of the process so far, in bytes"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def start_tracing():
+    global _tracing_requests, _owns_tracing
+    with _lock:
+        if _tracing_requests == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _owns_tracing = True
+        _tracing_requests += 1
+
+
+def stop_tracing():
+    global _tracing_requests, _owns_tracing
+    with _lock:
+        _tracing_requests -= 1
+        # Tracing started outside (e.g. PYTHONTRACEMALLOC) is left running
+        if _tracing_requests == 0 and _owns_tracing:
+            tracemalloc.stop()
+            _owns_tracing = False
+
+
+class MemoryTracker:
+    """Peak traced allocation and RSS change of nested stages"""
+
+    def __init__(self):
+        # One [name, traced at start, rss at start, highest peak of its finished children] per open stage
+        self.stack = []
+        self.stages = {}
+
+    def enter(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        # Resetting the peak below would lose what the enclosing stage has reached so far
+        if self.stack:
+            self.stack[-1][3] = max(self.stack[-1][3], peak)
+        tracemalloc.reset_peak()
+        self.stack.append([name, current, current_rss(), current])
+
+    def exit(self):
+        name, start, start_rss, child_peak = self.stack.pop()
+        peak = max(tracemalloc.get_traced_memory()[1], child_peak)
+        if self.stack:
+            self.stack[-1][3] = max(self.stack[-1][3], peak)
+
+        rss = current_rss()
+        usage = {
+            "peak_traced_bytes": peak - start,
+            "rss_delta_bytes": rss - start_rss if rss is not None and start_rss is not None else None,
+        }
+        # A stage entered more than once keeps its highest peak and the sum of its RSS changes
+        earlier = self.stages.get(name)
+        if earlier:
+            usage["peak_traced_bytes"] = max(usage["peak_traced_bytes"], earlier["peak_traced_bytes"])
+            if earlier["rss_delta_bytes"] is not None and usage["rss_delta_bytes"] is not None:
+                usage["rss_delta_bytes"] += earlier["rss_delta_bytes"]
+        self.stages[name] = usage
+        return usage
+
+    def exit_stage(self, name):
+        """Close name if it is the innermost open stage"""
+        if self.stack and self.stack[-1][0] == name:
+            self.exit()
+
+
+class MemoryAccountingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'MEMORY_ACCOUNTING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.account(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.account(request, await self.get_response(request))
+
+    def account(self, request, response):
+        tracker = getattr(request, 'memory', None)
+        if tracker is not None:
+            # DRF responses are rendered just before the response comes back here
+            tracker.exit_stage('render')
+            self.finish(request, response, tracker)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if not getattr(view_class, 'track_memory', False):
+            return None
+
+        # stage() only runs, and so only accounts memory, when the request has timings
+        if not hasattr(request, 'timings'):
+            request.timings = {}
+        start_tracing()
+        request.memory = MemoryTracker()
+        request.memory_token = memory_tracker.set(request.memory)
+        request.memory_peak_rss = peak_rss()
+        request.memory.enter('request')
+        return None
+
+    def process_template_response(self, request, response):
+        tracker = getattr(request, 'memory', None)
+        if tracker is not None:
+            tracker.enter('render')
+        return response
+
+    def finish(self, request, response, tracker):
+        while len(tracker.stack) > 1:
+            tracker.exit()
+        usage = tracker.exit()
+        del tracker.stages['request']
+        if self.async_mode:
+            # Django ran process_view in a copy of this context, so its token can't reset it here
+            memory_tracker.set(None)
+        else:
+            memory_tracker.reset(request.memory_token)
+        stop_tracing()
+
+        user = getattr(request, 'user', None)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "user": user.pk if user is not None and user.is_authenticated else None,
+            **usage,
+            "peak_rss_growth_bytes": peak_rss() - request.memory_peak_rss,
+            "stages": tracker.stages,
+        }
+        logger.info(json.dumps(record), extra={"memory": record})
+        record_memory(view_label(request), usage, tracker.stages)
@@ -0,0 +1,163 @@
+"""
+Prometheus metrics, served at /metrics.
+
+Every request is counted and timed per view (its URL route), together with
+the number of SQL queries it ran and the stage() timings the views record.
+Uploads add the rows analyzed and bytes received, PDF reports the render
+time of each chart, and the dataset caches their hits and misses. With
+memory accounting on (equipment/memory.py) the tracked views also report
+their peak traced allocation and RSS change per request and per stage.
+
+Gunicorn workers are separate processes with separate counters. When
+PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py sets it for every worker)
+each process writes its samples to files in that directory and /metrics
+adds them all up, whichever worker answers the scrape.
+"""
+import hmac
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, HttpResponseNotFound
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+from .querycount import QueryCounter, async_execute_wrapper
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+# 256 KiB to 4 GiB in steps of 4; RSS can also shrink, which lands in the first bucket
+MEMORY_BUCKETS = tuple(4 ** i * 256 * 1024 for i in range(9))
+
+REQUESTS = Counter(
+    'equipment_http_requests', 'HTTP requests by view, method and status', ['view', 'method', 'status']
+)
+REQUEST_SECONDS = Histogram(
+    'equipment_http_request_duration_seconds', 'Request latency by view', ['view'], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    'equipment_stage_duration_seconds', 'Time spent in each request stage', ['view', 'stage'],
+    buckets=LATENCY_BUCKETS
+)
+DB_QUERIES = Histogram(
+    'equipment_db_queries_per_request', 'SQL queries run per request', ['view'], buckets=QUERY_BUCKETS
+)
+ROWS_ANALYZED = Counter('equipment_rows_analyzed', 'Equipment rows analyzed from uploads', ['view'])
+UPLOAD_BYTES = Counter('equipment_upload_bytes', 'Bytes of uploaded files analyzed', ['view'])
+CHART_SECONDS = Histogram(
+    'equipment_pdf_chart_render_seconds', 'Time spent drawing each PDF report chart', ['chart'],
+    buckets=LATENCY_BUCKETS
+)
+CACHE_REQUESTS = Counter('equipment_cache_requests', 'Dataset cache lookups by result', ['cache', 'result'])
+REQUEST_PEAK_TRACED = Histogram(
+    'equipment_request_peak_traced_bytes', 'Peak traced allocation per request', ['view'],
+    buckets=MEMORY_BUCKETS
+)
+REQUEST_RSS_DELTA = Histogram(
+    'equipment_request_rss_delta_bytes', 'Change in resident set size per request', ['view'],
+    buckets=MEMORY_BUCKETS
+)
+STAGE_PEAK_TRACED = Histogram(
+    'equipment_stage_peak_traced_bytes', 'Peak traced allocation per request stage', ['view', 'stage'],
+    buckets=MEMORY_BUCKETS
+)
+STAGE_RSS_DELTA = Histogram(
+    'equipment_stage_rss_delta_bytes', 'Change in resident set size per request stage', ['view', 'stage'],
+    buckets=MEMORY_BUCKETS
+)
+
+
+def view_label(request):
+    """The URL route the request resolved to, which keeps label values bounded"""
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match else 'unmatched'
+
+
+def record_upload(request, rows, nbytes):
+    if settings.METRICS_ENABLED:
+        view = view_label(request)
+        ROWS_ANALYZED.labels(view).inc(rows)
+        UPLOAD_BYTES.labels(view).inc(nbytes)
+
+
+def record_cache(name, hit):
+    if settings.METRICS_ENABLED:
+        CACHE_REQUESTS.labels(name, 'hit' if hit else 'miss').inc()
+
+
+def record_memory(view, usage, stages):
+    """Observe a memory-accounted request; see equipment/memory.py"""
+    if not settings.METRICS_ENABLED:
+        return
+    REQUEST_PEAK_TRACED.labels(view).observe(usage["peak_traced_bytes"])
+    if usage["rss_delta_bytes"] is not None:
+        REQUEST_RSS_DELTA.labels(view).observe(usage["rss_delta_bytes"])
+    for name, stage_usage in stages.items():
+        STAGE_PEAK_TRACED.labels(view, name).observe(stage_usage["peak_traced_bytes"])
+        if stage_usage["rss_delta_bytes"] is not None:
+            STAGE_RSS_DELTA.labels(view, name).observe(stage_usage["rss_delta_bytes"])
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Reuse the Server-Timing dict when that middleware is on, so stage() records once for both
+        if not hasattr(request, 'timings'):
+            request.timings = {}
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        return self.finish(request, response, queries, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not hasattr(request, 'timings'):
+            request.timings = {}
+        queries = QueryCounter()
+        start = time.perf_counter()
+        async with async_execute_wrapper(queries):
+            response = await self.get_response(request)
+        return self.finish(request, response, queries, time.perf_counter() - start)
+
+    def finish(self, request, response, queries, elapsed):
+        view = view_label(request)
+        REQUESTS.labels(view, request.method, str(response.status_code)).inc()
+        REQUEST_SECONDS.labels(view).observe(elapsed)
+        DB_QUERIES.labels(view).observe(queries.count)
+        for name, secs in request.timings.items():
+            STAGE_SECONDS.labels(view, name).observe(secs)
+            # generate_pdf_report times each chart section as build:<name>_chart
+            if name.startswith('build:') and name.endswith('_chart'):
+                CHART_SECONDS.labels(name[len('build:'):]).observe(secs)
+        return response
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        return HttpResponseNotFound()
+
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
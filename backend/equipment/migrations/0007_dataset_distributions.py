@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0006_dataset_type_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='distributions',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -1,6 +1,17 @@
-from django.db import models
+import json
+import uuid
+
+from django.db import models, connection, NotSupportedError
+from django.db.models.expressions import RawSQL
 from django.contrib.auth.models import User
 
+# equipment_data with more rows added to its end, computed by the database
+APPEND_ROWS_SQL = {
+    'sqlite': ('(SELECT json_group_array(json(value)) FROM (SELECT value FROM json_each("equipment_data") '
+               'UNION ALL SELECT value FROM json_each(%s)))'),
+    'postgresql': '"equipment_data" || %s::jsonb',
+}
+
 class Dataset(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='datasets', null=True, blank=True)
     filename = models.CharField(max_length=255)
@@ -15,10 +26,53 @@ class Dataset(models.Model):
     equipment_by_type = models.JSONField(default=dict)
     equipment_data = models.JSONField(default=list)
     smart_insights = models.JSONField(default=dict)
+    type_stats = models.JSONField(default=dict)
+
+    # Mergeable sufficient statistics used to append rows without re-reading them
+    stats = models.JSONField(default=dict)
+    # Per-parameter quantile sketches and histograms (see sketches.py)
+    distributions = models.JSONField(default=dict)
 
     class Meta:
         ordering = ['-uploaded_at']
 
+    @staticmethod
+    def appended_rows(rows):
+        """
+        An update() value for equipment_data that adds rows to its end in SQL,
+        so appends don't load and rewrite the rows already stored.
+        """
+        if connection.vendor not in APPEND_ROWS_SQL:
+            raise NotSupportedError(f"Appending rows is not supported on {connection.vendor}")
+        return RawSQL(APPEND_ROWS_SQL[connection.vendor], [json.dumps(rows)])
+
     def __str__(self):
         username = self.user.username if self.user else "Unknown"
         return f"{username} - {self.filename}"
+
+
+class UploadSession(models.Model):
+    """A resumable chunked upload; the chunks themselves live on disk until commit"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Set on commit, so a retried commit returns the same dataset
+    dataset = models.ForeignKey(Dataset, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Set while a commit is analyzing the file, so a retry meanwhile can't save a second dataset
+    committing_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def expected_chunk_size(self, index):
+        if index == self.total_chunks - 1:
+            return self.total_size - self.chunk_size * index
+        return self.chunk_size
+
+    def __str__(self):
+        return f"{self.user.username} - {self.filename} ({self.id})"
@@ -1,7 +1,7 @@
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image, Frame, PageTemplate
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image, Frame, PageTemplate, Flowable
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.pdfgen import canvas
@@ -9,10 +9,13 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from io import BytesIO
 from datetime import datetime
+import time
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 import numpy as np
+from .utils import downsample_series
+from .timing import memory_tracker
 
 # Application Color Scheme (matching React frontend)
 COLORS = {
@@ -33,12 +36,30 @@ COLORS = {
     ]
 }
 
+# Trend chart: label every item up to this many, otherwise plot an LTTB-downsampled series
+TREND_LABELLED_ITEMS = 20
+TREND_CHART_POINTS = 300
+
 # Safety thresholds (configurable)
 THRESHOLDS = {
     'flowrate': {'min': 50, 'max': 500, 'critical_max': 600},
     'pressure': {'min': 100, 'max': 800, 'critical_max': 1000},
     'temperature': {'min': 50, 'max': 350, 'critical_max': 400}
 }
+READINGS = tuple(THRESHOLDS)
+
+def fill_missing_readings(equipment_data):
+    """Records with blank (null) readings set to NaN, which no threshold check flags"""
+    return [
+        {**eq, **{key: float('nan') for key in READINGS if eq[key] is None}}
+        if any(eq[key] is None for key in READINGS) else eq
+        for eq in equipment_data
+    ]
+
+
+def format_reading(value):
+    return '-' if np.isnan(value) else f"{value:.1f}"
+
 
 def check_safety_warnings(data):
     """Check for equipment operating outside safe parameters"""
@@ -168,8 +189,8 @@ def create_trend_chart(data):
     if not equipment_data:
         return None
     
-    # Limit to first 20 for readability (increased from 15)
-    equipment_data = equipment_data[:20]
+    if len(equipment_data) > TREND_LABELLED_ITEMS:
+        return create_downsampled_trend_chart(equipment_data)
     
     # Wider chart to prevent overlap
     fig, ax = plt.subplots(figsize=(10, 6), facecolor='white')
@@ -210,6 +231,37 @@ def create_trend_chart(data):
     
     return img_buffer
 
+def create_downsampled_trend_chart(equipment_data):
+    """Trend chart for large datasets: every series reduced with LTTB, no per-item labels"""
+    fig, ax = plt.subplots(figsize=(10, 6), facecolor='white')
+    
+    series = downsample_series(equipment_data, TREND_CHART_POINTS)['series']
+    styles = [
+        ('flowrate', 'Flowrate', COLORS['primary']),
+        ('pressure', 'Pressure', COLORS['secondary']),
+        ('temperature', 'Temperature', COLORS['accent']),
+    ]
+    for key, label, color in styles:
+        ax.plot(series[key]['x'], series[key]['y'], color=color, label=label, linewidth=1.5)
+    
+    ax.set_xlabel(f'Equipment # (of {len(equipment_data)})', fontweight='bold', fontsize=11, color='#374151')
+    ax.set_ylabel('Value', fontweight='bold', fontsize=11, color='#374151')
+    ax.set_title('Equipment Parameter Trends', fontweight='bold', fontsize=14, pad=20, color='#111827')
+    
+    ax.legend(loc='upper right', fontsize=10, framealpha=0.9, edgecolor='#e5e7eb')
+    ax.grid(axis='y', alpha=0.2, linestyle='--', color='#9ca3af')
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    
+    plt.tight_layout()
+    
+    img_buffer = BytesIO()
+    plt.savefig(img_buffer, format='png', dpi=200, bbox_inches='tight')
+    img_buffer.seek(0)
+    plt.close()
+    
+    return img_buffer
+
 def create_safety_chart(data):
     """Create chart showing equipment in different safety zones"""
     equipment_data = data.get('equipment_data', [])
@@ -311,20 +363,114 @@ class HeaderCanvas(canvas.Canvas):
         self.setFillColor(colors.HexColor('#a1a1aa'))
         self.drawRightString(letter[0] - 40, letter[1] - 50, f"Page {page_num} of {page_count}")
 
-def generate_pdf_report(data):
+class SectionStart(Flowable):
+    """Zero-size marker placed before each report section when timing a report"""
+
+    def __init__(self, name):
+        Flowable.__init__(self)
+        self.name = name
+
+    def wrap(self, availWidth, availHeight):
+        return 0, 0
+
+    def draw(self):
+        pass
+
+
+class ReportDocTemplate(SimpleDocTemplate):
+    """
+    Document template that, given a timings dict, charges the layout and
+    drawing time between SectionStart markers to "layout:<section>" and the
+    final page decoration and PDF write to "write".
+    """
+
+    def __init__(self, *args, timings=None, **kwargs):
+        SimpleDocTemplate.__init__(self, *args, **kwargs)
+        self.timings = timings
+        self.section = None
+
+    def build(self, flowables, **kwargs):
+        tracker = memory_tracker.get()
+        if tracker is not None:
+            tracker.enter("write")
+        self.mark = time.perf_counter()
+        try:
+            SimpleDocTemplate.build(self, flowables, **kwargs)
+        finally:
+            if tracker is not None:
+                tracker.exit()
+        if self.timings is not None:
+            self.timings["write"] = time.perf_counter() - self.mark
+
+    def afterFlowable(self, flowable):
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        if self.section:
+            key = f"layout:{self.section}"
+            self.timings[key] = self.timings.get(key, 0.0) + now - self.mark
+        if isinstance(flowable, SectionStart):
+            self.section = flowable.name
+        self.mark = now
+
+
+class SectionTimer:
+    """
+    Times report sections built one after another. start() closes the
+    previous section, charging its build time (including chart rendering)
+    to "build:<section>", and adds the SectionStart marker that
+    ReportDocTemplate times layout from. A no-op when timings is None.
+    """
+
+    def __init__(self, elements, timings):
+        self.elements = elements
+        self.timings = timings
+        self.section = None
+
+    def start(self, name):
+        self.stop()
+        if self.timings is None:
+            return
+        self.elements.append(SectionStart(name))
+        self.section = f"build:{name}"
+        tracker = memory_tracker.get()
+        if tracker is not None:
+            tracker.enter(self.section)
+        self.mark = time.perf_counter()
+
+    def stop(self):
+        if self.section is None:
+            return
+        self.timings[self.section] = self.timings.get(self.section, 0.0) + time.perf_counter() - self.mark
+        tracker = memory_tracker.get()
+        if tracker is not None:
+            tracker.exit_stage(self.section)
+        self.section = None
+
+
+def generate_pdf_report(data, timings=None):
     """
     Generate a comprehensive PDF report with modern design
+
+    Pass a dict as timings to get the seconds spent building each section
+    ("build:<section>", which includes rendering its chart), laying it out
+    and drawing it ("layout:<section>"), and writing the file ("write").
     """
+    if data.get('equipment_data'):
+        data = {**data, 'equipment_data': fill_missing_readings(data['equipment_data'])}
+
     buffer = BytesIO()
-    doc = SimpleDocTemplate(
+    doc = ReportDocTemplate(
         buffer, 
         pagesize=letter, 
         topMargin=100,  # Space for header banner
         bottomMargin=0.5*inch,
         leftMargin=0.75*inch,
-        rightMargin=0.75*inch
+        rightMargin=0.75*inch,
+        timings=timings
     )
     elements = []
+    sections = SectionTimer(elements, timings)
     styles = getSampleStyleSheet()
     
     # Custom styles with modern fonts
@@ -391,6 +537,7 @@ def generate_pdf_report(data):
     )
     
     # Report metadata section
+    sections.start('overview')
     date_str = datetime.now().strftime("%B %d, %Y at %I:%M %p")
     
     # Overview section with colored card
@@ -439,6 +586,7 @@ def generate_pdf_report(data):
     elements.append(Spacer(1, 0.3 * inch))
     
     # Safety Threshold Information
+    sections.start('thresholds')
     threshold_title = Paragraph("Safety Threshold Settings", heading2_style)
     elements.append(threshold_title)
     
@@ -470,6 +618,7 @@ def generate_pdf_report(data):
     elements.append(Spacer(1, 0.3 * inch))
     
     # Bar Chart
+    sections.start('bar_chart')
     bar_chart_img = create_bar_chart(data)
     if bar_chart_img:
         chart_title = Paragraph("Average Parameters", heading2_style)
@@ -479,6 +628,7 @@ def generate_pdf_report(data):
         elements.append(Spacer(1, 0.3 * inch))
     
     # Pie Chart
+    sections.start('pie_chart')
     pie_chart_img = create_pie_chart(data)
     if pie_chart_img:
         chart_title = Paragraph("Equipment Distribution", heading2_style)
@@ -490,6 +640,7 @@ def generate_pdf_report(data):
     elements.append(PageBreak())
     
     # Trend Chart
+    sections.start('trend_chart')
     trend_chart_img = create_trend_chart(data)
     if trend_chart_img:
         chart_title = Paragraph("Equipment Parameter Trends", heading2_style)
@@ -499,6 +650,7 @@ def generate_pdf_report(data):
         elements.append(Spacer(1, 0.3 * inch))
     
     # Safety Analysis Chart
+    sections.start('safety_chart')
     safety_chart_img = create_safety_chart(data)
     if safety_chart_img:
         chart_title = Paragraph("Safety Status Distribution", heading2_style)
@@ -508,6 +660,7 @@ def generate_pdf_report(data):
         elements.append(Spacer(1, 0.3 * inch))
     
     # Safety Warnings
+    sections.start('warnings')
     warnings = check_safety_warnings(data)
     if warnings:
         warning_title = Paragraph("⚠ Safety Warnings", heading2_style)
@@ -565,6 +718,7 @@ def generate_pdf_report(data):
         elements.append(Spacer(1, 0.3 * inch))
     
     # Equipment Distribution Table
+    sections.start('distribution')
     if 'equipment_by_type' in data and data['equipment_by_type']:
         elements.append(PageBreak())
         dist_title = Paragraph("Equipment Distribution by Type", heading2_style)
@@ -600,6 +754,7 @@ def generate_pdf_report(data):
         elements.append(Spacer(1, 0.3 * inch))
     
     # Equipment Details with Safety Status
+    sections.start('details')
     if 'equipment_data' in data and data['equipment_data']:
         details_title = Paragraph("Detailed Equipment Data with Safety Status", heading2_style)
         elements.append(details_title)
@@ -625,9 +780,9 @@ def generate_pdf_report(data):
             details_data.append([
                 eq['name'][:20],
                 eq['type'],
-                f"{eq['flowrate']:.1f}",
-                f"{eq['pressure']:.1f}",
-                f"{eq['temperature']:.1f}",
+                format_reading(eq['flowrate']),
+                format_reading(eq['pressure']),
+                format_reading(eq['temperature']),
                 status
             ])
         
@@ -654,6 +809,8 @@ def generate_pdf_report(data):
         details_table.setStyle(TableStyle(table_style))
         elements.append(details_table)
     
+    sections.stop()
+
     # Build PDF with custom canvas
     doc.build(elements, canvasmaker=HeaderCanvas)
     buffer.seek(0)
@@ -0,0 +1,243 @@
+"""
+On-demand sampling profiles of single requests, for staff users.
+
+A request sent with an "X-Profile" header or a "profile" query parameter
+("collapsed", the default, or "speedscope") by a staff user runs with a
+background thread sampling its stack every REQUEST_PROFILE_INTERVAL
+seconds. The profile is saved under REQUEST_PROFILE_DIR as
+<request id>.collapsed (Brendan Gregg's folded stacks, for flamegraph.pl
+and speedscope) or <request id>.speedscope.json. The response carries the
+request id in X-Request-ID, and staff can download the profile from
+/api/profiles/<request id>/.
+
+The request id is the client's own X-Request-ID when it is a simple token,
+so profiles can be matched with the caller's logs. Requests without the
+switch only pay for the header and query string lookup; with the
+REQUEST_PROFILING setting off the middleware is removed entirely.
+
+An async request (under ASGI) has no single thread of its own: its ORM
+calls, JSON encoding and the like run on worker threads. Its profile
+samples every thread of the process instead, each stack rooted at its
+thread's name, so requests served at the same time show up in it too.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedJWTAuthentication
+
+FORMATS = {'collapsed': '.collapsed', 'speedscope': '.speedscope.json'}
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples another thread's Python stack until stopped; with thread_id None,
+    the stacks of every other thread, each under a frame naming its thread
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stopped = threading.Event()
+        # {(frame, ...) root first: seconds}, a frame being (function, file, line)
+        self.stacks = Counter()
+        self.duration = 0.0
+
+    def run(self):
+        start = last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            # Weight each sample by the time since the last one; the GIL can delay the sampler
+            if self.thread_id is None:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in frames.items():
+                    if thread_id != self.ident:
+                        root = (f"thread {names.get(thread_id, thread_id)}", '', 0)
+                        self.stacks[(root,) + self.stack(frame)] += now - last
+            else:
+                self.stacks[self.stack(frames.get(self.thread_id))] += now - last
+            last = now
+        self.duration = time.perf_counter() - start
+
+    @staticmethod
+    def stack(frame):
+        """(function, file, line) of each frame, root first"""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def frame_name(frame):
+    name, filename, line = frame
+    if not filename:
+        return name
+    return f"{name} ({os.path.relpath(filename, settings.BASE_DIR)}:{line})"
+
+
+def collapsed_stacks(stacks, interval):
+    """One 'frame;frame;frame count' line per stack, counted in sampling intervals"""
+    lines = []
+    for stack, seconds in sorted(stacks.items()):
+        count = max(1, round(seconds / interval))
+        lines.append(f"{';'.join(frame_name(f).replace(';', ':') for f in stack)} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+def speedscope_profile(stacks, duration, name):
+    frames = {}
+    samples = []
+    weights = []
+    for stack, seconds in stacks.items():
+        samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+        weights.append(seconds)
+    return {
+        "$schema": SPEEDSCOPE_SCHEMA,
+        "name": name,
+        "shared": {"frames": [{"name": f[0], "file": f[1], "line": f[2]} for f in frames]},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": duration,
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+def profile_path(request_id, fmt):
+    return os.path.join(settings.REQUEST_PROFILE_DIR, request_id + FORMATS[fmt])
+
+
+def find_profile(request_id):
+    """Path and format of a stored profile, or (None, None)"""
+    if REQUEST_ID_PATTERN.match(request_id):
+        for fmt in FORMATS:
+            path = profile_path(request_id, fmt)
+            if os.path.exists(path):
+                return path, fmt
+    return None, None
+
+
+def prune_profiles():
+    """Keep only the newest REQUEST_PROFILE_KEEP profiles"""
+    directory = settings.REQUEST_PROFILE_DIR
+    paths = sorted((os.path.join(directory, name) for name in os.listdir(directory)),
+                   key=os.path.getmtime, reverse=True)
+    for path in paths[settings.REQUEST_PROFILE_KEEP:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def save_profile(sampler, request, request_id, fmt):
+    os.makedirs(settings.REQUEST_PROFILE_DIR, exist_ok=True)
+    path = profile_path(request_id, fmt)
+    if fmt == 'speedscope':
+        content = json.dumps(speedscope_profile(sampler.stacks, sampler.duration,
+                                                f"{request.method} {request.path} {request_id}"))
+    else:
+        content = collapsed_stacks(sampler.stacks, settings.REQUEST_PROFILE_INTERVAL)
+    with open(path + '.tmp', 'w') as out:
+        out.write(content)
+    os.replace(path + '.tmp', path)
+    prune_profiles()
+
+
+def is_staff(request):
+    """Whether the request's JWT belongs to a staff user; only checked for profiled requests"""
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+def profile_format(request):
+    """The profile format a request asks for, or None"""
+    fmt = request.headers.get('X-Profile') or request.GET.get('profile')
+    if not fmt:
+        return None
+    return 'collapsed' if fmt not in FORMATS else fmt
+
+
+def request_id_for(request):
+    request_id = request.headers.get('X-Request-ID', '')
+    return request_id if REQUEST_ID_PATTERN.match(request_id) else uuid.uuid4().hex
+
+
+def profiled(response, request_id):
+    response['X-Request-ID'] = request_id
+    response['X-Profile'] = f"/api/profiles/{request_id}/"
+    return response
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        fmt = profile_format(request)
+        if not fmt or not is_staff(request):
+            return self.get_response(request)
+
+        request_id = request_id_for(request)
+        sampler = StackSampler(threading.get_ident(), settings.REQUEST_PROFILE_INTERVAL)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        save_profile(sampler, request, request_id, fmt)
+        return profiled(response, request_id)
+
+    async def __acall__(self, request):
+        fmt = profile_format(request)
+        if not fmt or not await sync_to_async(is_staff)(request):
+            return await self.get_response(request)
+
+        request_id = request_id_for(request)
+        sampler = StackSampler(None, settings.REQUEST_PROFILE_INTERVAL)
+        sampler.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(sampler.stop, thread_sensitive=False)()
+        await sync_to_async(save_profile, thread_sensitive=False)(sampler, request, request_id, fmt)
+        return profiled(response, request_id)
@@ -0,0 +1,158 @@
+"""
+SQL query counting: how many queries a request runs, roughly how many bytes
+they fetch, and which statements repeat (the signature of an N+1 loop).
+
+QueryCountMiddleware reports the counts of every request in X-Query-Count
+and X-Query-Bytes headers and logs repeated statements to
+"equipment.queries". It is meant for development: it runs when the
+QUERY_COUNTING setting is on, which is only ever the case with DEBUG.
+
+query_budget() is the test-side counterpart. The block fails with the list of
+statements it ran when it goes over its query or byte budget.
+"""
+import logging
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger('equipment.queries')
+
+# A statement run this many times in one request is reported as a likely N+1
+REPEAT_THRESHOLD = 5
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries run through it"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def value_size(value):
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return len(value)
+    return 0 if value is None else 8
+
+
+class QueryStats(QueryCounter):
+    """
+    QueryCounter that also keeps each statement and estimates the bytes its
+    rows take, by wrapping the fetch methods of the cursors it sees. Text and
+    binary columns count their length, other non-null values 8 bytes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.bytes = 0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(sql)
+        self.watch(context['cursor'])
+        return super().__call__(execute, sql, params, many, context)
+
+    def watch(self, cursor):
+        # CursorWrapper forwards unknown attributes to the driver's cursor, so instance attributes win
+        if cursor.__dict__.get('_query_stats') is self:
+            return
+        cursor._query_stats = self
+        # Captured through the wrapper, so database errors are still translated
+        fetchone, fetchmany, fetchall = cursor.fetchone, cursor.fetchmany, cursor.fetchall
+
+        def count(rows):
+            self.bytes += sum(value_size(value) for row in rows for value in row)
+            return rows
+
+        def counted_fetchone():
+            row = fetchone()
+            if row is not None:
+                count([row])
+            return row
+
+        cursor.fetchone = counted_fetchone
+        cursor.fetchmany = lambda *args, **kwargs: count(fetchmany(*args, **kwargs))
+        cursor.fetchall = lambda: count(fetchall())
+
+    def repeated(self, threshold=REPEAT_THRESHOLD):
+        """{sql: times run} for statements run at least threshold times"""
+        return {sql: n for sql, n in Counter(self.statements).items() if n >= threshold}
+
+
+@contextmanager
+def count_queries():
+    """Count the queries run on the default database inside the block"""
+    stats = QueryStats()
+    with connection.execute_wrapper(stats):
+        yield stats
+
+
+@asynccontextmanager
+async def async_execute_wrapper(wrapper):
+    """
+    connection.execute_wrapper() for async code. Connections are per thread,
+    so the wrapper goes on the one of the thread sync_to_async runs this
+    request's ORM calls on, rather than the event loop's.
+    """
+    wrappers = await sync_to_async(lambda: connection.execute_wrappers)()
+    wrappers.append(wrapper)
+    try:
+        yield
+    finally:
+        wrappers.remove(wrapper)
+
+
+@contextmanager
+def query_budget(max_queries, max_bytes=None, label='Block'):
+    """Fail when the block runs more than max_queries queries or fetches more than max_bytes"""
+    with count_queries() as stats:
+        yield stats
+
+    problems = []
+    if stats.count > max_queries:
+        problems.append(f"ran {stats.count} queries, budget {max_queries}")
+    if max_bytes is not None and stats.bytes > max_bytes:
+        problems.append(f"fetched {stats.bytes} bytes, budget {max_bytes}")
+    if problems:
+        statements = '\n'.join(f"  {i}. {sql}" for i, sql in enumerate(stats.statements, 1))
+        raise AssertionError(f"{label} {' and '.join(problems)}:\n{statements}")
+
+
+class QueryCountMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_COUNTING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with count_queries() as stats:
+            response = self.get_response(request)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        async with async_execute_wrapper(stats):
+            response = await self.get_response(request)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        response['X-Query-Count'] = str(stats.count)
+        response['X-Query-Bytes'] = str(stats.bytes)
+        for sql, times in stats.repeated().items():
+            logger.warning("%s %s ran the same query %d times: %s", request.method, request.path, times, sql)
+        return response
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -37,3 +38,14 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name')
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Token pair, plus the user's profile when include_user is true, saving clients a request"""
+    include_user = serializers.BooleanField(required=False, default=False, write_only=True)
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        if attrs.get('include_user'):
+            data['user'] = UserSerializer(self.user).data
+        return data
@@ -0,0 +1,168 @@
+"""
+Mergeable distribution summaries stored with each Dataset: a t-digest style
+quantile sketch and a fixed-width histogram per numeric parameter.
+
+Both are plain JSON-serializable dicts so they can live in a JSONField and
+be updated with appended rows without touching the stored ones.
+"""
+import numpy as np
+
+# t-digest compression (delta); the arcsine scale keeps about delta / 2
+# centroids, with the smallest ones at the tails where p95/p99 live
+SKETCH_COMPRESSION = 200
+
+# Must be even: histograms grow by merging bin pairs and doubling the width
+HISTOGRAM_BINS = 10
+
+PERCENTILES = (50, 95, 99)
+
+
+def finite(values):
+    """The readings as floats, without blanks (NaN) or infinities"""
+    values = np.asarray(values, dtype=float)
+    return values[np.isfinite(values)]
+
+
+def _compress(means, weights, compression=SKETCH_COMPRESSION):
+    """Cluster weighted points into centroids spanning at most one unit of the k1 scale"""
+    order = np.argsort(means, kind='stable')
+    means, weights = means[order], weights[order]
+
+    q = (np.cumsum(weights) - weights / 2) / weights.sum()
+    k = compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+    cluster = np.floor(k + compression / 4).astype(int)
+
+    starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+    merged_weights = np.add.reduceat(weights, starts)
+    merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+    return merged_means, merged_weights
+
+
+def build_sketch(values):
+    """Quantile sketch of a batch of readings; non-finite ones are skipped"""
+    values = finite(values)
+    if not len(values):
+        return {"count": 0, "min": None, "max": None, "means": [], "weights": []}
+
+    means, weights = _compress(values, np.ones(len(values)))
+    return {
+        "count": len(values),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "means": means.tolist(),
+        "weights": weights.astype(int).tolist()
+    }
+
+
+def merge_sketches(a, b):
+    """Combine two sketches by re-compressing their centroids together"""
+    if not a["count"]:
+        return b
+    if not b["count"]:
+        return a
+
+    means, weights = _compress(
+        np.asarray(a["means"] + b["means"], dtype=float),
+        np.asarray(a["weights"] + b["weights"], dtype=float)
+    )
+    return {
+        "count": a["count"] + b["count"],
+        "min": min(a["min"], b["min"]),
+        "max": max(a["max"], b["max"]),
+        "means": means.tolist(),
+        "weights": weights.astype(int).tolist()
+    }
+
+
+def sketch_quantile(sketch, q):
+    """Estimate the q-th quantile (0 <= q <= 1) by interpolating between centroids"""
+    if not sketch["count"]:
+        return None
+
+    weights = np.asarray(sketch["weights"], dtype=float)
+    centers = np.cumsum(weights) - weights / 2
+    positions = np.concatenate([[0], centers, [sketch["count"]]])
+    values = np.concatenate([[sketch["min"]], sketch["means"], [sketch["max"]]])
+    return float(np.interp(q * sketch["count"], positions, values))
+
+
+def build_histogram(values, bins=HISTOGRAM_BINS):
+    """Equal-width histogram over the range of a batch of readings; non-finite ones are skipped"""
+    values = finite(values)
+    if not len(values):
+        return {"start": 0.0, "width": 1.0, "counts": [0] * bins}
+
+    lo, hi = float(values.min()), float(values.max())
+    width = (hi - lo) / bins or 1.0 / bins
+    counts, _ = np.histogram(values, bins=bins, range=(lo, lo + width * bins))
+    return {"start": lo, "width": width, "counts": counts.tolist()}
+
+
+def add_to_histogram(histogram, values):
+    """
+    Count more readings into an existing histogram.
+
+    When they fall outside its range the bin width is doubled (merging bin
+    pairs) until they fit, so the stored counts stay exact. Non-finite
+    readings are skipped.
+    """
+    values = finite(values)
+    start, width = histogram["start"], histogram["width"]
+    counts = np.asarray(histogram["counts"])
+    if not len(values):
+        return histogram
+    if not counts.sum():
+        return build_histogram(values, len(counts))
+
+    lo, hi = values.min(), values.max()
+    while lo < start or hi > start + width * len(counts):
+        paired = counts.reshape(-1, 2).sum(axis=1)
+        empty = np.zeros_like(paired)
+        if lo < start:
+            start -= width * len(counts)
+            counts = np.concatenate([empty, paired])
+        else:
+            counts = np.concatenate([paired, empty])
+        width *= 2
+
+    idx = np.clip(((values - start) // width).astype(int), 0, len(counts) - 1)
+    counts = counts + np.bincount(idx, minlength=len(counts))
+    return {"start": start, "width": width, "counts": counts.tolist()}
+
+
+def histogram_edges(histogram):
+    return (histogram["start"] + histogram["width"] * np.arange(len(histogram["counts"]) + 1)).tolist()
+
+
+def build_distributions(df, columns):
+    """Sketch and histogram for each numeric column, keyed by lowercase parameter name"""
+    return {
+        col.lower(): {
+            "sketch": build_sketch(df[col].to_numpy()),
+            "histogram": build_histogram(df[col].to_numpy())
+        }
+        for col in columns
+    }
+
+
+def update_distributions(distributions, df, columns):
+    """Fold appended rows into stored distributions; parameters missing from either side are dropped"""
+    updated = {}
+    for col in columns:
+        key = col.lower()
+        if key not in distributions:
+            continue
+        values = df[col].to_numpy()
+        updated[key] = {
+            "sketch": merge_sketches(distributions[key]["sketch"], build_sketch(values)),
+            "histogram": add_to_histogram(distributions[key]["histogram"], values)
+        }
+    return updated
+
+
+def distribution_percentiles(distributions):
+    """p50/p95/p99 per parameter, served from the sketches alone"""
+    return {
+        key: {f"p{p}": sketch_quantile(dist["sketch"], p / 100) for p in PERCENTILES}
+        for key, dist in distributions.items()
+    }
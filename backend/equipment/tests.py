@@ -1,6 +1,79 @@
-from django.test import TestCase
-from .utils import analyze_csv
-from io import StringIO
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO, StringIO
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import AsyncClient, AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.urls import clear_url_caches, get_resolver
+from prometheus_client import REGISTRY, CollectorRegistry
+from prometheus_client.multiprocess import MultiProcessCollector
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import urls as equipment_urls, utils
+from .authentication import user_cache_key
+from .batch import get_pool, reset_pool
+from .executors import reset_report_pool
+from .memory import MemoryAccountingMiddleware
+from .metrics import MetricsMiddleware
+from .models import Dataset, UploadSession
+from .pdf_generator import generate_pdf_report
+from .profiling import ProfilingMiddleware, StackSampler
+from .querycount import QueryCountMiddleware, count_queries, query_budget
+from .sketches import (HISTOGRAM_BINS, add_to_histogram, build_histogram, build_sketch, merge_sketches,
+                       sketch_quantile)
+from .timing import ServerTimingMiddleware
+from .utils import (NUMERIC_COLUMNS, analyze_csv, compute_correlations, compute_stats, detect_format,
+                    detect_outliers, equipment_histograms, lttb_indices, merge_stats, read_equipment_file,
+                    significant_pairs)
+from .views import DATASETS_KEPT
+from .views_async import AsyncDatasetDetailView, AsyncGeneratePDFView, AsyncHistoryView
+
+SAMPLE_ROWS = [
+    ("Pump A", "Pump", 120, 5.2, 110),
+    ("Pump B", "Pump", 115, 5.0, 108),
+    ("Valve C", "Valve", 60, 4.1, 105),
+    ("Reactor D", "Reactor", 150, 7.4, 140),
+    ("Exchanger E", "HeatExchanger", 95, 6.3, 130),
+    ("Pump F", "Pump", 480, 5.6, 112),
+]
+
+def sample_csv(rows):
+    lines = ["Equipment Name,Type,Flowrate,Pressure,Temperature"]
+    lines += [",".join(str(v) for v in row) for row in rows]
+    return "\n".join(lines) + "\n"
+
+
+class AuthenticatedTestCase(TestCase):
+    """A user with a client force-authenticated as them, and an empty cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user("test", "test@test.com", "1234")
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, rows=SAMPLE_ROWS):
+        return self.client.post("/api/upload/", {"file": BytesIO(sample_csv(rows).encode())})
+
 
 class AnalyticsTest(TestCase):
     def test_valid_csv(self):
@@ -11,20 +84,1528 @@ class AnalyticsTest(TestCase):
         summary = analyze_csv(csv)
         self.assertEqual(summary["total_equipment"], 1)
 
+    def test_stage_timings(self):
+        csv = StringIO(
+            "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+            "Pump A,Pump,100,10,80\n"
+        )
+        timings = {}
+        analyze_csv(csv, timings=timings)
+        self.assertEqual(set(timings), {"parse", "stats", "correlations", "type_stats",
+                                        "distributions", "records", "outliers"})
 
-from rest_framework.test import APIClient
-from django.contrib.auth.models import User
-from io import BytesIO
-
-class UploadAPITest(TestCase):
-    def setUp(self):
-        self.client = APIClient()
-        self.user = User.objects.create_user("test", "test@test.com", "1234")
-        self.client.force_authenticate(user=self.user)
 
+class UploadAPITest(AuthenticatedTestCase):
     def test_upload(self):
         csv = BytesIO(
             b"Equipment Name,Type,Flowrate,Pressure,Temperature\nPump A,Pump,100,10,80"
         )
         response = self.client.post("/api/upload/", {"file": csv})
         self.assertEqual(response.status_code, 201)
+
+
+class StatsMergeTest(TestCase):
+    def test_merge_matches_full_recompute(self):
+        df = pd.read_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        merged = merge_stats(compute_stats(df.iloc[:4]), compute_stats(df.iloc[4:], offset=4))
+        full = compute_stats(df)
+
+        self.assertEqual(merged["count"], full["count"])
+        self.assertEqual(merged["type_counts"], full["type_counts"])
+        for a, b in zip(merged["mean"], full["mean"]):
+            self.assertAlmostEqual(a, b)
+        for row_a, row_b in zip(merged["comoment"], full["comoment"]):
+            for a, b in zip(row_a, row_b):
+                self.assertAlmostEqual(a, b)
+
+class AppendAPITest(AuthenticatedTestCase):
+    def test_append_matches_single_upload(self):
+        first = BytesIO(sample_csv(SAMPLE_ROWS[:3]).encode())
+        self.client.post("/api/upload/", {"file": first})
+        dataset_id = self.client.get("/api/history/").data[0]["id"]
+
+        second = BytesIO(sample_csv(SAMPLE_ROWS[3:]).encode())
+        response = self.client.post(f"/api/dataset/{dataset_id}/append/", {"file": second})
+        self.assertEqual(response.status_code, 200)
+
+        expected = analyze_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        self.assertEqual(response.data["total_equipment"], 6)
+        self.assertNotIn("equipment_data", response.data)
+        self.assertEqual(Dataset.objects.get(id=dataset_id).equipment_data, expected["equipment_data"])
+        self.assertEqual(response.data["equipment_by_type"], expected["equipment_by_type"])
+        self.assertAlmostEqual(response.data["avg_flowrate"], expected["avg_flowrate"])
+        for eq_type, entry in expected["type_stats"].items():
+            merged = response.data["type_stats"][eq_type]
+            self.assertEqual(merged["count"], entry["count"])
+            for stat, value in entry["flowrate"].items():
+                if value is None:
+                    self.assertIsNone(merged["flowrate"][stat])
+                else:
+                    self.assertAlmostEqual(merged["flowrate"][stat], value)
+        for key in ("correlations", "outliers", "outlier_method", "outlier_threshold"):
+            self.assertEqual(response.data["smart_insights"][key], expected["smart_insights"][key])
+        # Rank correlations need every stored row
+        self.assertIsNone(response.data["smart_insights"]["rank_correlations"])
+
+    def test_append_rejected_for_other_detectors(self):
+        for options in ({"outlier_method": "iqr"}, {"outlier_threshold": "3"}):
+            dataset_id = self.client.post("/api/upload/", {
+                "file": BytesIO(sample_csv(SAMPLE_ROWS[:3]).encode()), **options}).data["id"]
+
+            second = BytesIO(sample_csv(SAMPLE_ROWS[3:]).encode())
+            response = self.client.post(f"/api/dataset/{dataset_id}/append/", {"file": second})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("outlier detector", response.data["error"])
+            self.assertEqual(Dataset.objects.get(id=dataset_id).total_equipment, 3)
+
+    def test_append_rebuilds_stats_of_older_datasets(self):
+        dataset_id = self.upload(SAMPLE_ROWS[:3]).data["id"]
+        Dataset.objects.filter(id=dataset_id).update(stats={}, type_stats={}, distributions={})
+
+        second = BytesIO(sample_csv(SAMPLE_ROWS[3:]).encode())
+        response = self.client.post(f"/api/dataset/{dataset_id}/append/", {"file": second})
+        self.assertEqual(response.status_code, 200)
+        expected = analyze_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        self.assertAlmostEqual(response.data["avg_flowrate"], expected["avg_flowrate"])
+        self.assertEqual(Dataset.objects.get(id=dataset_id).stats["count"], 6)
+
+    def test_append_to_missing_dataset(self):
+        csv = BytesIO(sample_csv(SAMPLE_ROWS).encode())
+        response = self.client.post("/api/dataset/999/append/", {"file": csv})
+        self.assertEqual(response.status_code, 404)
+
+    def test_append_counts_stored_rows_towards_limit(self):
+        self.upload(SAMPLE_ROWS[:3])
+        dataset_id = self.client.get("/api/history/").data[0]["id"]
+
+        with self.settings(UPLOAD_MAX_ROWS=5):
+            second = BytesIO(sample_csv(SAMPLE_ROWS[3:]).encode())
+            response = self.client.post(f"/api/dataset/{dataset_id}/append/", {"file": second})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("row limit", response.data["error"])
+        self.assertEqual(Dataset.objects.get(id=dataset_id).total_equipment, 3)
+
+
+class OutlierDetectionTest(TestCase):
+    def setUp(self):
+        rows = [(f"Pump {i}", "Pump", 100 + i, 10 + i % 3, 80 + i % 5) for i in range(12)]
+        rows += [("Spike", "Pump", 5000, 11, 81), ("Hot", "Pump", 400, 11, 82)]
+        self.df = pd.read_csv(StringIO(sample_csv(rows)))
+
+    def test_single_extreme_masks_zscore(self):
+        flagged = [o["equipment"] for o in detect_outliers(self.df, "zscore")]
+        self.assertEqual(flagged, ["Spike"])
+
+    def test_robust_methods_find_masked_outlier(self):
+        for method in ("modified_zscore", "iqr"):
+            flagged = [o["equipment"] for o in detect_outliers(self.df, method)]
+            self.assertEqual(flagged, ["Spike", "Hot"], method)
+
+    def test_threshold_is_configurable(self):
+        self.assertEqual(detect_outliers(self.df, "iqr", threshold=100), [{
+            "equipment": "Spike",
+            "parameter": "Flowrate",
+            "value": 5000.0,
+            "mean": 476.1,
+            "deviation": "752.3×IQR"
+        }])
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            detect_outliers(self.df, "grubbs")
+
+
+class CorrelationTest(TestCase):
+    def setUp(self):
+        rows = [
+            (f"Pump {i}", "Pump", 100 + 10 * i, 5 + (i % 4), 80 + i ** 3, 50 - 2 * i)
+            for i in range(10)
+        ]
+        lines = ["Equipment Name,Type,Flowrate,Pressure,Temperature,Vibration"]
+        lines += [",".join(str(v) for v in row) for row in rows]
+        self.df = pd.read_csv(StringIO("\n".join(lines)))
+        self.columns = ["Flowrate", "Pressure", "Temperature", "Vibration"]
+
+    def test_matches_pandas(self):
+        pearson, spearman = compute_correlations(self.df, self.columns)
+        numeric = self.df[self.columns]
+        for expected, actual in ((numeric.corr(), pearson), (numeric.corr(method="spearman"), spearman)):
+            for a, b in zip(expected.to_numpy().ravel(), actual.ravel()):
+                self.assertAlmostEqual(a, b)
+
+    def test_extra_columns_included(self):
+        summary = analyze_csv(StringIO(self.df.to_csv(index=False)))
+        pairs = [c["pair"] for c in summary["smart_insights"]["correlations"]]
+        self.assertIn("Flowrate & Vibration", pairs)
+
+        # Cubic temperature is monotonic in flowrate: perfect rank correlation
+        rank_pairs = {c["pair"]: c["value"] for c in summary["smart_insights"]["rank_correlations"]}
+        self.assertEqual(rank_pairs["Flowrate & Temperature"], 1.0)
+
+    def test_only_upper_triangle(self):
+        matrix = np.array([[1.0, 0.9], [0.9, 1.0]])
+        self.assertEqual(significant_pairs(["A", "B"], matrix), [
+            {"pair": "A & B", "value": 0.9, "interpretation": "Strong Positive"}
+        ])
+
+class TypeStatsTest(TestCase):
+    def test_per_type_statistics(self):
+        summary = analyze_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        pumps = summary["type_stats"]["Pump"]
+
+        self.assertEqual(pumps["count"], 3)
+        self.assertAlmostEqual(pumps["flowrate"]["mean"], 715 / 3)
+        self.assertEqual(pumps["flowrate"]["min"], 115.0)
+        self.assertEqual(pumps["flowrate"]["max"], 480.0)
+        self.assertAlmostEqual(pumps["pressure"]["std"], pd.Series([5.2, 5.0, 5.6]).std())
+
+        # A single reading has no sample deviation
+        self.assertIsNone(summary["type_stats"]["Valve"]["temperature"]["std"])
+
+
+class SketchTest(TestCase):
+    def setUp(self):
+        self.values = np.random.default_rng(7).lognormal(3, 0.8, 50_000)
+
+    def test_quantiles_close_to_exact(self):
+        sketch = build_sketch(self.values)
+        for q in (0.5, 0.95, 0.99):
+            exact = np.quantile(self.values, q)
+            self.assertAlmostEqual(sketch_quantile(sketch, q), exact, delta=exact * 0.02)
+
+    def test_merged_sketch_close_to_exact(self):
+        parts = np.array_split(self.values, 5)
+        sketch = build_sketch(parts[0])
+        for part in parts[1:]:
+            sketch = merge_sketches(sketch, build_sketch(part))
+
+        self.assertEqual(sketch["count"], len(self.values))
+        self.assertLessEqual(len(sketch["means"]), 200)
+        exact = np.quantile(self.values, 0.95)
+        self.assertAlmostEqual(sketch_quantile(sketch, 0.95), exact, delta=exact * 0.02)
+
+    def test_histogram_grows_to_fit_appended_values(self):
+        histogram = build_histogram([0, 1, 2, 3, 4, 5, 6, 7, 8, 10])
+        histogram = add_to_histogram(histogram, [-5, 25])
+
+        self.assertEqual(sum(histogram["counts"]), 12)
+        self.assertLessEqual(histogram["start"], -5)
+        self.assertGreaterEqual(histogram["start"] + histogram["width"] * len(histogram["counts"]), 25)
+
+    def test_percentiles_in_summary(self):
+        summary = analyze_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        self.assertEqual(summary["percentiles"]["flowrate"]["p50"], 117.5)
+
+    def test_non_finite_readings_skipped(self):
+        values = [np.nan, 1.0, 2.0, np.inf, 4.0]
+        self.assertEqual(build_sketch(values)["count"], 3)
+        self.assertEqual(build_sketch([np.nan])["count"], 0)
+
+        histogram = build_histogram(values, bins=2)
+        self.assertEqual((histogram["start"], histogram["counts"]), (1.0, [2, 1]))
+        histogram = add_to_histogram(histogram, [np.nan, 8.0])
+        self.assertEqual(sum(histogram["counts"]), 4)
+
+        histograms = equipment_histograms([{"flowrate": np.nan, "pressure": 1.0, "temperature": 2.0},
+                                           {"flowrate": 3.0, "pressure": 1.0, "temperature": 2.0}], bins=2)
+        self.assertEqual(sum(histograms["flowrate"]["counts"]), 1)
+
+class HistogramAPITest(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset_id = self.upload().data["id"]
+
+    def test_histogram_matches_numpy(self):
+        response = self.client.get(f"/api/dataset/{self.dataset_id}/histogram/", {"param": "flowrate", "bins": 4})
+        self.assertEqual(response.status_code, 200)
+
+        counts, edges = np.histogram([row[2] for row in SAMPLE_ROWS], bins=4)
+        self.assertEqual(response.data["counts"], counts.tolist())
+        self.assertEqual(response.data["edges"], edges.tolist())
+        self.assertFalse(response.data["approximate"])
+
+    def test_histogram_refreshed_after_append(self):
+        url = f"/api/dataset/{self.dataset_id}/histogram/"
+        self.client.get(url, {"param": "pressure"})
+        self.client.post(f"/api/dataset/{self.dataset_id}/append/", {"file": BytesIO(sample_csv(SAMPLE_ROWS).encode())})
+        response = self.client.get(url, {"param": "pressure"})
+        self.assertEqual(sum(response.data["counts"]), 2 * len(SAMPLE_ROWS))
+
+    def test_default_bins_served_from_stored_distribution(self):
+        with count_queries() as stats:
+            response = self.client.get(f"/api/dataset/{self.dataset_id}/histogram/", {"param": "flowrate"})
+        self.assertEqual(stats.count, 1)
+        self.assertNotIn('"equipment_data"', stats.statements[0])
+
+        counts, edges = np.histogram([row[2] for row in SAMPLE_ROWS], bins=HISTOGRAM_BINS)
+        self.assertEqual(response.data["bins"], HISTOGRAM_BINS)
+        self.assertEqual(response.data["counts"], counts.tolist())
+        np.testing.assert_allclose(response.data["edges"], edges)
+        self.assertTrue(response.data["approximate"])
+
+    def test_default_bins_flag_widened_edges(self):
+        self.client.post(f"/api/dataset/{self.dataset_id}/append/",
+                         {"file": BytesIO(sample_csv([("Pump G", "Pump", 2000, 5.0, 110)]).encode())})
+        url = f"/api/dataset/{self.dataset_id}/histogram/"
+        stored = self.client.get(url, {"param": "flowrate"}).data
+        computed = self.client.get(url, {"param": "flowrate", "bins": HISTOGRAM_BINS + 1}).data
+
+        # The same readings are counted, but the stored range grew by doubling past np.histogram's
+        self.assertTrue(stored["approximate"])
+        self.assertFalse(computed["approximate"])
+        self.assertEqual(sum(stored["counts"]), sum(computed["counts"]))
+        self.assertEqual(computed["edges"][-1], 2000)
+        self.assertGreater(stored["edges"][-1], computed["edges"][-1])
+
+    def test_dataset_without_rows(self):
+        response = self.client.get(f"/api/dataset/{self.dataset_id}/", {"rows": "0"})
+        self.assertNotIn("equipment_data", response.data)
+        self.assertEqual(response.data["total_equipment"], len(SAMPLE_ROWS))
+
+        self.client.post(f"/api/dataset/{self.dataset_id}/append/", {"file": BytesIO(sample_csv(SAMPLE_ROWS).encode())})
+        response = self.client.get(f"/api/dataset/{self.dataset_id}/", {"rows": "0"})
+        self.assertEqual(response.data["total_equipment"], 2 * len(SAMPLE_ROWS))
+        self.assertEqual(len(self.client.get(f"/api/dataset/{self.dataset_id}/").data["equipment_data"]),
+                         2 * len(SAMPLE_ROWS))
+
+    def test_invalid_params(self):
+        url = f"/api/dataset/{self.dataset_id}/histogram/"
+        self.assertEqual(self.client.get(url, {"param": "name"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"bins": "many"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/dataset/999/histogram/").status_code, 404)
+
+
+class SeriesTest(AuthenticatedTestCase):
+    def test_lttb_keeps_endpoints_and_peak(self):
+        y = np.zeros(1000)
+        y[437] = 50
+        idx = lttb_indices(y, 20)
+        self.assertEqual(len(idx), 20)
+        self.assertEqual((idx[0], idx[-1]), (0, 999))
+        self.assertIn(437, idx)
+        self.assertTrue(np.all(np.diff(idx) > 0))
+
+    def test_short_series_returned_whole(self):
+        self.assertEqual(lttb_indices(np.arange(5.0), 10).tolist(), [0, 1, 2, 3, 4])
+
+    def test_series_endpoint(self):
+        rows = [(f"Pump {i}", "Pump", 100 + i % 7, 5 + i % 3, 80 + i % 11) for i in range(300)]
+        response = self.upload(rows)
+
+        response = self.client.get(f"/api/dataset/{response.data['id']}/series/", {"points": 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total"], 300)
+        self.assertEqual(len(response.data["series"]["flowrate"]["x"]), 50)
+        self.assertEqual(self.client.get("/api/dataset/999/series/").status_code, 404)
+
+
+class UploadPreflightTest(AuthenticatedTestCase):
+    def test_wrong_header_rejected(self):
+        csv = BytesIO(b"Name,Kind,Flow\n" + b"Pump A,Pump,100\n" * 1000)
+        response = self.client.post("/api/upload/", {"file": csv})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Invalid CSV format", response.data["error"])
+
+    def test_header_without_newline(self):
+        response = self.client.post("/api/upload/", {"file": BytesIO(b"Equipment Name,Type")})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(UPLOAD_MAX_BYTES=1024)
+    def test_size_limit(self):
+        csv = BytesIO(sample_csv(SAMPLE_ROWS * 50).encode())
+        response = self.client.post("/api/upload/", {"file": csv})
+        self.assertEqual(response.status_code, 413)
+
+    @override_settings(UPLOAD_MAX_ROWS=5)
+    def test_row_limit(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("row limit", response.data["error"])
+        self.assertEqual(Dataset.objects.count(), 0)
+
+    def test_header_checked_on_first_chunk(self):
+        from django.core.files.uploadhandler import StopUpload
+        from .uploads import CSVPreflightUploadHandler
+
+        handler = CSVPreflightUploadHandler()
+        handler.new_file("file", "data.csv", "text/csv", None)
+        with self.assertRaises(StopUpload):
+            handler.receive_data_chunk(b"Name,Kind,Flow\nPump A,Pump,", 0)
+        self.assertIn("missing", handler.error)
+
+
+class ChunkedUploadTest(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chunk_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.chunk_dir, ignore_errors=True)
+        settings_override = override_settings(CHUNKED_UPLOAD_DIR=self.chunk_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.data = sample_csv(SAMPLE_ROWS * 1000).encode()
+        self.chunk_size = 64 * 1024
+        self.chunks = [self.data[i:i + self.chunk_size] for i in range(0, len(self.data), self.chunk_size)]
+
+    def start(self):
+        response = self.client.post("/api/uploads/", {
+            "filename": "big.csv", "size": len(self.data), "chunk_size": self.chunk_size
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data["upload_id"]
+
+    def put_chunk(self, upload_id, index, body=None, checksum=None):
+        body = self.chunks[index] if body is None else body
+        return self.client.put(
+            f"/api/uploads/{upload_id}/chunks/{index}/", body,
+            content_type="application/octet-stream",
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(body).hexdigest()
+        )
+
+    def test_upload_and_commit(self):
+        upload_id = self.start()
+        for index in range(len(self.chunks)):
+            self.assertEqual(self.put_chunk(upload_id, index).status_code, 200)
+
+        response = self.client.post(f"/api/uploads/{upload_id}/commit/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["total_equipment"], len(SAMPLE_ROWS) * 1000)
+        self.assertEqual(Dataset.objects.get(id=response.data["id"]).filename, "big.csv")
+        self.assertFalse(os.path.exists(os.path.join(self.chunk_dir, upload_id)))
+
+        # Retrying the commit returns the same dataset
+        retry = self.client.post(f"/api/uploads/{upload_id}/commit/")
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.data["id"], response.data["id"])
+        self.assertEqual(Dataset.objects.count(), 1)
+
+    def test_retry_during_analysis_saves_one_dataset(self):
+        upload_id = self.start()
+        for index in range(len(self.chunks)):
+            self.put_chunk(upload_id, index)
+
+        analyze = utils.analyze_csv
+        retries = []
+
+        def analyze_with_retry(*args, **kwargs):
+            # The client's retry arrives while the first commit is still analyzing
+            retries.append(self.client.post(f"/api/uploads/{upload_id}/commit/"))
+            return analyze(*args, **kwargs)
+
+        with mock.patch.object(utils, "analyze_csv", side_effect=analyze_with_retry):
+            response = self.client.post(f"/api/uploads/{upload_id}/commit/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(retries[0].status_code, 409)
+        self.assertEqual(Dataset.objects.count(), 1)
+
+        retry = self.client.post(f"/api/uploads/{upload_id}/commit/")
+        self.assertEqual(retry.data["id"], response.data["id"])
+
+    def test_failed_commit_can_be_retried(self):
+        upload_id = self.start()
+        for index in range(len(self.chunks)):
+            self.put_chunk(upload_id, index)
+
+        with mock.patch.object(utils, "analyze_csv", side_effect=ValueError("Invalid CSV format")):
+            self.assertEqual(self.client.post(f"/api/uploads/{upload_id}/commit/").status_code, 400)
+        self.assertFalse(self.client.get(f"/api/uploads/{upload_id}/").data["committing"])
+        self.assertEqual(self.client.post(f"/api/uploads/{upload_id}/commit/").status_code, 201)
+
+    def test_resume_skips_received_chunks(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0)
+        self.put_chunk(upload_id, 2)
+
+        status = self.client.get(f"/api/uploads/{upload_id}/")
+        self.assertEqual(status.data["received"], [0, 2])
+        self.assertEqual(self.client.post(f"/api/uploads/{upload_id}/commit/").status_code, 409)
+
+        response = self.put_chunk(upload_id, 0)
+        self.assertFalse(response.data["stored"])
+        for index in range(len(self.chunks)):
+            if index not in status.data["received"]:
+                self.put_chunk(upload_id, index)
+        self.assertEqual(self.client.post(f"/api/uploads/{upload_id}/commit/").status_code, 201)
+
+    def test_checksum_mismatch(self):
+        upload_id = self.start()
+        response = self.put_chunk(upload_id, 1, checksum="0" * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f"/api/uploads/{upload_id}/").data["received"], [])
+
+    def test_wrong_chunk_size(self):
+        upload_id = self.start()
+        response = self.put_chunk(upload_id, 1, body=self.chunks[1][:-10])
+        self.assertEqual(response.status_code, 400)
+
+    def test_header_checked_on_first_chunk(self):
+        self.data = b"Name,Kind,Flow\n" + self.data[self.data.index(b"\n") + 1:]
+        self.chunks[0] = self.data[:self.chunk_size]
+        upload_id = self.start()
+        response = self.put_chunk(upload_id, 0)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Invalid CSV format", response.data["error"])
+
+    def test_sessions_are_per_user(self):
+        upload_id = self.start()
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_user("other", "other@test.com", "1234"))
+        self.assertEqual(other.get(f"/api/uploads/{upload_id}/").status_code, 404)
+
+    @override_settings(UPLOAD_MAX_BYTES=1024)
+    def test_size_limit(self):
+        response = self.client.post("/api/uploads/", {"filename": "big.csv", "size": len(self.data)})
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(UploadSession.objects.count(), 0)
+
+
+class BatchUploadTest(AuthenticatedTestCase):
+    def csv_file(self, name, rows=SAMPLE_ROWS):
+        file = BytesIO(sample_csv(rows).encode())
+        file.name = name
+        return file
+
+    def test_files_and_zip(self):
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("units/c.csv", sample_csv(SAMPLE_ROWS[:3]))
+            zf.writestr("notes.txt", "ignored")
+        archive.name = "more.zip"
+        archive.seek(0)
+
+        bad = BytesIO(b"Name,Kind\nPump A,Pump\n")
+        bad.name = "bad.csv"
+
+        with override_settings(UPLOAD_BATCH_WORKERS=0):
+            response = self.client.post("/api/upload/batch/", {
+                "files": [self.csv_file("a.csv"), bad, archive]
+            }, format="multipart")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual([r["filename"] for r in response.data["results"]], ["a.csv", "bad.csv", "c.csv"])
+        self.assertEqual(response.data["results"][1]["status"], 400)
+        self.assertIn("Invalid CSV format", response.data["results"][1]["error"])
+        self.assertEqual(response.data["results"][2]["total_equipment"], 3)
+        self.assertEqual(Dataset.objects.filter(user=self.user).count(), 2)
+
+    @override_settings(UPLOAD_BATCH_WORKERS=2)
+    def test_process_pool(self):
+        self.addCleanup(reset_pool)
+        files = [self.csv_file(f"{i}.csv", SAMPLE_ROWS[:i + 2]) for i in range(3)]
+        response = self.client.post("/api/upload/batch/", {"files": files}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([r["total_equipment"] for r in response.data["results"]], [2, 3, 4])
+
+    @override_settings(UPLOAD_BATCH_WORKERS=0)
+    def test_batch_never_prunes_its_own_datasets(self):
+        self.client.post("/api/upload/", {"file": self.csv_file("old.csv")})
+
+        files = [self.csv_file(f"{i}.csv") for i in range(DATASETS_KEPT + 1)]
+        response = self.client.post("/api/upload/batch/", {"files": files}, format="multipart")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("file limit", response.data["error"])
+        self.assertEqual(Dataset.objects.filter(user=self.user).count(), 1)
+
+        files = [self.csv_file(f"{i}.csv") for i in range(DATASETS_KEPT)]
+        # One insert per file, which the debug query counter reports
+        with self.assertLogs("equipment.queries", level="WARNING"):
+            response = self.client.post("/api/upload/batch/", {"files": files}, format="multipart")
+        self.assertEqual(response.data["created"], DATASETS_KEPT)
+        for result in response.data["results"]:
+            self.assertEqual(self.client.get(f"/api/dataset/{result['id']}/").status_code, 200)
+
+    @override_settings(UPLOAD_BATCH_WORKERS=2)
+    def test_dead_worker_fails_only_its_files(self):
+        self.addCleanup(reset_pool)
+        real_submit = get_pool().submit
+        calls = []
+
+        def submit(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                future = Future()
+                future.set_exception(BrokenProcessPool("worker killed"))
+                return future
+            return real_submit(*args)
+
+        files = [self.csv_file(f"{i}.csv") for i in range(3)]
+        with mock.patch.object(get_pool(), "submit", side_effect=submit):
+            response = self.client.post("/api/upload/batch/", {"files": files}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([r["status"] for r in response.data["results"]], [201, 400, 201])
+        self.assertIn("worker stopped", response.data["results"][1]["error"])
+
+    @override_settings(UPLOAD_BATCH_MAX_FILES=2, UPLOAD_BATCH_WORKERS=0)
+    def test_file_limit(self):
+        files = [self.csv_file(f"{i}.csv") for i in range(3)]
+        response = self.client.post("/api/upload/batch/", {"files": files}, format="multipart")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Dataset.objects.count(), 0)
+
+
+class FileFormatTest(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.df = pd.read_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        self.df["Site"] = "North"
+
+    def parquet_file(self, df=None, row_group_size=3):
+        buffer = BytesIO()
+        (self.df if df is None else df).to_parquet(buffer, index=False, row_group_size=row_group_size)
+        buffer.seek(0)
+        buffer.name = "units.parquet"
+        return buffer
+
+    def xlsx_file(self):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(list(self.df.columns))
+        for row in self.df.itertuples(index=False):
+            sheet.append(list(row))
+        sheet.append([None] * len(self.df.columns))
+        buffer = BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+        buffer.name = "units.xlsx"
+        return buffer
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format(self.parquet_file()), "parquet")
+        self.assertEqual(detect_format(self.xlsx_file()), "xlsx")
+        self.assertEqual(detect_format(BytesIO(sample_csv(SAMPLE_ROWS).encode())), "csv")
+
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("a.csv", sample_csv(SAMPLE_ROWS))
+        self.assertEqual(detect_format(archive), "zip")
+        with self.assertRaises(ValueError):
+            read_equipment_file(archive)
+
+    def test_formats_give_same_analysis(self):
+        expected = analyze_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        for file in (self.parquet_file(), self.xlsx_file()):
+            summary = analyze_csv(file)
+            self.assertEqual(summary["total_equipment"], expected["total_equipment"])
+            self.assertAlmostEqual(summary["avg_pressure"], expected["avg_pressure"])
+            self.assertEqual(summary["equipment_by_type"], expected["equipment_by_type"])
+            self.assertEqual(summary["smart_insights"]["outliers"], expected["smart_insights"]["outliers"])
+            self.assertEqual(summary["equipment_data"], expected["equipment_data"])
+
+    def test_parquet_reads_only_needed_columns(self):
+        df = read_equipment_file(self.parquet_file())
+        self.assertNotIn("Site", df.columns)
+        self.assertEqual(len(df), len(SAMPLE_ROWS))
+
+    def test_parquet_row_limit(self):
+        with self.assertRaisesRegex(ValueError, "row limit"):
+            read_equipment_file(self.parquet_file(), max_rows=len(SAMPLE_ROWS) - 1)
+
+    def test_parquet_missing_columns(self):
+        with self.assertRaisesRegex(ValueError, "missing Pressure"):
+            read_equipment_file(self.parquet_file(self.df.drop(columns=["Pressure"])))
+
+    def test_upload_endpoints_accept_parquet_and_xlsx(self):
+        response = self.client.post("/api/upload/", {"file": self.parquet_file()})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["total_equipment"], len(SAMPLE_ROWS))
+
+        response = self.client.post("/api/upload/", {"file": self.xlsx_file()})
+        self.assertEqual(response.status_code, 201)
+
+        with override_settings(UPLOAD_BATCH_WORKERS=0):
+            response = self.client.post("/api/upload/batch/", {
+                "files": [self.parquet_file(), self.xlsx_file()]
+            }, format="multipart")
+        self.assertEqual(response.data["created"], 2)
+
+
+class PDFReportTest(TestCase):
+    def test_section_timings(self):
+        data = analyze_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        timings = {}
+        pdf = generate_pdf_report(data, timings=timings).getvalue()
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        for section in ("overview", "bar_chart", "trend_chart", "warnings", "details"):
+            self.assertIn(f"build:{section}", timings)
+            self.assertIn(f"layout:{section}", timings)
+        self.assertIn("write", timings)
+
+
+@override_settings(REQUEST_TIMING=True)
+class ServerTimingTest(AuthenticatedTestCase):
+    def stages(self, response):
+        return {entry.split(";")[0].strip() for entry in response["Server-Timing"].split(",")}
+
+    def test_upload_and_detail_stages(self):
+        with self.assertLogs("equipment.timing", level="INFO") as logs:
+            response = self.upload()
+            detail = self.client.get(f"/api/dataset/{response.data['id']}/")
+
+        self.assertTrue({"multipart", "parse", "outliers", "save", "retention", "render", "total"}
+                        <= self.stages(response))
+        self.assertTrue({"query", "payload", "render", "total"} <= self.stages(detail))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], "/api/upload/")
+        self.assertEqual(record["status"], 201)
+        self.assertEqual(record["user"], self.user.pk)
+        self.assertIn("parse", record["stages_ms"])
+
+    def test_pdf_stage_names_are_tokens(self):
+        data = analyze_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        data.pop("stats")
+        data.pop("distributions")
+        with self.assertLogs("equipment.timing", level="INFO"):
+            response = self.client.post("/api/generate-pdf/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue({"body", "build.bar_chart", "layout.details", "write"} <= self.stages(response))
+
+    @override_settings(REQUEST_TIMING=False)
+    def test_disabled(self):
+        response = self.client.get("/api/history/")
+        self.assertNotIn("Server-Timing", response)
+
+
+class MetricsTest(AuthenticatedTestCase):
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_upload_metrics(self):
+        view = "api/upload/"
+        rows = self.sample("equipment_rows_analyzed_total", view=view)
+        requests = self.sample("equipment_http_requests_total", view=view, method="POST", status="201")
+        parses = self.sample("equipment_stage_duration_seconds_count", view=view, stage="parse")
+        queries = self.sample("equipment_db_queries_per_request_sum", view=view)
+
+        content = sample_csv(SAMPLE_ROWS).encode()
+        response = self.client.post("/api/upload/", {"file": BytesIO(content)})
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.sample("equipment_rows_analyzed_total", view=view) - rows, len(SAMPLE_ROWS))
+        self.assertEqual(self.sample("equipment_http_requests_total", view=view, method="POST", status="201")
+                         - requests, 1)
+        self.assertEqual(self.sample("equipment_stage_duration_seconds_count", view=view, stage="parse") - parses, 1)
+        self.assertGreater(self.sample("equipment_db_queries_per_request_sum", view=view) - queries, 0)
+
+        metrics = self.client.get("/metrics")
+        self.assertEqual(metrics.status_code, 200)
+        self.assertIn(b'equipment_upload_bytes_total{view="api/upload/"}', metrics.content)
+
+    def test_cache_hits(self):
+        dataset_id = self.upload().data["id"]
+        misses = self.sample("equipment_cache_requests_total", cache="series", result="miss")
+        hits = self.sample("equipment_cache_requests_total", cache="series", result="hit")
+
+        self.client.get(f"/api/dataset/{dataset_id}/series/?points=7")
+        self.client.get(f"/api/dataset/{dataset_id}/series/?points=7")
+
+        self.assertEqual(self.sample("equipment_cache_requests_total", cache="series", result="miss") - misses, 1)
+        self.assertEqual(self.sample("equipment_cache_requests_total", cache="series", result="hit") - hits, 1)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+    def test_production_requires_token_by_default(self):
+        script = "from backend import production_settings as s; print(s.METRICS_ENABLED)"
+        env = {k: v for k, v in os.environ.items() if not k.startswith("METRICS_")}
+        for token, enabled in (("", "False"), ("s3cret", "True")):
+            result = subprocess.run([sys.executable, "-c", script], env={**env, "METRICS_TOKEN": token},
+                                    check=True, capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.dirname(__file__)))
+            self.assertEqual(result.stdout.strip(), enabled)
+
+    def test_aggregates_worker_processes(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        worker = "from equipment.metrics import ROWS_ANALYZED; ROWS_ANALYZED.labels('api/upload/').inc(5)"
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": metrics_dir}
+        for _ in range(2):
+            subprocess.run([sys.executable, "-c", worker], env=env, check=True,
+                           cwd=os.path.dirname(os.path.dirname(__file__)))
+
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry, path=metrics_dir)
+        self.assertEqual(registry.get_sample_value("equipment_rows_analyzed_total", {"view": "api/upload/"}), 10)
+
+        with mock.patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": metrics_dir}):
+            response = self.client.get("/metrics")
+        self.assertIn(b'equipment_rows_analyzed_total{view="api/upload/"} 10.0', response.content)
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        settings_override = override_settings(REQUEST_PROFILING=True, REQUEST_PROFILE_DIR=self.profile_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.staff = User.objects.create_user("staff", "staff@test.com", "1234", is_staff=True)
+        self.user = User.objects.create_user("test", "test@test.com", "1234")
+
+    def auth(self, user):
+        return {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+    def report_data(self):
+        data = analyze_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        data.pop("stats")
+        data.pop("distributions")
+        return data
+
+    def test_collapsed_profile(self):
+        response = self.client.post("/api/generate-pdf/", self.report_data(), format="json",
+                                    HTTP_X_PROFILE="1", HTTP_X_REQUEST_ID="report-42", **self.auth(self.staff))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Request-ID"], "report-42")
+
+        download = self.client.get(response["X-Profile"], **self.auth(self.staff))
+        self.assertEqual(download.status_code, 200)
+        lines = b"".join(download.streaming_content).decode().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertTrue(any("generate_pdf_report (equipment/pdf_generator.py" in line for line in lines))
+
+    def test_speedscope_profile(self):
+        response = self.client.post("/api/generate-pdf/?profile=speedscope", self.report_data(), format="json",
+                                    HTTP_X_REQUEST_ID="bad id/..", **self.auth(self.staff))
+        request_id = response["X-Request-ID"]
+        self.assertNotEqual(request_id, "bad id/..")
+
+        with open(os.path.join(self.profile_dir, f"{request_id}.speedscope.json")) as f:
+            profile = json.load(f)
+        frames = profile["shared"]["frames"]
+        self.assertIn("generate_pdf_report", {frame["name"] for frame in frames})
+        sampled = profile["profiles"][0]
+        self.assertEqual(len(sampled["samples"]), len(sampled["weights"]))
+        self.assertTrue(all(i < len(frames) for sample in sampled["samples"] for i in sample))
+
+    def test_staff_only(self):
+        response = self.client.get("/api/history/", HTTP_X_PROFILE="1", **self.auth(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Request-ID", response)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+        response = self.client.get("/api/history/", HTTP_X_PROFILE="1", **self.auth(self.staff))
+        self.assertEqual(self.client.get(response["X-Profile"], **self.auth(self.user)).status_code, 403)
+        self.assertEqual(self.client.get("/api/profiles/missing/", **self.auth(self.staff)).status_code, 404)
+
+    def test_not_requested(self):
+        response = self.client.get("/api/history/", **self.auth(self.staff))
+        self.assertNotIn("X-Request-ID", response)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+
+@override_settings(MEMORY_ACCOUNTING=True)
+class MemoryAccountingTest(AuthenticatedTestCase):
+    def test_upload_stages(self):
+        stages_before = REGISTRY.get_sample_value(
+            "equipment_stage_peak_traced_bytes_count", {"view": "api/upload/", "stage": "parse"}) or 0
+        with self.assertLogs("equipment.memory", level="INFO") as logs:
+            response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], "/api/upload/")
+        self.assertTrue({"parse", "records", "outliers", "save", "render"} <= set(record["stages"]))
+        # The whole request peaks at least as high as any of its stages
+        self.assertGreater(record["stages"]["parse"]["peak_traced_bytes"], 0)
+        self.assertGreaterEqual(record["peak_traced_bytes"],
+                                max(s["peak_traced_bytes"] for s in record["stages"].values()))
+        self.assertEqual(REGISTRY.get_sample_value(
+            "equipment_stage_peak_traced_bytes_count", {"view": "api/upload/", "stage": "parse"}) - stages_before, 1)
+
+    def test_pdf_stages(self):
+        data = analyze_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        data.pop("stats")
+        data.pop("distributions")
+        with self.assertLogs("equipment.memory", level="INFO") as logs:
+            response = self.client.post("/api/generate-pdf/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        stages = json.loads(logs.records[0].getMessage())["stages"]
+        self.assertTrue({"body", "build:bar_chart", "build:details", "write"} <= set(stages))
+        self.assertGreater(stages["build:bar_chart"]["peak_traced_bytes"], 0)
+
+    def test_untracked_view(self):
+        with self.assertNoLogs("equipment.memory", level="INFO"):
+            self.client.get("/api/history/")
+
+
+# (method, route) -> (max queries, max bytes fetched or None), with JWT authentication as clients send it
+# and the user already cached, as after a client's first request.
+# Every endpoint needs a budget; raise one only together with the reason the endpoint needs more.
+QUERY_BUDGETS = {
+    ("POST", "api/upload/"): (8, 2048),
+    ("POST", "api/upload/batch/"): (7, 2048),
+    ("POST", "api/uploads/"): (4, 1024),
+    ("GET", "api/uploads/<uuid:upload_id>/"): (1, 1024),
+    ("DELETE", "api/uploads/<uuid:upload_id>/"): (2, 1024),
+    ("PUT", "api/uploads/<uuid:upload_id>/chunks/<int:index>/"): (1, 1024),
+    ("POST", "api/uploads/<uuid:upload_id>/commit/"): (9, 2048),
+    ("GET", "api/history/"): (1, 2048),
+    ("POST", "api/generate-pdf/"): (0, 1024),
+    ("GET", "api/dataset/<int:dataset_id>/"): (1, None),
+    # Reads the stored stats and sketches, never the rows
+    ("POST", "api/dataset/<int:dataset_id>/append/"): (4, 12288),
+    ("GET", "api/dataset/<int:dataset_id>/histogram/"): (2, None),
+    ("GET", "api/dataset/<int:dataset_id>/series/"): (2, None),
+    ("GET", "api/profiles/<str:request_id>/"): (1, 1024),
+    ("POST", "api/auth/register/"): (3, 1024),
+    ("POST", "api/auth/login/"): (2, 1024),
+    ("POST", "api/auth/token/refresh/"): (1, 1024),
+    ("GET", "api/auth/user/"): (0, 1024),
+}
+
+
+def api_routes():
+    """The route of every endpoint in equipment/urls.py and the auth routes"""
+    routes = {f"api/{pattern.pattern}" for pattern in equipment_urls.urlpatterns}
+    return routes | {str(p.pattern) for p in get_resolver().url_patterns if str(p.pattern).startswith("api/auth/")}
+
+
+@override_settings(UPLOAD_BATCH_WORKERS=0)
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("test", "test@test.com", "1234")
+        self.client = self.jwt_client(self.user)
+        # Large enough that reading equipment_data by accident blows the byte budgets
+        self.csv = sample_csv(SAMPLE_ROWS * 40).encode()
+        self.dataset_id = self.client.post("/api/upload/", {"file": BytesIO(self.csv)}).data["id"]
+        self.exercised = set()
+
+    def jwt_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+        return client
+
+    def check(self, method, route, path, client=None, status=None, **kwargs):
+        max_queries, max_bytes = QUERY_BUDGETS[(method, route)]
+        self.exercised.add((method, route))
+        with query_budget(max_queries, max_bytes, label=f"{method} {path}"):
+            response = getattr(client or self.client, method.lower())(path, **kwargs)
+        if status:
+            self.assertEqual(response.status_code, status, response.content)
+        else:
+            self.assertLess(response.status_code, 400, response.content)
+        return response
+
+    def test_every_endpoint_has_a_budget(self):
+        self.assertEqual({route for _, route in QUERY_BUDGETS}, api_routes())
+
+    def test_endpoint_budgets(self):
+        dataset = f"/api/dataset/{self.dataset_id}/"
+        self.check("POST", "api/upload/", "/api/upload/", data={"file": BytesIO(self.csv)})
+        self.check("POST", "api/upload/batch/", "/api/upload/batch/",
+                   data={"files": [BytesIO(self.csv), BytesIO(self.csv)]})
+        self.check("GET", "api/history/", "/api/history/")
+        self.check("GET", "api/dataset/<int:dataset_id>/", dataset)
+        self.check("POST", "api/dataset/<int:dataset_id>/append/", dataset + "append/",
+                   data={"file": BytesIO(self.csv)})
+        self.check("GET", "api/dataset/<int:dataset_id>/histogram/", dataset + "histogram/")
+        self.check("GET", "api/dataset/<int:dataset_id>/series/", dataset + "series/")
+
+        report = analyze_csv(StringIO(sample_csv(SAMPLE_ROWS)))
+        report.pop("stats")
+        report.pop("distributions")
+        self.check("POST", "api/generate-pdf/", "/api/generate-pdf/", data=report, format="json")
+
+        chunk_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, chunk_dir)
+        with override_settings(CHUNKED_UPLOAD_DIR=chunk_dir):
+            for _ in range(2):
+                upload = self.check("POST", "api/uploads/", "/api/uploads/",
+                                    data={"filename": "big.csv", "size": len(self.csv)}).data
+                path = f"/api/uploads/{upload['upload_id']}/"
+                self.check("GET", "api/uploads/<uuid:upload_id>/", path)
+            self.check("DELETE", "api/uploads/<uuid:upload_id>/", path)
+
+            upload = self.client.post("/api/uploads/", {"filename": "big.csv", "size": len(self.csv)}).data
+            path = f"/api/uploads/{upload['upload_id']}/"
+            self.check("PUT", "api/uploads/<uuid:upload_id>/chunks/<int:index>/", path + "chunks/0/",
+                       data=self.csv, content_type="application/octet-stream",
+                       HTTP_X_CHUNK_SHA256=hashlib.sha256(self.csv).hexdigest())
+            self.check("POST", "api/uploads/<uuid:upload_id>/commit/", path + "commit/")
+
+        staff = User.objects.create_user("staff", "staff@test.com", "1234", is_staff=True)
+        self.check("GET", "api/profiles/<str:request_id>/", "/api/profiles/missing/",
+                   client=self.jwt_client(staff), status=404)
+
+        anonymous = APIClient()
+        password = "Correct-Horse-9"
+        self.check("POST", "api/auth/register/", "/api/auth/register/", client=anonymous, data={
+            "username": "new", "email": "new@test.com", "password": password, "password2": password})
+        tokens = self.check("POST", "api/auth/login/", "/api/auth/login/", client=anonymous,
+                            data={"username": "new", "password": password}).data
+        self.check("POST", "api/auth/token/refresh/", "/api/auth/token/refresh/", client=anonymous,
+                   data={"refresh": tokens["refresh"]})
+        self.check("GET", "api/auth/user/", "/api/auth/user/")
+
+        self.assertEqual(self.exercised, set(QUERY_BUDGETS))
+
+    def test_retention_cost_does_not_grow_with_deletions(self):
+        for _ in range(10):
+            Dataset.objects.create(user=self.user, filename="old.csv", total_equipment=0, avg_flowrate=0,
+                                   avg_pressure=0, avg_temperature=0, equipment_by_type={},
+                                   equipment_data=list(range(1000)))
+        self.check("POST", "api/upload/", "/api/upload/", data={"file": BytesIO(self.csv)})
+        self.assertEqual(Dataset.objects.filter(user=self.user).count(), 5)
+
+    def test_budget_failure_lists_statements(self):
+        with self.assertRaisesRegex(AssertionError, r"ran 2 queries, budget 1:\n  1\. SELECT"):
+            with query_budget(1, label="Lookups"):
+                list(User.objects.all())
+                list(Dataset.objects.all())
+
+    def test_bytes_counted(self):
+        with count_queries() as stats:
+            Dataset.objects.values_list("equipment_data", flat=True).get(id=self.dataset_id)
+        self.assertGreater(stats.bytes, len(self.csv))
+
+    @override_settings(QUERY_COUNTING=True)
+    def test_middleware_headers(self):
+        response = self.jwt_client(self.user).get("/api/history/")
+        self.assertEqual(response["X-Query-Count"], "1")
+        self.assertGreater(int(response["X-Query-Bytes"]), 0)
+
+    def test_production_never_counts(self):
+        script = "from backend import production_settings as s; print(s.QUERY_COUNTING)"
+        result = subprocess.run([sys.executable, "-c", script], env={**os.environ, "QUERY_COUNTING": "1"},
+                                check=True, capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(__file__)))
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_repeated_statements(self):
+        with count_queries() as stats:
+            for _ in range(5):
+                User.objects.get(id=self.user.id)
+            Dataset.objects.count()
+        self.assertEqual(list(stats.repeated().values()), [5])
+
+
+class ResponseCacheTest(AuthenticatedTestCase):
+    def test_history_cached_until_upload(self):
+        first = self.upload().data["id"]
+        self.client.get("/api/history/")
+        with count_queries() as stats:
+            cached = self.client.get("/api/history/")
+        self.assertEqual(stats.count, 0)
+        self.assertEqual([d["id"] for d in cached.data], [first])
+
+        second = self.upload().data["id"]
+        self.assertEqual([d["id"] for d in self.client.get("/api/history/").data], [second, first])
+
+    def test_dataset_cached_until_append(self):
+        dataset_id = self.upload().data["id"]
+        self.client.get(f"/api/dataset/{dataset_id}/")
+        with count_queries() as stats:
+            self.client.get(f"/api/dataset/{dataset_id}/")
+        self.assertEqual(stats.count, 0)
+
+        self.client.post(f"/api/dataset/{dataset_id}/append/", {"file": BytesIO(sample_csv(SAMPLE_ROWS).encode())})
+        detail = self.client.get(f"/api/dataset/{dataset_id}/")
+        self.assertEqual(detail.data["total_equipment"], 2 * len(SAMPLE_ROWS))
+
+    def test_history_read_during_save_not_cached(self):
+        first = self.upload().data["id"]
+        create = Dataset.objects.create
+
+        def create_after_history_read(**kwargs):
+            # A concurrent history request caching the list before the row exists
+            self.client.get("/api/history/")
+            return create(**kwargs)
+
+        with mock.patch.object(Dataset.objects, "create", side_effect=create_after_history_read):
+            second = self.upload().data["id"]
+        self.assertEqual([d["id"] for d in self.client.get("/api/history/").data], [second, first])
+
+    def test_retention_invalidates(self):
+        oldest = self.upload().data["id"]
+        self.assertEqual(self.client.get(f"/api/dataset/{oldest}/").status_code, 200)
+        for _ in range(5):
+            self.upload()
+        self.assertEqual(self.client.get(f"/api/dataset/{oldest}/").status_code, 404)
+        self.assertNotIn(oldest, [d["id"] for d in self.client.get("/api/history/").data])
+
+    def test_keyed_per_user(self):
+        dataset_id = self.upload().data["id"]
+        self.client.get(f"/api/dataset/{dataset_id}/")
+
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_user("other", "other@test.com", "1234"))
+        self.assertEqual(other.get(f"/api/dataset/{dataset_id}/").status_code, 404)
+        self.assertEqual(other.get("/api/history/").data, [])
+
+    def test_file_backend(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        backend = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}
+        with override_settings(CACHES={"default": backend}):
+            first = self.upload().data["id"]
+            self.assertEqual(len(self.client.get("/api/history/").data), 1)
+            self.assertTrue(os.listdir(location))
+            self.upload()
+            self.assertEqual(self.client.get("/api/history/").data[1]["id"], first)
+
+
+class CachedAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("test", "test@test.com", "1234")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_user_resolved_from_cache(self):
+        self.assertEqual(self.client.get("/api/auth/user/").data["username"], "test")
+        with count_queries() as stats:
+            response = self.client.get("/api/auth/user/")
+        self.assertEqual(stats.count, 0)
+        self.assertEqual(response.data["username"], "test")
+
+    def test_deactivation_takes_effect_immediately(self):
+        self.client.get("/api/auth/user/")
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+        self.assertEqual(self.client.get("/api/auth/user/").status_code, 401)
+
+    def test_deleted_user_rejected(self):
+        self.client.get("/api/auth/user/")
+        self.user.delete()
+        self.assertEqual(self.client.get("/api/auth/user/").status_code, 401)
+
+    def test_profile_changes_visible(self):
+        self.client.get("/api/auth/user/")
+        self.user.email = "new@test.com"
+        self.user.save()
+        self.assertEqual(self.client.get("/api/auth/user/").data["email"], "new@test.com")
+
+
+class AuthResponseTest(TestCase):
+    password = "Correct-Horse-9"
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user("test", "test@test.com", self.password, first_name="Ada")
+
+    def test_login_includes_user_on_request(self):
+        data = self.client.post("/api/auth/login/", {
+            "username": "test", "password": self.password, "include_user": True}).data
+        self.assertEqual(data["user"]["username"], "test")
+        self.assertEqual(data["user"]["first_name"], "Ada")
+        self.assertIn("access", data)
+
+        data = self.client.post("/api/auth/login/", {"username": "test", "password": self.password}).data
+        self.assertNotIn("user", data)
+        self.assertIn("access", data)
+
+    def test_register_returns_working_tokens(self):
+        with query_budget(3, label="Register"):
+            response = self.client.post("/api/auth/register/", {
+                "username": "new", "email": "new@test.com", "password": self.password,
+                "password2": self.password})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["user"]["username"], "new")
+        self.assertIsNotNone(User.objects.get(username="new").last_login)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get("/api/auth/user/").data["username"], "new")
+        refreshed = APIClient().post("/api/auth/token/refresh/", {"refresh": response.data["refresh"]})
+        self.assertEqual(refreshed.status_code, 200)
+
+    def test_register_errors_return_no_tokens(self):
+        response = self.client.post("/api/auth/register/", {
+            "username": "other", "email": "test@test.com", "password": self.password,
+            "password2": self.password})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("access", response.data)
+
+
+# Runs against a file database: the test database is in memory, where WAL does not apply
+SQLITE_CONCURRENCY_SCRIPT = """
+import json, threading, time
+import django
+django.setup()
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.contrib.auth.models import User
+from equipment.models import Dataset
+
+call_command("migrate", verbosity=0)
+user = User.objects.create_user("writer")
+# Large enough to spill SQLite's page cache, which takes the exclusive lock without WAL
+rows = [{"Equipment Name": f"Pump-{i}", "Type": "Pump", "Flowrate": 1.5, "Pressure": 2.5,
+         "Temperature": 90.0} for i in range(100000)]
+written = threading.Event()
+release = threading.Event()
+errors = []
+
+def upload(filename, hold):
+    try:
+        with transaction.atomic():
+            Dataset.objects.create(user=user, filename=filename, total_equipment=len(rows), avg_flowrate=1.5,
+                                   avg_pressure=2.5, avg_temperature=90.0, equipment_data=rows)
+            if hold:
+                written.set()
+                release.wait(10)
+    except Exception as error:
+        errors.append(str(error))
+    finally:
+        connections.close_all()
+
+first = threading.Thread(target=upload, args=("big.csv", True))
+first.start()
+written.wait(30)
+start = time.perf_counter()
+seen = Dataset.objects.count()
+read_seconds = time.perf_counter() - start
+# A second upload has to wait for the first one's lock
+second = threading.Thread(target=upload, args=("other.csv", False))
+second.start()
+time.sleep(0.5)
+release.set()
+first.join()
+second.join()
+
+cursor = connection.cursor()
+print(json.dumps({
+    "pragmas": {name: cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("journal_mode", "synchronous", "busy_timeout")},
+    "seen_during_upload": seen,
+    "read_seconds": read_seconds,
+    "datasets": Dataset.objects.count(),
+    "errors": errors,
+}))
+"""
+
+APPEND_CONCURRENCY_SCRIPT = """
+import json, threading
+from io import StringIO
+import django
+django.setup()
+from django.core.management import call_command
+from django.db import connections
+from django.contrib.auth.models import User
+from equipment.models import Dataset
+from equipment.utils import analyze_csv
+from equipment.views import append_dataset, save_dataset
+
+call_command("migrate", verbosity=0)
+user = User.objects.create_user("writer")
+csv = "Equipment Name,Type,Flowrate,Pressure,Temperature\\n" + "".join(
+    f"Pump {i},Pump,{100 + i},5.0,90\\n" for i in range(50))
+dataset_id = save_dataset(user, "base.csv", analyze_csv(StringIO(csv))).id
+errors = []
+
+def append():
+    try:
+        for _ in range(5):
+            append_dataset(user, dataset_id, StringIO(csv))
+    except Exception as error:
+        errors.append(str(error))
+    finally:
+        connections.close_all()
+
+threads = [threading.Thread(target=append) for _ in range(4)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+dataset = Dataset.objects.get(id=dataset_id)
+print(json.dumps({
+    "rows": len(dataset.equipment_data),
+    "total_equipment": dataset.total_equipment,
+    "stats_count": dataset.stats["count"],
+    "errors": errors,
+}))
+"""
+
+class SQLiteConcurrencyTest(TestCase):
+    def run_script(self, script):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "backend.settings",
+               "SQLITE_PATH": os.path.join(workdir, "db.sqlite3")}
+        result = subprocess.run([sys.executable, "-c", script], env=env, check=True,
+                                capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def test_readers_not_blocked_by_uploads(self):
+        report = self.run_script(SQLITE_CONCURRENCY_SCRIPT)
+
+        self.assertEqual(report["pragmas"], {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 20000})
+        # The reader sees the last committed state straight away, not "database is locked"
+        self.assertEqual(report["seen_during_upload"], 0)
+        self.assertLess(report["read_seconds"], 1)
+        # The second writer waited for the lock instead of failing
+        self.assertEqual(report["errors"], [])
+        self.assertEqual(report["datasets"], 2)
+
+    def test_concurrent_appends_all_apply(self):
+        report = self.run_script(APPEND_CONCURRENCY_SCRIPT)
+        # Each append read the stats the previous one wrote, so no batch of rows or stats was lost
+        self.assertEqual(report["errors"], [])
+        self.assertEqual(report, {"rows": 1050, "total_equipment": 1050, "stats_count": 1050, "errors": []})
+
+
+@override_settings(REPORT_WORKERS=0)
+class AsyncViewsTest(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.csv = sample_csv(SAMPLE_ROWS).encode()
+        self.dataset_id = self.upload().data["id"]
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def call(self, view, method, path, token=None, **kwargs):
+        """Run an async view the way an ASGI server would, reading the streamed body"""
+        headers = {"Authorization": f"Bearer {token or self.token}"} if token != "" else {}
+        request = getattr(AsyncRequestFactory(), method)(path, headers=headers, **kwargs.pop("request", {}))
+
+        async def run():
+            response = await view.as_view()(request, **kwargs)
+            if response.streaming:
+                response.body = b"".join([chunk async for chunk in response.streaming_content])
+            else:
+                response.body = response.content
+            return response
+        return async_to_sync(run)()
+
+    def test_history_matches_sync_view(self):
+        response = self.call(AsyncHistoryView, "get", "/api/history/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response.body, self.client.get("/api/history/").content)
+
+    def test_dataset_matches_sync_view(self):
+        path = f"/api/dataset/{self.dataset_id}/"
+        with query_budget(2, label="Async dataset"):
+            response = self.call(AsyncDatasetDetailView, "get", path, dataset_id=self.dataset_id)
+        self.assertEqual(response.body, self.client.get(path).content)
+        self.assertEqual(response["Content-Length"], str(len(response.body)))
+
+        # Served from the response cache the sync view shares
+        with query_budget(0, label="Cached async dataset"):
+            self.call(AsyncDatasetDetailView, "get", path, dataset_id=self.dataset_id)
+
+    def test_dataset_of_another_user_not_found(self):
+        other = User.objects.create_user("other", "other@test.com", "1234")
+        response = self.call(AsyncDatasetDetailView, "get", "/api/dataset/1/", dataset_id=self.dataset_id,
+                             token=str(RefreshToken.for_user(other).access_token))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.body), {"error": "Dataset not found"})
+
+    def test_requires_token(self):
+        response = self.call(AsyncHistoryView, "get", "/api/history/", token="")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.body)["detail"], "Authentication credentials were not provided.")
+        self.assertIn("Bearer", response["WWW-Authenticate"])
+
+        response = self.call(AsyncHistoryView, "get", "/api/history/", token="not-a-token")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.body)["code"], "token_not_valid")
+
+    def report(self):
+        data = self.client.get(f"/api/dataset/{self.dataset_id}/").data
+        return self.call(AsyncGeneratePDFView, "post", "/api/generate-pdf/",
+                         request={"data": json.dumps(data), "content_type": "application/json"})
+
+    def test_pdf(self):
+        response = self.report()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response.body.startswith(b"%PDF"))
+        self.assertEqual(response["Content-Length"], str(len(response.body)))
+
+    @override_settings(REPORT_WORKERS=1)
+    def test_pdf_on_report_pool(self):
+        self.addCleanup(reset_report_pool)
+        response = self.report()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.body.startswith(b"%PDF"))
+
+    def test_pdf_rejects_bad_body(self):
+        response = self.call(AsyncGeneratePDFView, "post", "/api/generate-pdf/",
+                             request={"data": "{", "content_type": "application/json"})
+        self.assertEqual(response.status_code, 400)
+        response = self.call(AsyncGeneratePDFView, "post", "/api/generate-pdf/",
+                             request={"data": "{}", "content_type": "application/json"})
+        self.assertEqual(json.loads(response.body), {"error": "No data provided"})
+
+
+# Loads the URLconf as migrate's checks and worker boots do, plus the async views
+STARTUP_SCRIPT = """
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+import equipment.views_async
+"""
+
+class ImportTimeTest(TestCase):
+    # Loaded on first use by the views that need them (and by gunicorn.conf.py's post_worker_init)
+    HEAVY_PACKAGES = {"pandas", "numpy", "pyarrow", "openpyxl", "matplotlib", "reportlab", "PIL"}
+
+    def test_startup_skips_analysis_and_report_packages(self):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "backend.settings"}
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT], env=env, check=True,
+                                capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+
+        # "import time: <self us> | <cumulative us> | <module, indented by nesting>"
+        imports = [line.split("|") for line in result.stderr.splitlines()
+                   if line.startswith("import time:") and "self [us]" not in line]
+        modules = {name.strip() for _, _, name in imports}
+        self.assertFalse({name.split(".")[0] for name in modules} & self.HEAVY_PACKAGES)
+
+    def test_gunicorn_workers_import_them_after_boot(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        script = STARTUP_SCRIPT + (
+            "import runpy, sys\n"
+            "runpy.run_path('gunicorn.conf.py')['post_worker_init'](None)\n"
+            "print(sorted(name for name in ('pandas', 'matplotlib', 'reportlab') if name in sys.modules))\n"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "backend.settings", "PROMETHEUS_MULTIPROC_DIR": metrics_dir}
+        result = subprocess.run([sys.executable, "-c", script], env=env, check=True, capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(__file__)))
+        self.assertEqual(result.stdout.strip(), "['matplotlib', 'pandas', 'reportlab']")
+
+
+class MissingReadingsTest(AuthenticatedTestCase):
+    # Pump B's flowrate and Valve C's temperature are blank
+    CSV = sample_csv(SAMPLE_ROWS).replace("Pump B,Pump,115,", "Pump B,Pump,,").replace("Valve C,Valve,60,4.1,105", "Valve C,Valve,60,4.1,")
+
+    def test_blank_cells_are_skipped(self):
+        df = pd.read_csv(StringIO(self.CSV))
+        summary = analyze_csv(StringIO(self.CSV))
+
+        self.assertEqual(summary["total_equipment"], 6)
+        self.assertAlmostEqual(summary["avg_flowrate"], df["Flowrate"].mean())
+        self.assertAlmostEqual(summary["avg_temperature"], df["Temperature"].mean())
+        for method in ("zscore", "modified_zscore", "iqr"):
+            flagged = [(o["equipment"], o["mean"]) for o in detect_outliers(df, method, threshold=1.5)
+                       if o["parameter"] == "Flowrate"]
+            self.assertEqual(flagged, [("Pump F", 181.0)], method)
+        self.assertIsNone(summary["equipment_data"][1]["flowrate"])
+        self.assertEqual(summary["type_stats"]["Pump"]["flowrate"]["count"], 2)
+        self.assertAlmostEqual(summary["type_stats"]["Pump"]["flowrate"]["mean"], 300.0)
+
+        pearson, spearman = compute_correlations(df, NUMERIC_COLUMNS)
+        self.assertTrue(np.isfinite(pearson).all() and np.isfinite(spearman).all())
+
+    def test_merge_with_blank_cells_matches_full_recompute(self):
+        df = pd.read_csv(StringIO(self.CSV))
+        merged = merge_stats(compute_stats(df.iloc[:2]), compute_stats(df.iloc[2:], offset=2))
+        full = compute_stats(df)
+
+        self.assertEqual(merged["counts"], full["counts"])
+        for a, b in zip(merged["mean"], full["mean"]):
+            self.assertAlmostEqual(a, b)
+        for a, b in zip(np.diag(merged["comoment"]), np.diag(full["comoment"])):
+            self.assertAlmostEqual(a, b)
+
+    def test_upload_and_report(self):
+        response = self.client.post("/api/upload/", {"file": BytesIO(self.CSV.encode())})
+        self.assertEqual(response.status_code, 201)
+        self.assertAlmostEqual(response.data["avg_flowrate"], 905 / 5)
+
+        dataset_id = self.client.get("/api/history/").data[0]["id"]
+        dataset = self.client.get(f"/api/dataset/{dataset_id}/").data
+        self.assertIsNone(dataset["equipment_data"][2]["temperature"])
+        response = self.client.post("/api/generate-pdf/", dataset, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_column_without_readings(self):
+        csv = sample_csv([(name, kind, "", p, t) for name, kind, _, p, t in SAMPLE_ROWS])
+        response = self.client.post("/api/upload/", {"file": BytesIO(csv.encode())})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("no Flowrate readings", response.data["error"])
+
+
+@override_settings(REQUEST_TIMING=True, METRICS_ENABLED=True, MEMORY_ACCOUNTING=True, QUERY_COUNTING=True,
+                   REQUEST_PROFILING=True)
+class AsyncMiddlewareTest(TestCase):
+    MIDDLEWARE = (ProfilingMiddleware, ServerTimingMiddleware, MetricsMiddleware,
+                  MemoryAccountingMiddleware, QueryCountMiddleware)
+
+    def setUp(self):
+        self.user = User.objects.create_user("test", "test@test.com", "1234")
+
+    def test_stack_stays_async(self):
+        async def view(request):
+            await User.objects.acount()
+            return HttpResponse("ok")
+
+        handler = view
+        for middleware in reversed(self.MIDDLEWARE):
+            handler = middleware(handler)
+            # Django only adds a thread hop around middleware that can't take a coroutine
+            self.assertTrue(iscoroutinefunction(handler), middleware.__name__)
+
+        response = async_to_sync(handler)(AsyncRequestFactory().get("/api/history/"))
+        self.assertEqual(response.content, b"ok")
+        self.assertIn("total;dur=", response["Server-Timing"])
+        self.assertEqual(response["X-Query-Count"], "1")
+
+    def test_sync_stack_unchanged(self):
+        handler = lambda request: HttpResponse("ok")
+        for middleware in reversed(self.MIDDLEWARE):
+            handler = middleware(handler)
+            self.assertFalse(iscoroutinefunction(handler), middleware.__name__)
+        self.assertEqual(handler(RequestFactory().get("/")).content, b"ok")
+
+    def test_sampler_covers_every_thread(self):
+        sampler = StackSampler(None, 0.001)
+        sampler.start()
+        time.sleep(0.05)
+        sampler.stop()
+        roots = {stack[0][0] for stack in sampler.stacks}
+        self.assertIn(f"thread {threading.main_thread().name}", roots)
+
+
+class AsyncRoutingTest(TestCase):
+    """The async views as ASGI serves them: routed by urls.py, through the whole middleware stack"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(self.reload_urls)
+        self.enterContext(override_settings(ASYNC_VIEWS=True, REQUEST_TIMING=True, QUERY_COUNTING=True))
+        self.reload_urls()
+
+        self.user = User.objects.create_user("test", "test@test.com", "1234")
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.dataset_id = client.post("/api/upload/", {"file": BytesIO(sample_csv(SAMPLE_ROWS).encode())}).data["id"]
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def reload_urls(self):
+        # urls.py picks the views when it is imported
+        importlib.reload(importlib.import_module("equipment.urls"))
+        importlib.reload(importlib.import_module("backend.urls"))
+        clear_url_caches()
+
+    async def test_history_and_dataset(self):
+        client = AsyncClient()
+        history = await client.get("/api/history/", headers=self.headers)
+        self.assertEqual(history.status_code, 200)
+        self.assertIs(history.resolver_match.func.view_class, AsyncHistoryView)
+        self.assertEqual([d["id"] for d in json.loads(b"".join([c async for c in history.streaming_content]))],
+                         [self.dataset_id])
+        self.assertIn("encode;dur=", history["Server-Timing"])
+        # The token's user, then cached, and the history itself
+        self.assertEqual(history["X-Query-Count"], "2")
+
+        dataset = await client.get(f"/api/dataset/{self.dataset_id}/", {"rows": "0"}, headers=self.headers)
+        self.assertIs(dataset.resolver_match.func.view_class, AsyncDatasetDetailView)
+        self.assertNotIn("equipment_data", json.loads(b"".join([c async for c in dataset.streaming_content])))
+
+    async def test_requires_token(self):
+        response = await AsyncClient().get("/api/history/")
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("X-Query-Count", response)
@@ -0,0 +1,115 @@
+"""
+Per-stage request timing, reported in a Server-Timing header and logged as
+one JSON line per request to the "equipment.timing" logger.
+
+Enabled with the REQUEST_TIMING setting. When it is off the middleware
+removes itself at startup and, unless the metrics middleware sets it
+instead, request.timings is never set and the views' stage() blocks are
+no-ops.
+
+Like the other middleware in this app it handles both sync and async
+requests, so under ASGI it adds no thread hop around the async views.
+"""
+import json
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger('equipment.timing')
+
+# Server-Timing metric names must be HTTP tokens
+_INVALID_TOKEN_CHARS = re.compile(r"[^A-Za-z0-9!#$%&'*+\-.^_`|~]")
+
+
+# MemoryTracker (equipment/memory.py) of the request being handled, when it accounts memory
+memory_tracker = ContextVar('memory_tracker', default=None)
+
+
+@contextmanager
+def stage(timings, name):
+    """
+    Add the time spent in the block to timings[name]; a no-op when timings
+    is None. The memory tracker of the current request, if any, also
+    accounts the block's memory use to name.
+    """
+    if timings is None:
+        yield
+        return
+    tracker = memory_tracker.get()
+    if tracker is not None:
+        tracker.enter(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+        if tracker is not None:
+            tracker.exit()
+
+
+def request_timings(request):
+    """The stage timings dict of a timed request, or None"""
+    return getattr(request, 'timings', None)
+
+
+def server_timing_header(timings):
+    return ', '.join(
+        f"{_INVALID_TOKEN_CHARS.sub('.', name)};dur={secs * 1000:.1f}"
+        for name, secs in timings.items()
+    )
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.timings = {}
+        start = time.perf_counter()
+        response = self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        request.timings = {}
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - start)
+
+    def finish(self, request, response, total):
+        timings = request.timings
+        if hasattr(request, 'render_started'):
+            timings['render'] = time.perf_counter() - request.render_started
+        timings['total'] = total
+
+        response['Server-Timing'] = server_timing_header(timings)
+        user = getattr(request, 'user', None)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "user": user.pk if user is not None and user.is_authenticated else None,
+            "stages_ms": {name: round(secs * 1000, 2) for name, secs in timings.items()},
+        }
+        logger.info(json.dumps(record), extra={"timing": record})
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook, before __call__ resumes
+        request.render_started = time.perf_counter()
+        return response
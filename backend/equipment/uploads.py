@@ -0,0 +1,205 @@
+import csv
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from .formats import validate_columns, PARQUET_MAGIC, ZIP_MAGIC
+
+# A header line longer than this is not a valid equipment CSV
+MAX_HEADER_BYTES = 64 * 1024
+
+# Bounds on the chunk size a client may ask for
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Parquet and Excel uploads skip the CSV header check; they are validated
+# when parsed, from their schema or first worksheet row
+BINARY_MAGIC = (PARQUET_MAGIC, ZIP_MAGIC)
+
+
+def is_binary_upload(head):
+    return head[:4] in BINARY_MAGIC
+
+
+def parse_header_line(line):
+    """Column names from the raw first line of a CSV"""
+    text = line.decode('utf-8-sig').rstrip('\r')
+    return next(csv.reader([text]), [])
+
+
+class CSVPreflightUploadHandler(FileUploadHandler):
+    """
+    Checks a CSV upload while it streams in, ahead of the handler that spools
+    it to disk. The header line is validated as soon as it has arrived and the
+    upload is cut off once it passes UPLOAD_MAX_BYTES, so a bad file is
+    rejected without reading or parsing the rest of the body.
+    """
+
+    def __init__(self, request=None, check_headers=True):
+        super().__init__(request)
+        self.check_headers = check_headers
+        self.error = None
+        self.status = 400
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.header = b''
+        self.header_checked = not self.check_headers
+        self.received = 0
+
+    def reject(self, message, status=400):
+        self.error = message
+        self.status = status
+        raise StopUpload(connection_reset=True)
+
+    def check_header(self, line):
+        self.header_checked = True
+        try:
+            validate_columns(parse_header_line(line))
+        except ValueError as e:
+            return str(e)
+        return None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_BYTES:
+            self.reject(f"File exceeds the {settings.UPLOAD_MAX_BYTES} byte upload limit", status=413)
+
+        if not self.header_checked:
+            self.header += raw_data
+            newline = self.header.find(b'\n')
+            if is_binary_upload(self.header):
+                self.header_checked = True
+            elif newline != -1:
+                error = self.check_header(self.header[:newline])
+                if error:
+                    self.reject(error)
+            elif len(self.header) > MAX_HEADER_BYTES:
+                self.reject("Invalid CSV format: header line too long")
+
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Files without a newline never reach the check in receive_data_chunk
+        if not self.header_checked:
+            self.error = self.check_header(self.header)
+        return None
+
+
+def install_preflight(request, check_headers=True):
+    """
+    Put the preflight check in front of the request's upload handlers.
+
+    Must run before request.data / request.FILES is first accessed. Without
+    check_headers only the size limit is enforced.
+    """
+    handler = CSVPreflightUploadHandler(request, check_headers)
+    request.upload_handlers.insert(0, handler)
+    return handler
+
+
+def content_too_large(request):
+    """True when the declared body size is already over the upload limit"""
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return False
+    return content_length > settings.UPLOAD_MAX_BYTES
+
+
+# Chunked uploads. Each session has a directory of "<index>.part" files; a
+# chunk is only renamed into place once its size and checksum have been
+# verified, so the files present are exactly the chunks received.
+
+def chunk_dir(session):
+    return Path(settings.CHUNKED_UPLOAD_DIR) / str(session.id)
+
+
+def chunk_path(session, index):
+    return chunk_dir(session) / f"{index}.part"
+
+
+def received_chunks(session):
+    """Indices of the chunks already stored for a session"""
+    directory = chunk_dir(session)
+    if not directory.is_dir():
+        return []
+    return sorted(int(p.stem) for p in directory.glob('*.part'))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def store_chunk(session, index, stream, checksum):
+    """
+    Stream one chunk to disk, verifying its size and SHA-256 checksum.
+
+    Returns False when the same chunk was already stored (a resumed or
+    retried upload) and raises ValueError when the body does not match.
+    """
+    path = chunk_path(session, index)
+    if path.exists():
+        if file_sha256(path) != checksum:
+            raise ValueError(f"Chunk {index} was already received with a different checksum")
+        return False
+
+    expected = session.expected_chunk_size(index)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{index}.{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(partial, 'wb') as out:
+            while stream is not None and size <= expected:
+                block = stream.read(COPY_BLOCK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                digest.update(block)
+                out.write(block)
+
+        if size != expected:
+            raise ValueError(f"Chunk {index} must be {expected} bytes")
+        if digest.hexdigest() != checksum:
+            raise ValueError(f"Chunk {index} checksum mismatch")
+
+        if index == 0:
+            with open(partial, 'rb') as f:
+                header = f.readline(MAX_HEADER_BYTES + 1)
+            if not is_binary_upload(header):
+                if len(header) > MAX_HEADER_BYTES:
+                    raise ValueError("Invalid CSV format: header line too long")
+                validate_columns(parse_header_line(header.rstrip(b'\n')))
+
+        os.replace(partial, path)
+    finally:
+        if partial.exists():
+            partial.unlink()
+    return True
+
+
+def assemble_chunks(session):
+    """Concatenate a session's chunks into a temporary file and return its path"""
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=settings.FILE_UPLOAD_TEMP_DIR)
+    with os.fdopen(fd, 'wb') as out:
+        for index in range(session.total_chunks):
+            with open(chunk_path(session, index), 'rb') as part:
+                shutil.copyfileobj(part, out, COPY_BLOCK_SIZE)
+    return path
+
+
+def discard_chunks(session):
+    shutil.rmtree(chunk_dir(session), ignore_errors=True)
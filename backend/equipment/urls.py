@@ -1,9 +1,25 @@
+from django.conf import settings
 from django.urls import path
-from .views import UploadCSVView, HistoryView, GeneratePDFView, DatasetDetailView
+from .views import (UploadCSVView, BatchUploadView, HistoryView, GeneratePDFView, DatasetDetailView,
+                    DatasetAppendView, DatasetHistogramView, DatasetSeriesView, RequestProfileView)
+if settings.ASYNC_VIEWS:
+    from .views_async import (AsyncHistoryView as HistoryView, AsyncGeneratePDFView as GeneratePDFView,
+                              AsyncDatasetDetailView as DatasetDetailView)
+from .views_uploads import (ChunkedUploadCreateView, ChunkedUploadStatusView, ChunkedUploadChunkView,
+                            ChunkedUploadCommitView)
 
 urlpatterns = [
     path('upload/', UploadCSVView.as_view()),
+    path('upload/batch/', BatchUploadView.as_view()),
+    path('uploads/', ChunkedUploadCreateView.as_view()),
+    path('uploads/<uuid:upload_id>/', ChunkedUploadStatusView.as_view()),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', ChunkedUploadChunkView.as_view()),
+    path('uploads/<uuid:upload_id>/commit/', ChunkedUploadCommitView.as_view()),
     path('history/', HistoryView.as_view()),
     path('generate-pdf/', GeneratePDFView.as_view()),
     path('dataset/<int:dataset_id>/', DatasetDetailView.as_view()),
+    path('dataset/<int:dataset_id>/append/', DatasetAppendView.as_view()),
+    path('dataset/<int:dataset_id>/histogram/', DatasetHistogramView.as_view()),
+    path('dataset/<int:dataset_id>/series/', DatasetSeriesView.as_view()),
+    path('profiles/<str:request_id>/', RequestProfileView.as_view()),
 ]
@@ -1,86 +1,757 @@
+import os
+import zipfile
+
 import pandas as pd
 import numpy as np
 
-REQUIRED_COLUMNS = [
-    'Equipment Name',
-    'Type',
-    'Flowrate',
-    'Pressure',
-    'Temperature'
-]
-
-def analyze_csv(file):
-    df = pd.read_csv(file)
-
-    if not all(col in df.columns for col in REQUIRED_COLUMNS):
-        raise ValueError("Invalid CSV format")
-
-    # Equipment by type distribution
-    equipment_by_type = df['Type'].value_counts().to_dict()
-    
-    # Individual equipment data
-    equipment_data = []
-    for _, row in df.iterrows():
-        equipment_data.append({
-            'name': row['Equipment Name'],
-            'type': row['Type'],
-            'flowrate': float(row['Flowrate']),
-            'pressure': float(row['Pressure']),
-            'temperature': float(row['Temperature'])
-        })
-
-    # --- Smart Insights (Correlations & Outliers) ---
-    
-    # 1. Correlations
-    # Select only numeric columns for correlation
-    numeric_df = df[['Flowrate', 'Pressure', 'Temperature']]
-    corr_matrix = numeric_df.corr()
-    
-    correlations = []
-    for col1 in numeric_df.columns:
-        for col2 in numeric_df.columns:
-            if col1 >= col2: continue  # Avoid duplicates (A-B vs B-A) or self-correlation
-            
-            val = corr_matrix.loc[col1, col2]
-            if abs(val) > 0.5:  # Threshold for "significant"
-                correlations.append({
-                    "pair": f"{col1} & {col2}",
-                    "value": round(val, 2),
-                    "interpretation": "Strong Positive" if val > 0.7 else "Strong Negative" if val < -0.7 else "Moderate"
-                })
-
-    # 2. Outliers (Z-Score > 2)
+from .sketches import build_distributions, update_distributions, distribution_percentiles
+from .formats import REQUIRED_COLUMNS, PARQUET_MAGIC, ZIP_MAGIC, OLE_MAGIC, validate_columns
+from .timing import stage
+
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+
+# Most extreme readings kept per column (on each side) so outliers can be
+# re-evaluated after an append without re-reading the stored rows
+OUTLIER_CANDIDATES = 25
+
+# Outlier detectors and their default cutoffs
+OUTLIER_THRESHOLDS = {
+    'zscore': 2.0,            # |x - mean| / std
+    'modified_zscore': 3.5,   # 0.6745 * |x - median| / MAD (Iglewicz & Hoaglin)
+    'iqr': 1.5,               # Tukey fences at Q1 - k*IQR and Q3 + k*IQR
+}
+
+
+def check_row_limit(rows, max_rows, label='CSV'):
+    if max_rows and rows > max_rows:
+        raise ValueError(f"{label} exceeds the {max_rows} row limit")
+
+
+def read_equipment_csv(file, max_rows=None):
+    """
+    Parse an uploaded CSV and validate the required columns.
+
+    Uploads spooled to disk (and assembled chunked uploads, passed as a
+    path) are parsed through a memory map rather than a Python file object.
+    With max_rows, at most one row past the limit is read before the file is
+    rejected.
+    """
+    if hasattr(file, 'temporary_file_path'):
+        file = file.temporary_file_path()
+    df = pd.read_csv(file, memory_map=isinstance(file, (str, os.PathLike)),
+                     nrows=max_rows + 1 if max_rows else None)
+
+    validate_columns(df.columns)
+    check_row_limit(len(df), max_rows)
+
+    return df
+
+
+def read_equipment_parquet(file, max_rows=None):
+    """
+    Read a Parquet export into a frame.
+
+    Only the required columns and extra numeric columns are read, chosen from
+    the schema before any data is touched, and the declared row count is
+    checked against max_rows up front. The file is not streamed: the full
+    analysis needs every row at once (rank correlations, median-based
+    outliers, the stored records), as it does for CSVs.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet uploads require pyarrow to be installed")
+
+    parquet = pq.ParquetFile(file)
+    schema = parquet.schema_arrow
+    validate_columns(schema.names)
+    check_row_limit(parquet.metadata.num_rows, max_rows, 'Parquet file')
+
+    columns = REQUIRED_COLUMNS + [
+        field.name for field in schema
+        if field.name not in REQUIRED_COLUMNS
+        and (pa.types.is_integer(field.type) or pa.types.is_floating(field.type))
+    ]
+    return parquet.read(columns=columns).to_pandas()
+
+
+def read_equipment_xlsx(file, max_rows=None):
+    """
+    Read the first worksheet of an Excel workbook with openpyxl's read-only
+    streaming reader; rows are pulled one at a time and never held as cells.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Excel uploads require openpyxl to be installed")
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else None for cell in next(rows, ())]
+        validate_columns(header)
+
+        keep = [i for i, name in enumerate(header) if name]
+        records = []
+        for row in rows:
+            values = tuple(row[i] if i < len(row) else None for i in keep)
+            if all(value is None for value in values):
+                continue
+            records.append(values)
+            check_row_limit(len(records), max_rows, 'Workbook')
+    finally:
+        workbook.close()
+
+    return pd.DataFrame.from_records(records, columns=[header[i] for i in keep])
+
+
+READERS = {
+    'csv': read_equipment_csv,
+    'parquet': read_equipment_parquet,
+    'xlsx': read_equipment_xlsx,
+}
+
+
+def detect_format(file):
+    """
+    Identify an upload from its leading bytes: 'parquet', 'xlsx', 'zip'
+    (an archive of other files), 'xls' or, for anything else, 'csv'.
+    """
+    if hasattr(file, 'temporary_file_path'):
+        file = file.temporary_file_path()
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            magic = f.read(4)
+    else:
+        position = file.tell()
+        file.seek(0)
+        magic = file.read(4)
+        file.seek(position)
+    if isinstance(magic, str):
+        return 'csv'
+
+    if magic == PARQUET_MAGIC:
+        return 'parquet'
+    if magic == OLE_MAGIC:
+        return 'xls'
+    if magic == ZIP_MAGIC:
+        try:
+            with zipfile.ZipFile(file) as archive:
+                names = set(archive.namelist())
+        except zipfile.BadZipFile:
+            return 'csv'
+        finally:
+            if not isinstance(file, (str, os.PathLike)):
+                file.seek(position)
+        return 'xlsx' if 'xl/workbook.xml' in names else 'zip'
+    return 'csv'
+
+
+def read_equipment_file(file, max_rows=None):
+    """Parse an upload in any supported format into the frame every analysis stage takes"""
+    if hasattr(file, 'temporary_file_path'):
+        file = file.temporary_file_path()
+
+    fmt = detect_format(file)
+    if fmt == 'xls':
+        raise ValueError("Legacy .xls workbooks are not supported; save the file as .xlsx")
+    if fmt == 'zip':
+        raise ValueError("Zip archives are only accepted by the batch upload endpoint")
+    return READERS[fmt](file, max_rows)
+
+
+def build_equipment_data(df):
+    """Individual equipment records as stored on the Dataset"""
+    records = pd.DataFrame({
+        'name': df['Equipment Name'],
+        'type': df['Type'],
+        'flowrate': df['Flowrate'].astype(float),
+        'pressure': df['Pressure'].astype(float),
+        'temperature': df['Temperature'].astype(float)
+    })
+    # Blank cells are stored as null; NaN is not valid JSON
+    if records.isna().any(axis=None):
+        records = records.astype(object).where(records.notna(), None)
+    return records.to_dict('records')
+
+
+def numeric_columns(df):
+    """
+    Required readings first, then any extra numeric sensor columns
+    (level, vibration, power...). Extra columns with missing readings are
+    left out so every statistic is computed over the same rows.
+    """
+    extras = [
+        col for col in df.select_dtypes(include='number').columns
+        if col not in REQUIRED_COLUMNS and df[col].notna().all()
+    ]
+    return NUMERIC_COLUMNS + extras
+
+
+def _centered(values):
+    """
+    Per-column reading counts, means and centered values, skipping missing
+    (NaN) readings like pandas does. Missing readings are centered to 0, so
+    they add nothing to sums of squares or co-moments.
+    """
+    present = ~np.isnan(values)
+    counts = present.sum(axis=0)
+    if counts.min(initial=len(values)) == len(values):
+        mean = values.mean(axis=0) if len(values) else np.zeros(values.shape[1])
+        return counts, mean, values - mean
+
+    sums = np.where(present, values, 0.0).sum(axis=0)
+    mean = np.divide(sums, counts, out=np.zeros(values.shape[1]), where=counts > 0)
+    return counts, mean, np.where(present, values - mean, 0.0)
+
+
+def compute_stats(df, offset=0):
+    """
+    Mergeable sufficient statistics for a chunk of readings.
+
+    `offset` is the row position of the chunk's first row within the
+    dataset, so outlier candidates keep their original row order. Missing
+    readings are skipped: each column keeps its own reading count, and the
+    co-moment of two columns covers the rows where both were read.
+    """
+    columns = numeric_columns(df)
+    values = df[columns].to_numpy(dtype=float)
+    count = len(values)
+    counts, mean, centered = _centered(values)
+
+    names = df['Equipment Name'].to_numpy()
+    extremes = {}
+    for i, col in enumerate(NUMERIC_COLUMNS):
+        column = values[:, i]
+        present = np.flatnonzero(~np.isnan(column))
+        if len(present) > 2 * OUTLIER_CANDIDATES:
+            readings = column[present]
+            low = np.argpartition(readings, OUTLIER_CANDIDATES)[:OUTLIER_CANDIDATES]
+            high = np.argpartition(readings, -OUTLIER_CANDIDATES)[-OUTLIER_CANDIDATES:]
+            idx = present[np.union1d(low, high)]
+        else:
+            idx = present
+        extremes[col] = [
+            [offset + int(j), name, value]
+            for j, name, value in zip(idx, names[idx].tolist(), column[idx].tolist())
+        ]
+
+    return {
+        "count": count,
+        "counts": counts.tolist(),
+        "columns": columns,
+        "mean": mean.tolist(),
+        "comoment": (centered.T @ centered).tolist(),
+        "type_counts": df['Type'].value_counts().to_dict(),
+        "extremes": extremes
+    }
+
+
+def _frame_from_records(equipment_data):
+    df = pd.DataFrame(equipment_data, columns=['name', 'type', 'flowrate', 'pressure', 'temperature'])
+    df.columns = REQUIRED_COLUMNS
+    return df
+
+
+def stats_from_records(equipment_data):
+    """Rebuild sufficient statistics from stored records (datasets saved before stats existed)"""
+    return compute_stats(_frame_from_records(equipment_data))
+
+
+def type_stats_from_records(equipment_data):
+    """Rebuild per-type statistics from stored records (datasets saved before they existed)"""
+    return compute_type_stats(_frame_from_records(equipment_data))
+
+
+def distributions_from_records(equipment_data):
+    """Rebuild quantile sketches and histograms from stored records (datasets saved before they existed)"""
+    return build_distributions(_frame_from_records(equipment_data), NUMERIC_COLUMNS)
+
+
+def _trim_extremes(candidates):
+    """Keep the OUTLIER_CANDIDATES lowest and highest candidates, in row order"""
+    if len(candidates) > 2 * OUTLIER_CANDIDATES:
+        by_value = sorted(candidates, key=lambda c: c[2])
+        candidates = by_value[:OUTLIER_CANDIDATES] + by_value[-OUTLIER_CANDIDATES:]
+    return sorted(candidates, key=lambda c: c[0])
+
+
+def _moments(stats, columns):
+    """Mean vector and co-moment matrix restricted to `columns`"""
+    stored = stats.get("columns", NUMERIC_COLUMNS)
+    idx = [stored.index(col) for col in columns]
+    return np.asarray(stats["mean"])[idx], np.asarray(stats["comoment"])[np.ix_(idx, idx)]
+
+
+def _counts(stats, columns):
+    """Readings per column; stats stored before blanks were counted had no missing readings"""
+    stored = stats.get("columns", NUMERIC_COLUMNS)
+    counts = stats.get("counts") or [stats["count"]] * len(stored)
+    return np.asarray([counts[stored.index(col)] for col in columns], dtype=float)
+
+
+def merge_stats(a, b):
+    """
+    Combine the sufficient statistics of two chunks (Chan et al. pairwise update).
+
+    Only numeric columns present in both chunks are kept.
+    """
+    na, nb = a["count"], b["count"]
+    if na == 0:
+        return b
+    if nb == 0:
+        return a
+
+    columns = [col for col in a.get("columns", NUMERIC_COLUMNS) if col in b.get("columns", NUMERIC_COLUMNS)]
+    n = na + nb
+    mean_a, comoment_a = _moments(a, columns)
+    mean_b, comoment_b = _moments(b, columns)
+    counts_a, counts_b = _counts(a, columns), _counts(b, columns)
+    counts = counts_a + counts_b
+    delta = mean_b - mean_a
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(counts > 0, mean_a + delta * counts_b / counts, 0.0)
+        # Each column's update uses its own reading counts; without blanks this is na * nb / n
+        scale = np.where(counts > 0, np.sqrt(counts_a * counts_b / counts), 0.0)
+    comoment = comoment_a + comoment_b + np.outer(delta * scale, delta * scale)
+
+    type_counts = dict(a["type_counts"])
+    for eq_type, count in b["type_counts"].items():
+        type_counts[eq_type] = type_counts.get(eq_type, 0) + count
+
+    extremes = {
+        col: _trim_extremes(a["extremes"].get(col, []) + b["extremes"].get(col, []))
+        for col in NUMERIC_COLUMNS
+    }
+
+    return {
+        "count": n,
+        "counts": counts.astype(int).tolist(),
+        "columns": columns,
+        "mean": mean.tolist(),
+        "comoment": comoment.tolist(),
+        "type_counts": type_counts,
+        "extremes": extremes
+    }
+
+
+def compute_type_stats(df):
+    """
+    Per-type count, mean, std, min and max of each reading from one groupby
+    aggregation. "count" is the type's rows; each reading also keeps its own
+    count, which is lower when some of its cells are blank.
+    """
+    groups = df.groupby('Type')
+    table = groups[NUMERIC_COLUMNS].agg(['count', 'mean', 'std', 'min', 'max'])
+    sizes = groups.size()
+
+    type_stats = {}
+    for eq_type, row in zip(table.index.tolist(), table.to_dict('records')):
+        entry = {"count": int(sizes[eq_type])}
+        for col in NUMERIC_COLUMNS:
+            entry[col.lower()] = {
+                stat: (None if pd.isna(row[(col, stat)]) else float(row[(col, stat)]))
+                for stat in ('mean', 'std', 'min', 'max')
+            }
+            entry[col.lower()]["count"] = int(row[(col, 'count')])
+        type_stats[eq_type] = entry
+    return type_stats
+
+
+def _merge_parameter_stats(a, na, b, nb):
+    # Entries stored before blanks were counted had a reading in every row
+    na, nb = a.get("count", na), b.get("count", nb)
+    if not nb:
+        return {**a, "count": na}
+    if not na:
+        return {**b, "count": nb}
+    n = na + nb
+    delta = b["mean"] - a["mean"]
+    m2 = ((a["std"] or 0) ** 2 * (na - 1) + (b["std"] or 0) ** 2 * (nb - 1)
+          + delta ** 2 * na * nb / n)
+    return {
+        "mean": a["mean"] + delta * nb / n,
+        "std": float(np.sqrt(m2 / (n - 1))),
+        "min": min(a["min"], b["min"]),
+        "max": max(a["max"], b["max"]),
+        "count": n
+    }
+
+
+def merge_type_stats(a, b):
+    """Combine per-type statistics of two chunks without revisiting their rows"""
+    merged = dict(a)
+    for eq_type, entry in b.items():
+        if eq_type not in merged:
+            merged[eq_type] = entry
+            continue
+        current = merged[eq_type]
+        na, nb = current["count"], entry["count"]
+        combined = {"count": na + nb}
+        for col in NUMERIC_COLUMNS:
+            key = col.lower()
+            combined[key] = _merge_parameter_stats(current[key], na, entry[key], nb)
+        merged[eq_type] = combined
+    return merged
+
+
+def _std_from_stats(stats):
+    """Sample standard deviation (ddof=1) per required numeric column; NaN below two readings"""
+    _, comoment = _moments(stats, NUMERIC_COLUMNS)
+    counts = _counts(stats, NUMERIC_COLUMNS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(counts >= 2, np.sqrt(np.diag(comoment) / (counts - 1)), np.nan)
+
+
+def _correlation_matrix(gram):
+    """Normalize a centered Gram (co-moment) matrix into correlation coefficients"""
+    scale = np.sqrt(np.diag(gram))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return gram / np.outer(scale, scale)
+
+
+def significant_pairs(columns, matrix, threshold=0.5):
+    """Pairs from the upper triangle of a correlation matrix with |r| above the threshold"""
+    rows, cols = np.triu_indices(len(columns), k=1)
+    values = matrix[rows, cols]
+    keep = np.abs(values) > threshold  # NaN (zero-variance columns) never passes
+
+    return [
+        {
+            "pair": f"{columns[i]} & {columns[j]}",
+            "value": round(val, 2),
+            "interpretation": "Strong Positive" if val > 0.7 else "Strong Negative" if val < -0.7 else "Moderate"
+        }
+        for i, j, val in zip(rows[keep].tolist(), cols[keep].tolist(), values[keep].tolist())
+    ]
+
+
+def _column_ranks(column):
+    n = len(column)
+    order = np.argsort(column)
+    ordered = column[order]
+    new_run = np.empty(n, dtype=bool)
+    new_run[:1] = True
+    np.not_equal(ordered[1:], ordered[:-1], out=new_run[1:])
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], n)
+    ranks = np.empty(n)
+    ranks[order] = ((starts + ends + 1) / 2)[np.cumsum(new_run) - 1]
+    return ranks
+
+
+def _average_ranks(values):
+    """Column-wise ranks with ties averaged (pandas' rank(method='average')); missing readings stay NaN"""
+    columns = np.ascontiguousarray(values.T)
+    ranks = np.full_like(columns, np.nan)
+    for column, out in zip(columns, ranks):
+        present = ~np.isnan(column)
+        if present.all():
+            out[:] = _column_ranks(column)
+        else:
+            out[present] = _column_ranks(column[present])
+    return ranks.T
+
+
+def compute_correlations(df, columns):
+    """
+    Pearson and Spearman matrices over the given numeric columns.
+
+    Each matrix is a single Gram product of the centered values (or their
+    average ranks), so cost grows with rows x columns^2 in BLAS. Missing
+    readings are left out, as in compute_stats.
+    """
+    values = df[columns].to_numpy(dtype=float)
+    ranks = _average_ranks(values)
+
+    matrices = []
+    for data in (values, ranks):
+        _, _, centered = _centered(data)
+        matrices.append(_correlation_matrix(centered.T @ centered))
+    return matrices
+
+
+def correlations_from_stats(stats):
+    """Significant Pearson correlations derived from the co-moment matrix"""
+    return significant_pairs(
+        stats.get("columns", NUMERIC_COLUMNS),
+        _correlation_matrix(np.asarray(stats["comoment"]))
+    )
+
+
+def _outlier_entry(name, col, value, mean, z_score):
+    return {
+        "equipment": name,
+        "parameter": col,
+        "value": float(value),
+        "mean": round(float(mean), 1),
+        "deviation": f"{float(z_score):.1f}σ"
+    }
+
+
+def outliers_from_stats(stats):
+    """Z-score outliers (|z| > 2) re-evaluated over the stored candidate pool"""
+    means, _ = _moments(stats, NUMERIC_COLUMNS)
+    stds = _std_from_stats(stats)
+
     outliers = []
-    for col in numeric_df.columns:
-        stats = numeric_df[col].describe()
-        mean = stats['mean']
-        std = stats['std']
-        
-        if std == 0: continue
-
-        # Identify rows where |z| > 2
-        for idx, val in numeric_df[col].items():
-            z_score = (val - mean) / std
+    for i, col in enumerate(NUMERIC_COLUMNS):
+        if not stds[i] > 0: continue
+        for _, name, value in stats["extremes"].get(col, []):
+            z_score = (value - means[i]) / stds[i]
             if abs(z_score) > 2:
-                outliers.append({
-                    "equipment": df.loc[idx, 'Equipment Name'],
-                    "parameter": col,
-                    "value": float(val),
-                    "mean": round(mean, 1),
-                    "deviation": f"{round(z_score, 1)}σ"
-                })
-    
-    summary = {
-        "total_equipment": len(df),
-        "avg_flowrate": float(df['Flowrate'].mean()),
-        "avg_pressure": float(df['Pressure'].mean()),
-        "avg_temperature": float(df['Temperature'].mean()),
-        "equipment_by_type": equipment_by_type,
-        "equipment_data": equipment_data,
+                outliers.append(_outlier_entry(name, col, value, means[i], z_score))
+    return outliers
+
+
+def summarize_stats(stats):
+    """Summary fields that can be served from sufficient statistics alone"""
+    means, _ = _moments(stats, NUMERIC_COLUMNS)
+    return {
+        "total_equipment": stats["count"],
+        "avg_flowrate": float(means[0]),
+        "avg_pressure": float(means[1]),
+        "avg_temperature": float(means[2]),
+        "equipment_by_type": stats["type_counts"],
         "smart_insights": {
-            "correlations": correlations,
-            "outliers": outliers[:10]  # Cap at 10 to keep JSON small
+            "correlations": correlations_from_stats(stats),
+            "outliers": outliers_from_stats(stats)[:10],  # Cap at 10 to keep JSON small
+            "outlier_method": "zscore"
         }
     }
 
+
+def _quantiles(values, qs):
+    """
+    Column-wise quantiles (numpy's linear interpolation) using partition-based
+    selection, which is O(n) per column instead of a full sort. Columns with
+    missing readings go through np.nanquantile instead.
+    """
+    if np.isnan(values).any():
+        return np.nanquantile(values, qs, axis=0)
+    n = len(values)
+    positions = np.asarray(qs, dtype=float) * (n - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.ceil(positions).astype(int)
+    part = np.partition(values, np.unique(np.concatenate([lower, upper])), axis=0)
+    weight = (positions - lower)[:, None]
+    return part[lower] * (1 - weight) + part[upper] * weight
+
+
+def _zscore_scores(values):
+    center = np.nanmean(values, axis=0)
+    spread = np.nanstd(values, axis=0, ddof=1)
+    return (values - center) / spread, spread
+
+
+def _modified_zscore_scores(values):
+    median = _quantiles(values, [0.5])[0]
+    mad = _quantiles(np.abs(values - median), [0.5])[0]
+    return 0.6745 * (values - median) / mad, mad
+
+
+def _iqr_scores(values):
+    # Distance beyond the nearest quartile in IQR units, signed by side
+    q1, q3 = _quantiles(values, [0.25, 0.75])
+    iqr = q3 - q1
+    below = np.minimum(values - q1, 0)
+    above = np.maximum(values - q3, 0)
+    return (below + above) / iqr, iqr
+
+
+_OUTLIER_SCORERS = {
+    'zscore': (_zscore_scores, "{:.1f}σ"),
+    'modified_zscore': (_modified_zscore_scores, "{:.1f}σ"),
+    'iqr': (_iqr_scores, "{:.1f}×IQR"),
+}
+
+
+def detect_outliers(df, method='zscore', threshold=None, limit=10):
+    """
+    Flag readings whose score exceeds the cutoff for the selected detector.
+
+    Each detector is one vectorized pass over the numeric columns; columns
+    with zero spread and missing readings are skipped. Results are ordered
+    by column, then row.
+    """
+    if method not in OUTLIER_THRESHOLDS:
+        raise ValueError(f"Unknown outlier method '{method}'")
+    if threshold is None:
+        threshold = OUTLIER_THRESHOLDS[method]
+    if threshold <= 0:
+        raise ValueError("Outlier threshold must be positive")
+
+    values = df[NUMERIC_COLUMNS].to_numpy(dtype=float)
+    if len(values) < 2:
+        return []
+
+    scorer, deviation_format = _OUTLIER_SCORERS[method]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores, spread = scorer(values)
+    scores[:, ~(spread > 0)] = 0
+
+    cols, rows = np.nonzero(np.abs(scores.T) > threshold)
+    cols, rows = cols[:limit], rows[:limit]
+
+    means = np.nanmean(values, axis=0)
+    names = df['Equipment Name'].to_numpy()[rows].tolist()
+    return [
+        {
+            "equipment": name,
+            "parameter": NUMERIC_COLUMNS[col],
+            "value": float(values[row, col]),
+            "mean": round(float(means[col]), 1),
+            "deviation": deviation_format.format(scores[row, col])
+        }
+        for col, row, name in zip(cols.tolist(), rows.tolist(), names)
+    ]
+
+
+def record_readings(equipment_data, key):
+    """One reading of every stored record as a float array; blank (null) readings are NaN"""
+    return np.fromiter((np.nan if e[key] is None else e[key] for e in equipment_data),
+                       dtype=float, count=len(equipment_data))
+
+
+def equipment_histograms(equipment_data, bins):
+    """np.histogram edges and counts for each reading of the stored equipment records; blanks are skipped"""
+    histograms = {}
+    for key in ('flowrate', 'pressure', 'temperature'):
+        values = record_readings(equipment_data, key)
+        counts, edges = np.histogram(values[np.isfinite(values)], bins=bins)
+        histograms[key] = {"edges": edges.tolist(), "counts": counts.tolist()}
+    return histograms
+
+
+def lttb_indices(y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: positions of `threshold` points that keep
+    the visual shape of the series y (x is the row position).
+
+    Bucket bounds and the next-bucket averages are computed up front; the
+    per-bucket triangle areas are a vectorized pass over each bucket.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    bounds = np.linspace(1, n - 1, threshold - 1).astype(int)
+    starts, ends = bounds[:-1], bounds[1:]
+
+    # Anchor C for each bucket: average of the following bucket, or the last point
+    cumulative = np.concatenate([[0.0], np.cumsum(y)])
+    avg_y = (cumulative[ends] - cumulative[starts]) / (ends - starts)
+    avg_x = (starts + ends - 1) / 2
+    next_x = np.append(avg_x[1:], n - 1)
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        bx = np.arange(start, end)
+        area = np.abs((a - next_x[i]) * (y[start:end] - y[a]) - (a - bx) * (next_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_series(equipment_data, points):
+    """
+    LTTB-downsampled (position, value) series for each reading of the stored
+    records. Blank readings are left out; positions are still row positions.
+    """
+    series = {}
+    for key in ('flowrate', 'pressure', 'temperature'):
+        values = record_readings(equipment_data, key)
+        present = np.flatnonzero(np.isfinite(values))
+        idx = lttb_indices(values, points) if len(present) == len(values) else present[lttb_indices(values[present], points)]
+        series[key] = {"x": idx.tolist(), "y": values[idx].tolist()}
+    return {"total": len(equipment_data), "points": points, "series": series}
+
+
+def analyze_csv(file, outlier_method='zscore', outlier_threshold=None, max_rows=None, timings=None):
+    """
+    Full analysis of an upload. Pass a dict as timings to get the seconds
+    spent in each stage (parse, stats, correlations, type_stats,
+    distributions, records, outliers).
+    """
+    with stage(timings, "parse"):
+        df = read_equipment_file(file, max_rows)
+
+    with stage(timings, "stats"):
+        stats = compute_stats(df)
+        for col, readings in zip(stats["columns"], stats["counts"]):
+            if col in NUMERIC_COLUMNS and not readings:
+                raise ValueError(f"Invalid CSV format: no {col} readings")
+        summary = summarize_stats(stats)
+
+    with stage(timings, "correlations"):
+        pearson, spearman = compute_correlations(df, stats["columns"])
+        summary["smart_insights"]["correlations"] = significant_pairs(stats["columns"], pearson)
+        summary["smart_insights"]["rank_correlations"] = significant_pairs(stats["columns"], spearman)
+
+    with stage(timings, "type_stats"):
+        summary["type_stats"] = compute_type_stats(df)
+    with stage(timings, "distributions"):
+        distributions = build_distributions(df, stats["columns"])
+        summary["percentiles"] = distribution_percentiles(distributions)
+    with stage(timings, "records"):
+        summary["equipment_data"] = build_equipment_data(df)
+    with stage(timings, "outliers"):
+        # Outliers over every row; the candidate pool is only needed when rows are appended later
+        summary["smart_insights"]["outliers"] = detect_outliers(df, outlier_method, outlier_threshold)  # Capped at 10 to keep JSON small
+    summary["smart_insights"]["outlier_method"] = outlier_method
+    summary["smart_insights"]["outlier_threshold"] = outlier_threshold or OUTLIER_THRESHOLDS[outlier_method]
+    summary["stats"] = stats
+    summary["distributions"] = distributions
+
+    return summary
+
+
+def append_csv(file, stats, type_stats, distributions, smart_insights=None, max_rows=None, timings=None):
+    """
+    Analyze an additional chunk of readings for an existing dataset.
+
+    Only the new rows are parsed; the summary is produced by merging the
+    chunk's statistics into the stored ones. Outliers can only be updated
+    from the stored candidates for the z-score detector at its default
+    threshold, so datasets analyzed with another detector (as recorded in
+    smart_insights) are rejected. Rank correlations need every stored row
+    and are returned as None. With max_rows, the dataset's stored rows
+    count towards the limit.
+    """
+    smart_insights = smart_insights or {}
+    method = smart_insights.get("outlier_method", "zscore")
+    threshold = smart_insights.get("outlier_threshold", OUTLIER_THRESHOLDS["zscore"])
+    if (method, threshold) != ("zscore", OUTLIER_THRESHOLDS["zscore"]):
+        raise ValueError(f"Can't append to a dataset analyzed with the {method} outlier detector at "
+                         f"threshold {threshold}: appends update z-score outliers at "
+                         f"threshold {OUTLIER_THRESHOLDS['zscore']} only")
+
+    remaining = None
+    if max_rows:
+        remaining = max_rows - stats["count"]
+        if remaining <= 0:
+            raise ValueError(f"Dataset already has the {max_rows} row limit")
+    with stage(timings, "parse"):
+        df = read_equipment_file(file, remaining)
+
+    with stage(timings, "stats"):
+        merged = merge_stats(stats, compute_stats(df, offset=stats["count"]))
+        summary = summarize_stats(merged)
+    with stage(timings, "type_stats"):
+        summary["type_stats"] = merge_type_stats(type_stats, compute_type_stats(df))
+    with stage(timings, "distributions"):
+        distributions = update_distributions(distributions, df, merged["columns"])
+        summary["percentiles"] = distribution_percentiles(distributions)
+    summary["distributions"] = distributions
+    summary["smart_insights"]["outlier_threshold"] = OUTLIER_THRESHOLDS["zscore"]
+    summary["smart_insights"]["rank_correlations"] = None
+    with stage(timings, "records"):
+        summary["new_equipment_data"] = build_equipment_data(df)
+    summary["stats"] = merged
+
     return summary
@@ -1,94 +1,443 @@
+import os
+import tempfile
+import zipfile
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from django.http import HttpResponse
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.conf import settings
+from django.db import transaction
+from django.core.cache import cache
+from django.http import HttpResponse, FileResponse
 from .models import Dataset
-from .utils import analyze_csv
-from .pdf_generator import generate_pdf_report
+from .uploads import install_preflight, content_too_large
+from .timing import request_timings, stage
+from .metrics import record_upload, record_cache
+from .profiling import find_profile
+from .caching import cached_response, history_key, dataset_key, invalidate
+
+# The analysis (utils, batch, sketches: pandas and numpy) and report
+# (pdf_generator: matplotlib and reportlab) modules are imported where they
+# are used, so that loading the URLconf, as migrate and every worker boot do,
+# doesn't load them.
+
+# Uploads kept per user; older ones are deleted by prune_datasets
+DATASETS_KEPT = 5
 
 class UploadCSVView(APIView):
     permission_classes = [IsAuthenticated]
+    # Accounted by MemoryAccountingMiddleware when MEMORY_ACCOUNTING is on
+    track_memory = True
     
     def post(self, request):
+        from .utils import analyze_csv
+
+        if content_too_large(request):
+            return Response({"error": f"File exceeds the {settings.UPLOAD_MAX_BYTES} byte upload limit"}, status=413)
+
+        timings = request_timings(request)
+        preflight = install_preflight(request)
+        with stage(timings, "multipart"):
+            file = request.FILES.get('file')
+
+        if preflight.error:
+            return Response({"error": preflight.error}, status=preflight.status)
+        if not file:
+            return Response({"error": "No file uploaded"}, status=400)
+
+        try:
+            summary = analyze_csv(file, max_rows=settings.UPLOAD_MAX_ROWS, timings=timings,
+                                  **outlier_options(request))
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+        record_upload(request, summary["total_equipment"], file.size)
+        dataset = save_dataset(request.user, file.name, summary, timings)
+        summary["id"] = dataset.id
+        return Response(summary, status=201)
+
+
+def outlier_options(request):
+    """Outlier detection settings an upload may pass alongside the file"""
+    threshold = request.data.get('outlier_threshold')
+    return {
+        "outlier_method": request.data.get('outlier_method', 'zscore'),
+        "outlier_threshold": float(threshold) if threshold else None
+    }
+
+
+def create_dataset(user, filename, summary):
+    """Store an analyzed upload; the stats and distributions are popped from summary"""
+    stats = summary.pop("stats")
+    distributions = summary.pop("distributions")
+
+    dataset = Dataset.objects.create(
+        user=user,
+        filename=filename,
+        total_equipment=summary["total_equipment"],
+        avg_flowrate=summary["avg_flowrate"],
+        avg_pressure=summary["avg_pressure"],
+        avg_temperature=summary["avg_temperature"],
+        equipment_by_type=summary["equipment_by_type"],
+        equipment_data=summary["equipment_data"],
+        smart_insights=summary.get("smart_insights", {}),
+        type_stats=summary["type_stats"],
+        stats=stats,
+        distributions=distributions
+    )
+    # After the insert, so a history read in between can't cache the list without it
+    invalidate(user.id)
+    return dataset
+
+
+def prune_datasets(user):
+    # Keep only the last DATASETS_KEPT uploads per user
+    user_datasets = Dataset.objects.filter(user=user).order_by('-uploaded_at')
+    # Delete the oldest beyond that, in one query however many there are
+    stale_ids = list(user_datasets.values_list('id', flat=True)[DATASETS_KEPT:])
+    if stale_ids:
+        # Deleting needs only the keys, not every row's equipment data
+        Dataset.objects.filter(id__in=stale_ids).only('id').delete()
+        invalidate(user.id, stale_ids)
+
+
+def save_dataset(user, filename, summary, timings=None):
+    """
+    Store an analyzed upload and apply the per-user retention limit in one
+    transaction, so the cache is dropped again once both are committed.
+    """
+    with transaction.atomic():
+        with stage(timings, "save"):
+            dataset = create_dataset(user, filename, summary)
+        with stage(timings, "retention"):
+            prune_datasets(user)
+    return dataset
+
+
+class BatchUploadView(APIView):
+    """
+    Upload several CSVs at once, as repeated "files" fields and/or zips of
+    CSVs. Files are analyzed in parallel and every successful one is saved
+    in a single transaction; the response has one result per file.
+
+    A batch holds at most DATASETS_KEPT files, so retention never deletes
+    datasets the same batch created.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        from .batch import collect_files, analyze_batch
+
+        if content_too_large(request):
+            return Response({"error": f"Upload exceeds the {settings.UPLOAD_MAX_BYTES} byte limit"}, status=413)
+
+        # Headers are checked per file during analysis, so zips can pass through
+        preflight = install_preflight(request, check_headers=False)
+        files = request.FILES.getlist('files')
+
+        if preflight.error:
+            return Response({"error": preflight.error}, status=preflight.status)
+        if not files:
+            return Response({"error": "No files uploaded"}, status=400)
+
+        with tempfile.TemporaryDirectory(dir=settings.FILE_UPLOAD_TEMP_DIR) as directory:
+            try:
+                collected = collect_files(files, directory)
+                options = outlier_options(request)
+            except (ValueError, zipfile.BadZipFile) as e:
+                return Response({"error": str(e)}, status=400)
+            if len(collected) > DATASETS_KEPT:
+                return Response({"error": f"Batch exceeds the {DATASETS_KEPT} file limit: "
+                                          f"only the last {DATASETS_KEPT} uploads are kept"}, status=400)
+
+            analyses = analyze_batch([path for _, path in collected], options, settings.UPLOAD_MAX_ROWS)
+
+        record_upload(request, sum(summary["total_equipment"] for summary, _ in analyses if summary),
+                      sum(f.size for f in files))
+
+        results = []
+        with transaction.atomic():
+            for (name, _), (summary, error) in zip(collected, analyses):
+                if error:
+                    results.append({"filename": name, "status": 400, "error": error})
+                    continue
+                dataset = create_dataset(request.user, name, summary)
+                results.append({
+                    "filename": name,
+                    "status": 201,
+                    "id": dataset.id,
+                    "total_equipment": summary["total_equipment"],
+                    "avg_flowrate": summary["avg_flowrate"],
+                    "avg_pressure": summary["avg_pressure"],
+                    "avg_temperature": summary["avg_temperature"],
+                    "equipment_by_type": summary["equipment_by_type"]
+                })
+            prune_datasets(request.user)
+
+        created = sum(1 for r in results if r["status"] == 201)
+        return Response({
+            "created": created,
+            "failed": len(results) - created,
+            "results": results
+        }, status=201 if created else 400)
+
+class HistoryView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        data = cached_response(history_key(request.user.id), 'history', lambda: history_payload(request.user))
+        return Response(data)
+
+def history_datasets(user):
+    return (Dataset.objects.filter(user=user).order_by('-uploaded_at')
+            .only('id', 'filename', 'uploaded_at', 'total_equipment')[:5])
+
+def history_entry(dataset):
+    return {
+        "id": dataset.id,
+        "filename": dataset.filename,
+        "uploaded_at": dataset.uploaded_at,
+        "total_equipment": dataset.total_equipment
+    }
+
+def history_payload(user):
+    return [history_entry(d) for d in history_datasets(user)]
+
+def dataset_payload(dataset, rows=True):
+    """A stored dataset's summary, with its per-item equipment_data unless rows is False"""
+    from .sketches import distribution_percentiles
+
+    payload = {
+        "id": dataset.id,
+        "total_equipment": dataset.total_equipment,
+        "avg_flowrate": dataset.avg_flowrate,
+        "avg_pressure": dataset.avg_pressure,
+        "avg_temperature": dataset.avg_temperature,
+        "equipment_by_type": dataset.equipment_by_type,
+        "type_stats": dataset.type_stats,
+        "percentiles": distribution_percentiles(dataset.distributions),
+        "smart_insights": dataset.smart_insights
+    }
+    if rows:
+        payload["equipment_data"] = dataset.equipment_data
+    return payload
+
+
+def include_rows(request):
+    """?rows=0 leaves equipment_data out, for clients that chart from the histogram and series endpoints"""
+    return request.GET.get('rows', '1').lower() not in ('0', 'false', 'no')
+
+
+def dataset_query(user, dataset_id, rows):
+    datasets = Dataset.objects.filter(id=dataset_id, user=user)
+    return datasets if rows else datasets.defer('equipment_data')
+
+
+class DatasetDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, dataset_id):
+        timings = request_timings(request)
+        rows = include_rows(request)
+        payload = cached_response(dataset_key(request.user.id, dataset_id, rows), 'dataset',
+                                  lambda: self.load(request.user, dataset_id, rows, timings))
+        if payload is None:
+            return Response({"error": "Dataset not found"}, status=404)
+        return Response(payload)
+
+    def load(self, user, dataset_id, rows, timings):
+        with stage(timings, "query"):
+            dataset = dataset_query(user, dataset_id, rows).first()
+        if dataset is None:
+            return None
+        with stage(timings, "payload"):
+            return dataset_payload(dataset, rows)
+
+class DatasetAppendView(APIView):
+    """
+    Append another batch of readings to an existing dataset. The response
+    is the updated summary, without the per-item equipment_data.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, dataset_id):
+        if content_too_large(request):
+            return Response({"error": f"File exceeds the {settings.UPLOAD_MAX_BYTES} byte upload limit"}, status=413)
+
+        preflight = install_preflight(request)
         file = request.FILES.get('file')
 
+        if preflight.error:
+            return Response({"error": preflight.error}, status=preflight.status)
         if not file:
             return Response({"error": "No file uploaded"}, status=400)
 
         try:
-            summary = analyze_csv(file)
+            summary, appended = append_dataset(request.user, dataset_id, file)
+        except Dataset.DoesNotExist:
+            return Response({"error": "Dataset not found"}, status=404)
         except Exception as e:
             return Response({"error": str(e)}, status=400)
 
-        dataset = Dataset.objects.create(
-            user=request.user,
-            filename=file.name,
+        record_upload(request, appended, file.size)
+        return Response(summary)
+
+
+def append_dataset(user, dataset_id, file):
+    """
+    Merge a file's readings into a stored dataset; returns the new summary
+    and the number of rows added.
+
+    Only the stored statistics are loaded, and the new rows are added to
+    equipment_data in SQL. The read and the write are one transaction with
+    the dataset locked (on SQLite, IMMEDIATE transactions take the write
+    lock up front), so concurrent appends apply one after the other.
+    """
+    from .utils import append_csv, stats_from_records, type_stats_from_records, distributions_from_records
+
+    with transaction.atomic():
+        dataset = Dataset.objects.select_for_update() \
+            .only('id', 'stats', 'type_stats', 'distributions', 'smart_insights').get(id=dataset_id, user=user)
+
+        # Datasets uploaded before stats were stored need a one-off rebuild from their rows
+        stats = dataset.stats or stats_from_records(dataset.equipment_data)
+        type_stats = dataset.type_stats or type_stats_from_records(dataset.equipment_data)
+        distributions = dataset.distributions or distributions_from_records(dataset.equipment_data)
+
+        summary = append_csv(file, stats, type_stats, distributions, dataset.smart_insights,
+                             max_rows=settings.UPLOAD_MAX_ROWS)
+        rows = summary.pop("new_equipment_data")
+        Dataset.objects.filter(id=dataset.id).update(
             total_equipment=summary["total_equipment"],
             avg_flowrate=summary["avg_flowrate"],
             avg_pressure=summary["avg_pressure"],
             avg_temperature=summary["avg_temperature"],
             equipment_by_type=summary["equipment_by_type"],
-            equipment_data=summary["equipment_data"],
-            smart_insights=summary.get("smart_insights", {})
+            type_stats=summary["type_stats"],
+            smart_insights=summary["smart_insights"],
+            stats=summary.pop("stats"),
+            distributions=summary.pop("distributions"),
+            equipment_data=Dataset.appended_rows(rows)
         )
+        invalidate(user.id, [dataset.id])
 
-        # Keep only last 5 uploads per user
-        user_datasets = Dataset.objects.filter(user=request.user).order_by('-uploaded_at')
-        if user_datasets.count() > 5:
-            # Delete oldest datasets beyond 5
-            datasets_to_delete = user_datasets[5:]
-            for ds in datasets_to_delete:
-                ds.delete()
+    summary["id"] = dataset.id
+    return summary, len(rows)
 
-        return Response(summary, status=201)
+def cached_from_records(dataset_id, user, name, compute):
+    """
+    Result of compute(equipment_data) for a user's dataset, cached per dataset.
 
-class HistoryView(APIView):
+    The row count is part of the key so appends never serve stale results.
+    Returns None when the dataset does not exist.
+    """
+    row = Dataset.objects.filter(id=dataset_id, user=user).values('total_equipment').first()
+    if row is None:
+        return None
+
+    cache_key = f"dataset:{dataset_id}:{row['total_equipment']}:{name}"
+    result = cache.get(cache_key)
+    record_cache(name.split(':')[0], result is not None)
+    if result is None:
+        equipment_data = Dataset.objects.values_list('equipment_data', flat=True).get(id=dataset_id)
+        result = compute(equipment_data)
+        cache.set(cache_key, result)
+    return result
+
+HISTOGRAM_PARAMS = ('flowrate', 'pressure', 'temperature')
+MAX_HISTOGRAM_BINS = 200
+
+class DatasetHistogramView(APIView):
+    """
+    Binned distribution of one parameter, so charts don't need every row.
+
+    The default bin count is served from the histogram stored with the
+    dataset (sketches.py), without loading its rows. Its counts are exact,
+    but once appends have widened it its edges span more than the readings'
+    range, unlike np.histogram's, so the response says "approximate": true.
+    Other bin counts are computed from the rows with np.histogram and cached.
+    """
     permission_classes = [IsAuthenticated]
     
-    def get(self, request):
-        datasets = Dataset.objects.filter(user=request.user).order_by('-uploaded_at')[:5]
-        data = [
-            {
-                "id": d.id,
-                "filename": d.filename,
-                "uploaded_at": d.uploaded_at,
-                "total_equipment": d.total_equipment
-            }
-            for d in datasets
-        ]
-        return Response(data)
+    def get(self, request, dataset_id):
+        from .sketches import HISTOGRAM_BINS, histogram_edges
 
-class DatasetDetailView(APIView):
+        param = request.query_params.get('param', 'flowrate')
+        if param not in HISTOGRAM_PARAMS:
+            return Response({"error": f"param must be one of {', '.join(HISTOGRAM_PARAMS)}"}, status=400)
+
+        try:
+            bins = int(request.query_params.get('bins', HISTOGRAM_BINS))
+        except ValueError:
+            bins = 0
+        if not 1 <= bins <= MAX_HISTOGRAM_BINS:
+            return Response({"error": f"bins must be an integer between 1 and {MAX_HISTOGRAM_BINS}"}, status=400)
+
+        if bins == HISTOGRAM_BINS:
+            distributions = Dataset.objects.filter(id=dataset_id, user=request.user) \
+                .values_list('distributions', flat=True).first()
+            if distributions is None:
+                return Response({"error": "Dataset not found"}, status=404)
+            # Datasets uploaded before distributions were stored fall through to the rows
+            if param in distributions:
+                histogram = distributions[param]["histogram"]
+                return Response({"param": param, "bins": bins, "edges": histogram_edges(histogram),
+                                 "counts": histogram["counts"], "approximate": True})
+
+        from .utils import equipment_histograms
+
+        histograms = cached_from_records(dataset_id, request.user, f"histogram:{bins}",
+                                         lambda data: equipment_histograms(data, bins))
+        if histograms is None:
+            return Response({"error": "Dataset not found"}, status=404)
+
+        return Response({"param": param, "bins": bins, **histograms[param], "approximate": False})
+
+MIN_SERIES_POINTS = 3
+MAX_SERIES_POINTS = 5000
+
+class DatasetSeriesView(APIView):
+    """Trend series downsampled with LTTB to a fixed point budget"""
     permission_classes = [IsAuthenticated]
     
     def get(self, request, dataset_id):
         try:
-            dataset = Dataset.objects.get(id=dataset_id, user=request.user)
-            data = {
-                "total_equipment": dataset.total_equipment,
-                "avg_flowrate": dataset.avg_flowrate,
-                "avg_pressure": dataset.avg_pressure,
-                "avg_temperature": dataset.avg_temperature,
-                "equipment_by_type": dataset.equipment_by_type,
-                "equipment_data": dataset.equipment_data,
-                "smart_insights": dataset.smart_insights
-            }
-            return Response(data)
-        except Dataset.DoesNotExist:
+            points = int(request.query_params.get('points', 200))
+        except ValueError:
+            points = 0
+        if not MIN_SERIES_POINTS <= points <= MAX_SERIES_POINTS:
+            return Response(
+                {"error": f"points must be an integer between {MIN_SERIES_POINTS} and {MAX_SERIES_POINTS}"},
+                status=400
+            )
+
+        from .utils import downsample_series
+
+        series = cached_from_records(dataset_id, request.user, f"series:{points}",
+                                     lambda data: downsample_series(data, points))
+        if series is None:
             return Response({"error": "Dataset not found"}, status=404)
 
+        return Response(series)
+
 class GeneratePDFView(APIView):
     permission_classes = [IsAuthenticated]
+    # Accounted by MemoryAccountingMiddleware when MEMORY_ACCOUNTING is on
+    track_memory = True
     
     def post(self, request):
-        data = request.data
+        from .pdf_generator import generate_pdf_report
+
+        timings = request_timings(request)
+        with stage(timings, "body"):
+            data = request.data
         
         if not data:
             return Response({"error": "No data provided"}, status=400)
         
         try:
-            pdf_buffer = generate_pdf_report(data)
+            pdf_buffer = generate_pdf_report(data, timings=timings)
             
             response = HttpResponse(pdf_buffer, content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="equipment_report_{data.get("total_equipment", "")}_items.pdf"'
@@ -96,3 +445,16 @@ class GeneratePDFView(APIView):
             return response
         except Exception as e:
             return Response({"error": str(e)}, status=500)
+
+class RequestProfileView(APIView):
+    """Download a profile recorded by ProfilingMiddleware, by request id"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, request_id):
+        path, fmt = find_profile(request_id)
+        if not path:
+            return Response({"error": "Profile not found"}, status=404)
+
+        content_type = 'application/json' if fmt == 'speedscope' else 'text/plain'
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path),
+                            content_type=content_type)
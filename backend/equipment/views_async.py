@@ -0,0 +1,126 @@
+"""
+Async variants of the history, dataset and PDF report views, routed in
+place of the sync ones when ASYNC_VIEWS is on (backend/asgi.py sets it).
+
+They query with the async ORM, encode JSON and draw reports in executors
+(executors.py) and stream their bodies, so under an ASGI server a slow
+client holds a socket rather than a worker. DRF views are sync only, so
+these are plain Django views that authenticate the JWT with the same class
+as the API and answer with the same payloads and errors as the sync views.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+
+from .authentication import CachedJWTAuthentication
+from .caching import acached_response, dataset_key, history_key
+from .executors import run_cpu, run_report
+from .timing import request_timings, stage
+from .views import dataset_payload, dataset_query, history_datasets, history_entry, include_rows
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+async def chunks(body):
+    for start in range(0, len(body), STREAM_CHUNK_SIZE):
+        yield body[start:start + STREAM_CHUNK_SIZE]
+
+
+def streaming_response(body, content_type):
+    response = StreamingHttpResponse(chunks(body), content_type=content_type)
+    response['Content-Length'] = str(len(body))
+    return response
+
+
+async def json_response(data, timings):
+    """data rendered as DRF would, off the event loop, and streamed"""
+    with stage(timings, "encode"):
+        body = await run_cpu(JSONRenderer().render, data)
+    return streaming_response(body, 'application/json')
+
+
+class AsyncAPIView(View):
+    """Requires a valid JWT, like IsAuthenticated with the API's authentication"""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token authenticated, so exempt from CSRF like DRF's APIView
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        authentication = CachedJWTAuthentication()
+        try:
+            result = await sync_to_async(authentication.authenticate)(request)
+        except AuthenticationFailed as e:
+            return self.unauthorized(request, authentication, e.detail)
+        if result is None:
+            return self.unauthorized(request, authentication, NotAuthenticated.default_detail)
+
+        request.user, request.auth = result
+        return await super().dispatch(request, *args, **kwargs)
+
+    def unauthorized(self, request, authentication, detail):
+        response = JsonResponse(detail if isinstance(detail, dict) else {"detail": detail}, status=401)
+        response['WWW-Authenticate'] = authentication.authenticate_header(request)
+        return response
+
+
+async def history_payload(user):
+    return [history_entry(d) async for d in history_datasets(user)]
+
+
+class AsyncHistoryView(AsyncAPIView):
+    async def get(self, request):
+        data = await acached_response(history_key(request.user.id), 'history',
+                                      lambda: history_payload(request.user))
+        return await json_response(data, request_timings(request))
+
+
+class AsyncDatasetDetailView(AsyncAPIView):
+    async def get(self, request, dataset_id):
+        timings = request_timings(request)
+        rows = include_rows(request)
+        payload = await acached_response(dataset_key(request.user.id, dataset_id, rows), 'dataset',
+                                         lambda: self.load(request.user, dataset_id, rows, timings))
+        if payload is None:
+            return JsonResponse({"error": "Dataset not found"}, status=404)
+        return await json_response(payload, timings)
+
+    async def load(self, user, dataset_id, rows, timings):
+        with stage(timings, "query"):
+            dataset = await dataset_query(user, dataset_id, rows).afirst()
+        if dataset is None:
+            return None
+        with stage(timings, "payload"):
+            return await run_cpu(dataset_payload, dataset, rows)
+
+
+class AsyncGeneratePDFView(AsyncAPIView):
+    """Takes the report data as JSON; the PDF is drawn on the report pool"""
+
+    async def post(self, request):
+        timings = request_timings(request)
+        with stage(timings, "body"):
+            try:
+                data = await run_cpu(json.loads, request.body or b'null')
+            except ValueError:
+                return JsonResponse({"error": "Request body must be JSON"}, status=400)
+
+        if not data:
+            return JsonResponse({"error": "No data provided"}, status=400)
+
+        try:
+            pdf, report_timings = await run_report(data)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+        if timings is not None:
+            timings.update(report_timings)
+
+        response = streaming_response(pdf, 'application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="equipment_report_{data.get("total_equipment", "")}_items.pdf"'
+        return response
@@ -0,0 +1,195 @@
+import os
+from datetime import timedelta
+
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import UploadSession
+from .uploads import (MIN_CHUNK_SIZE, MAX_CHUNK_SIZE, received_chunks, store_chunk, assemble_chunks,
+                      discard_chunks)
+from .views import outlier_options, save_dataset, dataset_payload
+from .metrics import record_upload
+
+
+def session_payload(session):
+    return {
+        "upload_id": str(session.id),
+        "filename": session.filename,
+        "total_size": session.total_size,
+        "chunk_size": session.chunk_size,
+        "total_chunks": session.total_chunks,
+        "received": received_chunks(session),
+        "committing": session.committing_at is not None,
+        "dataset_id": session.dataset_id
+    }
+
+
+def claim_commit(session):
+    """
+    Mark the session as committing unless another commit holds it. A single
+    conditional UPDATE, so of two concurrent commits only one gets it.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.CHUNKED_UPLOAD_COMMIT_TIMEOUT)
+    return UploadSession.objects.filter(
+        Q(committing_at__isnull=True) | Q(committing_at__lt=stale),
+        id=session.id, dataset__isnull=True
+    ).update(committing_at=now) == 1
+
+
+def release_commit(session):
+    UploadSession.objects.filter(id=session.id).update(committing_at=None)
+
+
+def get_session(request, upload_id):
+    try:
+        return UploadSession.objects.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return None
+
+
+class ChunkedUploadCreateView(APIView):
+    """
+    Start a resumable upload: POST the file name and size, then PUT each
+    chunk to chunks/<index>/ and POST commit/ once all have arrived.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        filename = request.data.get('filename')
+        try:
+            total_size = int(request.data.get('size'))
+            chunk_size = int(request.data.get('chunk_size') or settings.CHUNKED_UPLOAD_CHUNK_SIZE)
+        except (TypeError, ValueError):
+            return Response({"error": "size and chunk_size must be integers"}, status=400)
+
+        if not filename:
+            return Response({"error": "filename is required"}, status=400)
+        if total_size <= 0:
+            return Response({"error": "size must be positive"}, status=400)
+        if total_size > settings.UPLOAD_MAX_BYTES:
+            return Response({"error": f"File exceeds the {settings.UPLOAD_MAX_BYTES} byte upload limit"}, status=413)
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            return Response({"error": f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE}"},
+                            status=400)
+
+        # Abandoned uploads are cleaned up whenever the user starts a new one
+        expired = UploadSession.objects.filter(
+            user=request.user,
+            dataset__isnull=True,
+            created_at__lt=timezone.now() - timedelta(seconds=settings.CHUNKED_UPLOAD_EXPIRY)
+        )
+        for stale in expired:
+            discard_chunks(stale)
+        expired.delete()
+
+        session = UploadSession.objects.create(
+            user=request.user,
+            filename=os.path.basename(filename)[:255],
+            total_size=total_size,
+            chunk_size=chunk_size
+        )
+        return Response(session_payload(session), status=201)
+
+
+class ChunkedUploadStatusView(APIView):
+    """Which chunks have been received, so an interrupted upload can resume"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id):
+        session = get_session(request, upload_id)
+        if not session:
+            return Response({"error": "Upload not found"}, status=404)
+        return Response(session_payload(session))
+
+    def delete(self, request, upload_id):
+        session = get_session(request, upload_id)
+        if not session:
+            return Response({"error": "Upload not found"}, status=404)
+        discard_chunks(session)
+        session.delete()
+        return Response(status=204)
+
+
+class ChunkedUploadChunkView(APIView):
+    """
+    PUT one chunk as the raw request body with its SHA-256 hex digest in the
+    X-Chunk-SHA256 header. Chunks already stored are acknowledged without
+    being written again.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, upload_id, index):
+        session = get_session(request, upload_id)
+        if not session:
+            return Response({"error": "Upload not found"}, status=404)
+        if session.dataset_id:
+            return Response({"error": "Upload already committed"}, status=409)
+        if not 0 <= index < session.total_chunks:
+            return Response({"error": f"Chunk index must be below {session.total_chunks}"}, status=400)
+
+        checksum = request.headers.get('X-Chunk-SHA256', '').strip().lower()
+        if not checksum:
+            return Response({"error": "X-Chunk-SHA256 header is required"}, status=400)
+
+        try:
+            stored = store_chunk(session, index, request.stream, checksum)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response({"index": index, "stored": stored, "received": received_chunks(session)})
+
+
+class ChunkedUploadCommitView(APIView):
+    """Assemble the chunks, analyze the file and save it as a Dataset"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+        session = get_session(request, upload_id)
+        if not session:
+            return Response({"error": "Upload not found"}, status=404)
+
+        # A commit whose response was lost can be retried safely
+        if session.dataset_id:
+            return Response(dataset_payload(session.dataset))
+
+        received = set(received_chunks(session))
+        missing = [i for i in range(session.total_chunks) if i not in received]
+        if missing:
+            return Response({"error": "Upload is missing chunks", "missing": missing}, status=409)
+
+        if not claim_commit(session):
+            session.refresh_from_db()
+            if session.dataset_id:
+                return Response(dataset_payload(session.dataset))
+            return Response({"error": "Upload is already being committed"}, status=409)
+
+        # Imported here, like in views.py, to keep pandas out of startup
+        from .utils import analyze_csv
+
+        try:
+            path = assemble_chunks(session)
+            try:
+                summary = analyze_csv(path, max_rows=settings.UPLOAD_MAX_ROWS, **outlier_options(request))
+            except Exception as e:
+                release_commit(session)
+                return Response({"error": str(e)}, status=400)
+            finally:
+                os.unlink(path)
+
+            record_upload(request, summary["total_equipment"], session.total_size)
+            with transaction.atomic():
+                dataset = save_dataset(request.user, session.filename, summary)
+                session.dataset = dataset
+                session.save(update_fields=['dataset'])
+        except Exception:
+            release_commit(session)
+            raise
+        discard_chunks(session)
+
+        summary["id"] = dataset.id
+        return Response(summary, status=201)
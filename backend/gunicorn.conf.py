@@ -0,0 +1,45 @@
+"""
+Gunicorn settings, read automatically when gunicorn starts in this directory.
+
+Every worker writes its Prometheus metrics to PROMETHEUS_MULTIPROC_DIR so
+that /metrics reports the sum over all workers (see equipment/metrics.py).
+Without the variable a private temporary directory is used for this server
+and removed again on exit.
+
+Loading the app leaves the analysis and report modules (pandas, numpy,
+matplotlib, reportlab) unimported, so migrate and the master start quickly.
+Each worker imports them right after it boots, before it accepts
+connections, so no user's first upload or report pays for the import.
+"""
+import glob
+import os
+import shutil
+import tempfile
+
+_own_metrics_dir = 'PROMETHEUS_MULTIPROC_DIR' not in os.environ
+if _own_metrics_dir:
+    # Set before the workers are forked, so each of them inherits it
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='equipment-metrics-')
+
+
+def on_starting(server):
+    # Samples left by an earlier run would be added to this one's
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+
+
+def post_worker_init(worker):
+    import equipment.utils  # noqa: F401
+    import equipment.pdf_generator  # noqa: F401
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
@@ -349,9 +349,16 @@ class ParameterDistributionChart(FigureCanvasQTAgg):
     
     def update_chart(self, equipment_data, parameter):
         """Update chart with equipment data for specific parameter"""
-        self.fig.clear()
-        
         values = [e[parameter] for e in equipment_data]
+        self.draw_histogram(parameter, values, bins=10)
+    
+    def update_from_histogram(self, histogram, parameter):
+        """Update chart with precomputed bin edges and counts from the API"""
+        edges = histogram['edges']
+        self.draw_histogram(parameter, edges[:-1], bins=edges, weights=histogram['counts'])
+    
+    def draw_histogram(self, parameter, values, bins, weights=None):
+        self.fig.clear()
         
         colors = {
             'flowrate': ('#ef4444', '#ef444480'),
@@ -368,7 +375,7 @@ class ParameterDistributionChart(FigureCanvasQTAgg):
         ax = self.fig.add_subplot(111)
         
         # Create histogram
-        ax.hist(values, bins=10, color=colors[parameter][1], edgecolor=colors[parameter][0], linewidth=1.5)
+        ax.hist(values, bins=bins, weights=weights, color=colors[parameter][1], edgecolor=colors[parameter][0], linewidth=1.5)
         
         ax.set_xlabel(parameter.capitalize(), color='#d1d5db', fontsize=9)
         ax.set_ylabel('Count', color='#d1d5db', fontsize=9)
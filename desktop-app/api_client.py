@@ -1,9 +1,16 @@
 """
 API Client for communicating with Django backend
 """
+import hashlib
+import os
 import requests
 from typing import Optional, Dict, List, Tuple
 
+# Files larger than this are sent with the resumable chunked upload protocol
+CHUNKED_UPLOAD_THRESHOLD = 16 * 1024 * 1024
+CHUNK_SIZE = 8 * 1024 * 1024
+CHUNK_RETRIES = 3
+
 
 class APIClient:
     def __init__(self, base_url: str = "http://127.0.0.1:8000/api"):
@@ -11,6 +18,8 @@ class APIClient:
         self.access_token: Optional[str] = None
         self.refresh_token: Optional[str] = None
         self.user: Optional[Dict] = None
+        # Chunked upload sessions by (path, size, mtime), so a retried upload resumes
+        self._upload_sessions: Dict[Tuple, str] = {}
 
     def _get_headers(self) -> Dict[str, str]:
         """Get headers with authorization token"""
@@ -33,7 +42,12 @@ class APIClient:
             )
             
             if response.status_code == 201:
-                # Auto-login after registration
+                # Registration returns the user and tokens, so it is also a login
+                data = response.json()
+                if "access" in data:
+                    self._start_session(data)
+                    return True, "Login successful"
+                # Servers from before tokens were returned on registration
                 return self.login(username, password)
             else:
                 error = response.json()
@@ -47,15 +61,16 @@ class APIClient:
         try:
             response = requests.post(
                 f"{self.base_url}/auth/login/",
-                json={"username": username, "password": password}
+                json={"username": username, "password": password, "include_user": True}
             )
             
             if response.status_code == 200:
                 data = response.json()
-                self.access_token = data.get("access")
-                self.refresh_token = data.get("refresh")
-                
-                # Fetch user profile
+                self._start_session(data)
+                if self.user is not None:
+                    return True, "Login successful"
+
+                # Servers that don't return the profile with the tokens
                 user_response = requests.get(
                     f"{self.base_url}/auth/user/",
                     headers=self._get_headers()
@@ -72,9 +87,18 @@ class APIClient:
         except Exception as e:
             return False, str(e)
 
+    def _start_session(self, data: Dict):
+        """Keep the tokens, and the user when included, from a login or registration response"""
+        self.access_token = data.get("access")
+        self.refresh_token = data.get("refresh")
+        self.user = data.get("user")
+
     def upload_csv(self, file_path: str) -> Tuple[bool, Optional[Dict], str]:
         """Upload CSV file for analysis"""
         try:
+            if os.path.getsize(file_path) > CHUNKED_UPLOAD_THRESHOLD:
+                return self._upload_csv_chunked(file_path)
+
             with open(file_path, 'rb') as f:
                 files = {'file': f}
                 headers = {}
@@ -95,6 +119,92 @@ class APIClient:
         except Exception as e:
             return False, None, str(e)
 
+    def upload_batch(self, file_paths: List[str]) -> Tuple[bool, Optional[Dict], str]:
+        """Upload several CSV (or zip) files in one request; the result lists each file's outcome"""
+        handles = []
+        try:
+            for path in file_paths:
+                handles.append(('files', (os.path.basename(path), open(path, 'rb'))))
+            headers = {}
+            if self.access_token:
+                headers["Authorization"] = f"Bearer {self.access_token}"
+
+            response = requests.post(
+                f"{self.base_url}/upload/batch/",
+                files=handles,
+                headers=headers
+            )
+
+            data = response.json()
+            if response.status_code == 201:
+                return True, data, f"{data['created']} of {len(data['results'])} files uploaded"
+            return False, data if "results" in data else None, data.get("error", "Upload failed")
+        except Exception as e:
+            return False, None, str(e)
+        finally:
+            for _, (_, f) in handles:
+                f.close()
+
+    def _upload_csv_chunked(self, file_path: str) -> Tuple[bool, Optional[Dict], str]:
+        """Upload a large CSV in checksummed chunks, skipping any the server already has"""
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime)
+
+        upload_id = self._upload_sessions.get(key)
+        received = set()
+        if upload_id:
+            response = requests.get(f"{self.base_url}/uploads/{upload_id}/", headers=self._get_headers())
+            if response.status_code == 200:
+                session = response.json()
+                received = set(session["received"])
+            else:
+                upload_id = None
+
+        if not upload_id:
+            response = requests.post(
+                f"{self.base_url}/uploads/",
+                json={"filename": os.path.basename(file_path), "size": stat.st_size, "chunk_size": CHUNK_SIZE},
+                headers=self._get_headers()
+            )
+            if response.status_code != 201:
+                return False, None, response.json().get("error", "Upload failed")
+            session = response.json()
+            upload_id = session["upload_id"]
+            self._upload_sessions[key] = upload_id
+
+        with open(file_path, 'rb') as f:
+            for index in range(session["total_chunks"]):
+                if index in received:
+                    continue
+                f.seek(index * session["chunk_size"])
+                chunk = f.read(session["chunk_size"])
+                headers = self._get_headers()
+                headers["Content-Type"] = "application/octet-stream"
+                headers["X-Chunk-SHA256"] = hashlib.sha256(chunk).hexdigest()
+
+                for attempt in range(CHUNK_RETRIES):
+                    try:
+                        response = requests.put(
+                            f"{self.base_url}/uploads/{upload_id}/chunks/{index}/",
+                            data=chunk,
+                            headers=headers
+                        )
+                    except requests.ConnectionError:
+                        if attempt == CHUNK_RETRIES - 1:
+                            raise
+                        continue
+                    if response.status_code < 500:
+                        break
+                if response.status_code != 200:
+                    return False, None, response.json().get("error", "Upload failed")
+
+        response = requests.post(f"{self.base_url}/uploads/{upload_id}/commit/", headers=self._get_headers())
+        if response.status_code in (200, 201):
+            self._upload_sessions.pop(key, None)
+            return True, response.json(), "Upload successful"
+        error = response.json()
+        return False, None, error.get("error", "Upload failed")
+
     def get_history(self) -> Tuple[bool, Optional[List], str]:
         """Get upload history"""
         try:
@@ -110,11 +220,12 @@ class APIClient:
         except Exception as e:
             return False, None, str(e)
 
-    def get_dataset(self, dataset_id: int) -> Tuple[bool, Optional[Dict], str]:
-        """Get specific dataset by ID"""
+    def get_dataset(self, dataset_id: int, rows: bool = True) -> Tuple[bool, Optional[Dict], str]:
+        """Get specific dataset by ID; without rows, equipment_data is left out"""
         try:
             response = requests.get(
                 f"{self.base_url}/dataset/{dataset_id}/",
+                params=None if rows else {"rows": 0},
                 headers=self._get_headers()
             )
             
@@ -125,6 +236,38 @@ class APIClient:
         except Exception as e:
             return False, None, str(e)
 
+    def get_histogram(self, dataset_id: int, param: str, bins: int = 10) -> Tuple[bool, Optional[Dict], str]:
+        """Get server-side histogram bins for one parameter of a dataset"""
+        try:
+            response = requests.get(
+                f"{self.base_url}/dataset/{dataset_id}/histogram/",
+                params={"param": param, "bins": bins},
+                headers=self._get_headers()
+            )
+            
+            if response.status_code == 200:
+                return True, response.json(), "Success"
+            else:
+                return False, None, "Failed to fetch histogram"
+        except Exception as e:
+            return False, None, str(e)
+
+    def get_series(self, dataset_id: int, points: int = 200) -> Tuple[bool, Optional[Dict], str]:
+        """Get LTTB-downsampled parameter series of a dataset"""
+        try:
+            response = requests.get(
+                f"{self.base_url}/dataset/{dataset_id}/series/",
+                params={"points": points},
+                headers=self._get_headers()
+            )
+            
+            if response.status_code == 200:
+                return True, response.json(), "Success"
+            else:
+                return False, None, "Failed to fetch series"
+        except Exception as e:
+            return False, None, str(e)
+
     def generate_pdf(self, analysis_data: Dict) -> Tuple[bool, Optional[bytes], str]:
         """Generate PDF report"""
         try:
@@ -21,6 +21,9 @@ from smart_insights import SmartInsightsWidget
 import os
 import json
 
+# Stored datasets above this many items are loaded without their rows (?rows=0)
+MAX_LOADED_ROWS = 5000
+
 
 class MplCanvas(FigureCanvasQTAgg):
     """Matplotlib canvas for embedding charts"""
@@ -584,8 +587,9 @@ class DashboardWindow(QMainWindow):
         self.upload_btn.setEnabled(False)
         self.upload_btn.setText("Loading...")
         
-        # Fetch dataset from API
-        success, result, message = self.api_client.get_dataset(dataset_id)
+        # Large datasets are charted from the histogram and series endpoints instead of their rows
+        total = next((d.get('total_equipment', 0) for d in self.history_data if d.get('id') == dataset_id), 0)
+        success, result, message = self.api_client.get_dataset(dataset_id, rows=total <= MAX_LOADED_ROWS)
         
         if success and result:
             self.current_result = result
@@ -603,7 +607,7 @@ class DashboardWindow(QMainWindow):
             self,
             "Select CSV File",
             "",
-            "CSV Files (*.csv);;All Files (*)"
+            "Data Files (*.csv *.parquet *.xlsx);;CSV Files (*.csv);;All Files (*)"
         )
         
         if file_path:
@@ -674,20 +678,39 @@ class DashboardWindow(QMainWindow):
             self.safety_chart_frame.show()
         
         # Update distribution charts
-        if equipment_data:
-            self.flow_dist_chart.update_chart(equipment_data, 'flowrate')
-            self.pressure_dist_chart.update_chart(equipment_data, 'pressure')
-            self.temp_dist_chart.update_chart(equipment_data, 'temperature')
+        if equipment_data or result.get('id'):
+            self.update_distribution_charts(result)
             self.dist_charts_frame.show()
         
-        # Update table
-        self.populate_table(equipment_data)
-        self.table_frame.show()
+        # Update table; datasets loaded without their rows have none to list
+        if equipment_data:
+            self.populate_table(equipment_data)
+            self.table_frame.show()
+        else:
+            self.table_frame.hide()
         
         # Update sidebar safety status
         if equipment_data:
             self.update_sidebar_safety_status(equipment_data)
     
+    def update_distribution_charts(self, result):
+        """Draw histograms from server-side bins, binning locally if they are unavailable"""
+        charts = [
+            (self.flow_dist_chart, 'flowrate'),
+            (self.pressure_dist_chart, 'pressure'),
+            (self.temp_dist_chart, 'temperature')
+        ]
+        
+        for chart, parameter in charts:
+            histogram = None
+            if result.get('id'):
+                success, histogram, _ = self.api_client.get_histogram(result['id'], parameter)
+            
+            if histogram:
+                chart.update_from_histogram(histogram, parameter)
+            else:
+                chart.update_chart(result.get('equipment_data', []), parameter)
+    
     def update_sidebar_safety_status(self, equipment_data):
         """Update safety warnings in sidebar with collapsible details"""
         thresholds = {
@@ -927,7 +950,29 @@ class DashboardWindow(QMainWindow):
         ax = self.line_canvas.fig.add_subplot(111, facecolor='#000000')
         
         equipment_data = result.get('equipment_data', [])
-        if equipment_data:
+        series = None
+        if result.get('total_equipment', len(equipment_data)) > 15 and result.get('id'):
+            success, series, _ = self.api_client.get_series(result['id'], points=200)
+        
+        if series:
+            # Downsampled trend of every item; too many to label individually
+            styles = [('flowrate', 'Flowrate', '#ef4444'), ('pressure', 'Pressure', '#3b82f6'),
+                      ('temperature', 'Temperature', '#22c55e')]
+            for key, label, color in styles:
+                ax.plot(series['series'][key]['x'], series['series'][key]['y'],
+                        color=color, label=label, linewidth=1.5)
+            
+            ax.set_facecolor('#000000')
+            ax.set_title(f"Equipment Parameters ({series['total']} items)", color='#ffffff', fontsize=12, pad=15)
+            ax.legend(loc='upper right', facecolor='#18181b', edgecolor='#3f3f46', 
+                     labelcolor='#ffffff', fontsize=9, framealpha=1)
+            ax.tick_params(colors='#a1a1aa', labelsize=9)
+            ax.spines['bottom'].set_color('#3f3f46')
+            ax.spines['left'].set_color('#3f3f46')
+            ax.spines['top'].set_visible(False)
+            ax.spines['right'].set_visible(False)
+            ax.grid(True, alpha=0.1, color='#3f3f46', axis='y')
+        elif equipment_data:
             # Limit to first 15 items for readability
             equipment_data = equipment_data[:15]
             names = [item['name'][:20] for item in equipment_data]
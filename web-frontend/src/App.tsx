@@ -15,18 +15,25 @@ import ParameterDistributionChart from './components/charts/ParameterDistributio
 import CSVFormatGuide from './components/CSVFormatGuide'
 import ThresholdSettings from './components/ThresholdSettings'
 import SmartInsights from './components/SmartInsights'
-import type { AnalysisResult, HistoryItem } from './types'
+import type { AnalysisResult, HistogramBins, HistoryItem, TrendSeries } from './types'
 import './App.css'
 
 registerChartComponents()
 
 const API_BASE = import.meta.env.VITE_API_BASE_URL 
+// Above this many items the trend chart uses the server's downsampled series
+const TREND_SERIES_POINTS = 200
+// Stored datasets above this many items are loaded without their rows (?rows=0);
+// the charts then come from the histogram and series endpoints
+const MAX_LOADED_ROWS = 5000
 
 function Dashboard() {
   const { accessToken, logout, user } = useAuth()
   const navigate = useNavigate()
   const [file, setFile] = useState<File | null>(null)
   const [result, setResult] = useState<AnalysisResult | null>(null)
+  const [histograms, setHistograms] = useState<{ [param: string]: HistogramBins }>({})
+  const [trendSeries, setTrendSeries] = useState<TrendSeries | undefined>(undefined)
   const [history, setHistory] = useState<HistoryItem[]>([])
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
@@ -47,6 +54,51 @@ function Dashboard() {
     }
   }, [])
 
+  useEffect(() => {
+    setHistograms({})
+    setTrendSeries(undefined)
+    if (result?.id) {
+      fetchHistograms(result.id)
+      if (result.total_equipment > TREND_SERIES_POINTS) {
+        fetchTrendSeries(result.id)
+      }
+    }
+  }, [result?.id])
+
+  const fetchTrendSeries = async (datasetId: number) => {
+    try {
+      const response = await fetch(`${API_BASE}/dataset/${datasetId}/series/?points=${TREND_SERIES_POINTS}`, {
+        headers: {
+          'Authorization': `Bearer ${accessToken}`,
+        },
+      })
+      if (response.ok) {
+        setTrendSeries(await response.json())
+      }
+    } catch (err) {
+      console.error('Failed to fetch trend series:', err)
+    }
+  }
+
+  const fetchHistograms = async (datasetId: number) => {
+    try {
+      const params = ['flowrate', 'pressure', 'temperature']
+      const responses = await Promise.all(params.map(param =>
+        fetch(`${API_BASE}/dataset/${datasetId}/histogram/?param=${param}&bins=10`, {
+          headers: {
+            'Authorization': `Bearer ${accessToken}`,
+          },
+        })
+      ))
+      if (responses.some(response => !response.ok)) return
+      const data = await Promise.all(responses.map(response => response.json()))
+      setHistograms(Object.fromEntries(params.map((param, i) => [param, data[i]])))
+    } catch (err) {
+      // Charts fall back to binning the rows locally
+      console.error('Failed to fetch histograms:', err)
+    }
+  }
+
   const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     if (e.target.files && e.target.files[0]) {
       setFile(e.target.files[0])
@@ -107,8 +159,11 @@ function Dashboard() {
     setLoading(true)
     setError(null)
     
+    const item = history.find(h => h.id === datasetId)
+    const rows = item && item.total_equipment > MAX_LOADED_ROWS ? '?rows=0' : ''
+
     try {
-      const response = await fetch(`${API_BASE}/dataset/${datasetId}/`, {
+      const response = await fetch(`${API_BASE}/dataset/${datasetId}/${rows}`, {
         headers: {
           'Authorization': `Bearer ${accessToken}`,
         },
@@ -299,28 +354,33 @@ function Dashboard() {
                 )}
 
                 {/* Equipment Trend Line Chart */}
-                {result.equipment_data && (
-                  <EquipmentLineChart equipmentData={result.equipment_data} />
+                {(result.equipment_data || trendSeries) && (
+                  <EquipmentLineChart equipmentData={result.equipment_data} series={trendSeries} />
                 )}
 
                 {/* Parameter Distribution Histograms */}
-                {result.equipment_data && (
+                {(result.equipment_data || histograms.flowrate) && (
                   <div className="grid grid-cols-1 lg:grid-cols-3 gap-6">
                     <div className="bg-zinc-900 border border-zinc-800 rounded-xl p-4" style={{ height: '300px' }}>
-                      <ParameterDistributionChart equipmentData={result.equipment_data} parameter="flowrate" thresholds={thresholds} />
+                      <ParameterDistributionChart equipmentData={result.equipment_data} parameter="flowrate" histogram={histograms.flowrate} thresholds={thresholds} />
                     </div>
                     <div className="bg-zinc-900 border border-zinc-800 rounded-xl p-4" style={{ height: '300px' }}>
-                      <ParameterDistributionChart equipmentData={result.equipment_data} parameter="pressure" thresholds={thresholds} />
+                      <ParameterDistributionChart equipmentData={result.equipment_data} parameter="pressure" histogram={histograms.pressure} thresholds={thresholds} />
                     </div>
                     <div className="bg-zinc-900 border border-zinc-800 rounded-xl p-4" style={{ height: '300px' }}>
-                      <ParameterDistributionChart equipmentData={result.equipment_data} parameter="temperature" thresholds={thresholds} />
+                      <ParameterDistributionChart equipmentData={result.equipment_data} parameter="temperature" histogram={histograms.temperature} thresholds={thresholds} />
                     </div>
                   </div>
                 )}
 
                 {/* Data Table */}
-                {result.equipment_data && (
+                {result.equipment_data ? (
                   <DataTable equipmentData={result.equipment_data} />
+                ) : (
+                  <div className="bg-zinc-900 border border-zinc-800 rounded-xl p-4 text-sm text-gray-400">
+                    Datasets with more than {MAX_LOADED_ROWS.toLocaleString()} items are charted from server-side
+                    histograms and trend series; the per-item table and safety status are not loaded.
+                  </div>
                 )}
               </div>
             )}
@@ -21,7 +21,7 @@ export default function FileUpload({
         <div className="relative">
           <input
             type="file"
-            accept=".csv"
+            accept=".csv,.parquet,.xlsx"
             onChange={onFileChange}
             className="block w-full text-sm text-gray-300 border border-zinc-700 rounded-lg cursor-pointer bg-zinc-800 p-3 hover:bg-zinc-750 transition-colors file:mr-4 file:py-2 file:px-4 file:rounded-md file:border-0 file:text-sm file:font-medium file:bg-white file:text-black hover:file:bg-gray-200 file:cursor-pointer"
           />
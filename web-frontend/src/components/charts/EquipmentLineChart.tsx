@@ -1,4 +1,5 @@
 import { Line } from 'react-chartjs-2'
+import type { TrendSeries } from '../../types'
 
 interface EquipmentData {
   name: string
@@ -9,10 +10,30 @@ interface EquipmentData {
 }
 
 interface EquipmentLineChartProps {
-  equipmentData: EquipmentData[]
+  // Not needed when series is given; datasets loaded with ?rows=0 have none
+  equipmentData?: EquipmentData[]
+  series?: TrendSeries
 }
 
-export default function EquipmentLineChart({ equipmentData }: EquipmentLineChartProps) {
+const SERIES_STYLES = [
+  { key: 'flowrate', label: 'Flowrate', color: '59, 130, 246' },
+  { key: 'pressure', label: 'Pressure', color: '168, 85, 247' },
+  { key: 'temperature', label: 'Temperature', color: '249, 115, 22' },
+] as const
+
+export default function EquipmentLineChart({ equipmentData = [], series }: EquipmentLineChartProps) {
+  // Large datasets: plot the server's LTTB-downsampled series against item position
+  const downsampled = series && {
+    datasets: SERIES_STYLES.map(({ key, label, color }) => ({
+      label,
+      data: series.series[key].x.map((x, i) => ({ x, y: series.series[key].y[i] })),
+      borderColor: `rgb(${color})`,
+      backgroundColor: `rgba(${color}, 0.5)`,
+      pointRadius: 0,
+      borderWidth: 1.5,
+    })),
+  }
+
   const data = {
     labels: equipmentData.map((eq) => eq.name),
     datasets: [
@@ -62,6 +83,7 @@ export default function EquipmentLineChart({ equipmentData }: EquipmentLineChart
         },
       },
       x: {
+        type: series ? ('linear' as const) : ('category' as const),
         grid: {
           color: 'rgba(255, 255, 255, 0.1)',
         },
@@ -75,7 +97,7 @@ export default function EquipmentLineChart({ equipmentData }: EquipmentLineChart
   return (
     <div className="bg-zinc-900 border border-zinc-800 rounded-xl p-6">
       <h3 className="text-lg font-semibold mb-6 text-white">Equipment Parameter Comparison</h3>
-      <Line data={data} options={options} />
+      <Line data={downsampled || data} options={options} />
     </div>
   )
 }
@@ -1,9 +1,11 @@
 import { useEffect, useRef } from 'react'
 import { Chart } from 'chart.js'
 import type { TooltipItem } from 'chart.js'
+import type { HistogramBins } from '../../types'
 
 interface ParameterDistributionChartProps {
-  equipmentData: Array<{
+  // Only binned locally when no histogram is given; datasets loaded with ?rows=0 have none
+  equipmentData?: Array<{
     name: string
     type: string
     flowrate: number
@@ -11,6 +13,7 @@ interface ParameterDistributionChartProps {
     temperature: number
   }>
   parameter: 'flowrate' | 'pressure' | 'temperature'
+  histogram?: HistogramBins
   thresholds?: {
     flowrate: { min: number; max: number; critical_max: number }
     pressure: { min: number; max: number; critical_max: number }
@@ -18,33 +21,52 @@ interface ParameterDistributionChartProps {
   }
 }
 
-export default function ParameterDistributionChart({ equipmentData, parameter, thresholds }: ParameterDistributionChartProps) {
+export default function ParameterDistributionChart({ equipmentData = [], parameter, histogram, thresholds }: ParameterDistributionChartProps) {
   const chartRef = useRef<HTMLCanvasElement>(null)
   const chartInstance = useRef<Chart | null>(null)
 
   useEffect(() => {
     if (!chartRef.current) return
 
-    const values = equipmentData.map(e => e[parameter])
-    const min = Math.min(...values)
-    const max = Math.max(...values)
-    const range = max - min
-    const binCount = 10
-    const binSize = range / binCount
-
-    const bins = Array(binCount).fill(0)
+    let min: number
+    let max: number
+    let binCount: number
+    let binSize: number
+    let bins: number[]
     const binLabels = []
 
-    for (let i = 0; i < binCount; i++) {
-      const binStart = min + (i * binSize)
-      const binEnd = binStart + binSize
-      binLabels.push(`${binStart.toFixed(0)}-${binEnd.toFixed(0)}`)
-      
-      values.forEach(v => {
-        if (v >= binStart && (v < binEnd || (i === binCount - 1 && v === binEnd))) {
-          bins[i]++
-        }
-      })
+    if (histogram) {
+      // Server-side bins: no need to walk every row
+      const { edges, counts } = histogram
+      min = edges[0]
+      max = edges[edges.length - 1]
+      binCount = counts.length
+      binSize = (max - min) / binCount
+      bins = counts
+      for (let i = 0; i < binCount; i++) {
+        binLabels.push(`${edges[i].toFixed(0)}-${edges[i + 1].toFixed(0)}`)
+      }
+    } else {
+      const values = equipmentData.map(e => e[parameter])
+      min = Math.min(...values)
+      max = Math.max(...values)
+      const range = max - min
+      binCount = 10
+      binSize = range / binCount
+
+      bins = Array(binCount).fill(0)
+
+      for (let i = 0; i < binCount; i++) {
+        const binStart = min + (i * binSize)
+        const binEnd = binStart + binSize
+        binLabels.push(`${binStart.toFixed(0)}-${binEnd.toFixed(0)}`)
+        
+        values.forEach(v => {
+          if (v >= binStart && (v < binEnd || (i === binCount - 1 && v === binEnd))) {
+            bins[i]++
+          }
+        })
+      }
     }
 
     const colors = {
@@ -210,7 +232,7 @@ export default function ParameterDistributionChart({ equipmentData, parameter, t
         chartInstance.current.destroy()
       }
     }
-  }, [equipmentData, parameter, thresholds])
+  }, [equipmentData, parameter, histogram, thresholds])
 
   return <canvas ref={chartRef} />
 }
@@ -125,7 +125,7 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ username, password }),
+      body: JSON.stringify({ username, password, include_user: true }),
     })
 
     if (!response.ok) {
@@ -134,12 +134,12 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
     }
 
     const data = await response.json()
-    setAccessToken(data.access)
-    setRefreshToken(data.refresh)
-    localStorage.setItem('accessToken', data.access)
-    localStorage.setItem('refreshToken', data.refresh)
+    startSession(data)
+    if (data.user) {
+      return
+    }
 
-    // Fetch user profile with the new token
+    // Servers that don't return the profile with the tokens
     const userResponse = await fetch(`${API_BASE}/auth/user/`, {
       headers: {
         'Authorization': `Bearer ${data.access}`,
@@ -168,8 +168,23 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
       throw new Error(Object.values(error).flat().join(' ') || 'Registration failed')
     }
 
-    // Auto-login after registration
-    await login(username, password)
+    // Registration returns the user and tokens, so it is also a login
+    const data = await response.json()
+    if (data.access) {
+      startSession(data)
+    } else {
+      await login(username, password)
+    }
+  }
+
+  const startSession = (data: { access: string; refresh: string; user?: User }) => {
+    setAccessToken(data.access)
+    setRefreshToken(data.refresh)
+    localStorage.setItem('accessToken', data.access)
+    localStorage.setItem('refreshToken', data.refresh)
+    if (data.user) {
+      setUser(data.user)
+    }
   }
 
   const logout = () => {
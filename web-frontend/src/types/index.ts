@@ -1,9 +1,39 @@
+export interface ParameterStats {
+  mean: number
+  std: number | null
+  min: number
+  max: number
+}
+
+export interface TypeStats {
+  count: number
+  flowrate: ParameterStats
+  pressure: ParameterStats
+  temperature: ParameterStats
+}
+
+export interface HistogramBins {
+  edges: number[]
+  counts: number[]
+}
+
+export interface TrendSeries {
+  total: number
+  points: number
+  series: {
+    [key in 'flowrate' | 'pressure' | 'temperature']: { x: number[]; y: number[] }
+  }
+}
+
 export interface AnalysisResult {
+  id?: number
   total_equipment: number
   avg_flowrate: number
   avg_pressure: number
   avg_temperature: number
   equipment_by_type?: { [key: string]: number }
+  type_stats?: { [key: string]: TypeStats }
+  percentiles?: { [key: string]: { p50: number; p95: number; p99: number } }
   equipment_data?: Array<{
     name: string
     type: string